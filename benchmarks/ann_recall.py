@@ -0,0 +1,146 @@
+"""
+Recall, latency and memory of the retrieval index types.
+
+Every index type from core.embedding.make_index is built over the same bank
+of normalized embeddings and compared with the exact flat index:
+
+    python -m benchmarks.ann_recall --size 1000000 --queries 1000 --k 10
+
+By default the bank is synthetic (clustered vectors with the dimension of
+all-MiniLM-L6-v2). --from-cache uses the embeddings stored in the local
+embedding cache instead, sampled without replacement; a cache smaller
+than --size plus --queries gives a smaller bank.
+"""
+import argparse
+import os
+import time
+import numpy as np
+import faiss
+
+from core.embedding import embedding_cache, make_index, normalize
+
+DIM = 384
+
+
+def synthetic_bank(size: int, dim: int = DIM, n_topics: int = 200, noise: float = 0.6, seed: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors, imitating many paraphrases of a few answers.
+
+    With a high noise the neighbours inside a cluster are almost equidistant,
+    which is harder for approximate indexes than real answer banks.
+
+    Args:
+        size: Number of vectors
+        dim: Embedding dimension
+        n_topics: Number of cluster centres
+        noise: Standard deviation of each member around its centre, per dimension
+        seed: Random seed
+
+    Returns:
+        float32 matrix of normalized vectors
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    topics = rng.integers(0, n_topics, size)
+    bank = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 100_000):
+        stop = min(start + 100_000, size)
+        bank[start:stop] = centres[topics[start:stop]] + noise * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return normalize(bank)
+
+
+def cached_bank(size: int, seed: int = 0) -> np.ndarray:
+    """
+    Embeddings from the local embedding cache, sampled without replacement.
+
+    Queries drawn from the same sample are then never copies of bank vectors.
+
+    Args:
+        size: Number of vectors, capped at the number of cached embeddings
+        seed: Random seed
+
+    Returns:
+        float32 matrix of normalized vectors
+    """
+    cache = embedding_cache
+    path = os.path.join(cache.directory, 'vectors.f32')
+    if cache.dim is None or len(cache) == 0:
+        raise SystemExit(f"No hay embeddings en {path}")
+    # The matrix grows geometrically; only the first len(cache) rows are used
+    vectors = np.fromfile(path, dtype=np.float32).reshape(-1, cache.dim)[:len(cache)]
+    vectors = vectors[np.abs(vectors).sum(axis=1) > 0]
+    rng = np.random.default_rng(seed)
+    return normalize(vectors[rng.choice(len(vectors), min(size, len(vectors)), replace=False)])
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int):
+    """
+    Search latency of an index.
+
+    Args:
+        index: Populated index
+        queries: Query vectors
+        k: Neighbours per query
+
+    Returns:
+        tuple: (ids, ms per query searched one by one, ms per query searched as a batch)
+    """
+    faiss.omp_set_num_threads(1)
+    start = time.perf_counter()
+    for query in queries[:200]:
+        index.search(query[None, :], k)
+    single = (time.perf_counter() - start) * 1000 / min(len(queries), 200)
+
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    batch = (time.perf_counter() - start) * 1000 / len(queries)
+    return ids, single, batch
+
+
+def recall(ids: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the exact k nearest neighbours that were returned."""
+    k = truth.shape[1]
+    return float(np.mean([len(np.intersect1d(found, exact)) / k for found, exact in zip(ids, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000, help="answers in the bank")
+    parser.add_argument('--queries', type=int, default=1000, help="query answers")
+    parser.add_argument('--k', type=int, default=10, help="neighbours per query")
+    parser.add_argument('--types', default='flat,hnsw,ivf,ivfpq', help="comma-separated index types")
+    parser.add_argument('--noise', type=float, default=0.6, help="spread of the synthetic clusters")
+    parser.add_argument('--from-cache', action='store_true', help="use the embedding cache instead of synthetic vectors")
+    args = parser.parse_args()
+
+    if args.from_cache:
+        bank = cached_bank(args.size + args.queries)
+        if len(bank) <= args.queries:
+            raise SystemExit(f"La caché solo tiene {len(bank)} embeddings; reduce --queries")
+        args.size = len(bank) - args.queries
+    else:
+        bank = synthetic_bank(args.size + args.queries, noise=args.noise)
+    bank, queries = bank[:args.size], bank[args.size:]
+
+    truth = None
+    print(f"{'índice':<8}{'recall@' + str(args.k):>11}{'ms/consulta':>13}{'ms/lote':>10}{'memoria MB':>12}{'creación s':>12}")
+    for index_type in args.types.split(','):
+        start = time.perf_counter()
+        index = make_index(bank, index_type)
+        index.add(bank)
+        build = time.perf_counter() - start
+
+        ids, single, batch = measure(index, queries, args.k)
+        if truth is None:
+            # Exact search gives the true neighbours
+            exact = faiss.IndexFlatIP(bank.shape[1])
+            exact.add(bank)
+            _, truth = exact.search(queries, args.k)
+
+        memory = faiss.serialize_index(index).nbytes / 2**20
+        print(f"{index_type:<8}{recall(ids, truth):>11.3f}{single:>13.3f}{batch:>10.4f}{memory:>12.1f}{build:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
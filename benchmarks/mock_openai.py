@@ -0,0 +1,278 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions like the real service, with a configurable
+latency, share of server errors and rate limit, so the grading pipeline can be
+benchmarked and load-tested offline:
+
+    python -m benchmarks.mock_openai --port 8765 --latency 0.4 --error-rate 0.02 --rpm 600
+
+and, in another terminal,
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python main.py
+
+The grade is decided from the student answer: 1 if it mentions the keywords
+of the synthetic exam's correct answers, 0 otherwise. Requests with several
+numbered answers ([1], [2], ...) get a JSON array, as asked by
+core.grader.PACKED_INSTRUCTION.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answers that mention any of these are graded as correct
+KEYWORDS = ('llor', 'nacido', 'bebe')
+
+ANSWER_MARKER = 'Respuesta del estudiante a evaluar:'
+
+
+class MockOpenAIServer:
+    """
+    OpenAI-compatible HTTP server running in a background thread.
+
+    Usable as a context manager; base_url is what OPENAI_BASE_URL should be
+    set to while it runs.
+
+    Attributes:
+        latency (float): Seconds each request takes, before jitter
+        jitter (float): Maximum random seconds added to the latency
+        error_rate (float): Probability of answering with a 500 error
+        rpm (int): Requests accepted per rolling minute before answering 429;
+            None for no limit
+        rate_limit_rate (float): Probability of a 429 regardless of the rpm
+        stats (dict): Counters of requests, answers graded, errors and 429s
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.2, jitter: float = 0.0,
+                 error_rate: float = 0.0, rpm: int = None, rate_limit_rate: float = 0.0, seed: int = 0):
+        """
+        Initialize the server without starting it.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on; 0 picks a free one
+            latency: Seconds each request takes, before jitter
+            jitter: Maximum random seconds added to the latency
+            error_rate: Probability of answering with a 500 error
+            rpm: Requests accepted per rolling minute; None for no limit
+            rate_limit_rate: Probability of a 429 regardless of the rpm
+            seed: Random seed for the errors and jitter
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.rate_limit_rate = rate_limit_rate
+        self.stats = {'requests': 0, 'answers': 0, 'errors': 0, 'rate_limited': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+        self._random = random.Random(seed)
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockOpenAIServer':
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        """Serve requests in the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def admit(self):
+        """
+        Decide how to answer the next request.
+
+        Returns:
+            tuple: (HTTP status, headers, delay in seconds before answering)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            limited = self.rpm is not None and len(self._window) >= self.rpm
+            if limited or self._random.random() < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                wait = 60 - (now - self._window[0]) if limited else 1.0
+                return 429, {'retry-after-ms': str(int(wait * 1000)),
+                             'x-ratelimit-remaining-requests': '0',
+                             'x-ratelimit-reset-requests': f"{wait:.3f}s"}, 0.0
+            self._window.append(now)
+
+            if self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 500, {}, delay
+
+            headers = {}
+            if self.rpm is not None:
+                headers = {'x-ratelimit-limit-requests': str(self.rpm),
+                           'x-ratelimit-remaining-requests': str(self.rpm - len(self._window)),
+                           'x-ratelimit-reset-requests': f"{60 - (now - self._window[0]):.3f}s"}
+            return 200, headers, delay
+
+    def count(self, answers: int, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.stats['answers'] += answers
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+
+
+def grade_answer(answer: str) -> dict:
+    """
+    Deterministic grade of one answer.
+
+    Args:
+        answer: Student answer
+
+    Returns:
+        dict: grade, feedback and confidence fields as the model returns them
+    """
+    text = unicodedata.normalize('NFKD', answer.lower()).encode('ascii', 'ignore').decode()
+    correct = any(keyword in text for keyword in KEYWORDS)
+    return {
+        'grade': int(correct),
+        'feedback': "Menciona que el bebé no llora." if correct else "No alude al protagonista que no llora.",
+        'confidence': 95 if correct else 85,
+    }
+
+
+def completion(body: dict) -> tuple:
+    """
+    Chat completion answering a grading request.
+
+    Args:
+        body: JSON body of the request
+
+    Returns:
+        tuple: (chat completion object with usage, number of answers graded)
+    """
+    messages = body.get('messages', [])
+    user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+    if ANSWER_MARKER in user:
+        answer = user.split(ANSWER_MARKER)[-1].strip()
+    else:
+        # Other prompts: the answer is expected on the last line
+        answer = (user.strip().splitlines() or [''])[-1]
+
+    packed = re.findall(r'^\[(\d+)\]\s*(.*)$', answer, re.MULTILINE)
+    if packed:
+        content = json.dumps([{'id': int(i), **grade_answer(text)} for i, text in packed], ensure_ascii=False)
+    else:
+        content = json.dumps(grade_answer(answer), ensure_ascii=False)
+
+    # About four characters per token, enough to track volume
+    prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        'id': f"chatcmpl-mock-{time.monotonic_ns()}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'mock'),
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }, max(1, len(packed))
+
+
+def _handler(server: MockOpenAIServer):
+    """Request handler class bound to a server's settings and counters."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self._send(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+
+            status, headers, delay = server.admit()
+            time.sleep(delay)
+            if status == 429:
+                return self._send(429, {'error': {'message': "Rate limit reached for requests", 'type': 'requests',
+                                                  'code': 'rate_limit_exceeded'}}, headers)
+            if status != 200:
+                return self._send(status, {'error': {'message': "The server had an error while processing your request.",
+                                                     'type': 'server_error'}})
+
+            result, answers = completion(body)
+            server.count(answers, result['usage']['prompt_tokens'], result['usage']['completion_tokens'])
+            self._send(200, result, headers)
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="maximum random seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability of a 500 error")
+    parser.add_argument('--rpm', type=int, default=None, help="requests per minute before answering 429")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="probability of a random 429")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                              args.rpm, args.rate_limit_rate)
+    print(f"Servidor simulado en {server.base_url} (Ctrl+C para salir)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Timed benchmarks of the grading pipeline, per stage and end to end.
+
+Generates a synthetic exam, starts the mock OpenAI server and times each
+stage as the GUI runs it: load, normalization (Table), index building,
+example retrieval, grading and export, then the whole job through
+core.batch.run_job. Results are written as JSON to compare runs:
+
+    python -m benchmarks.run --answers 5000 --duplicates 0.4 --latency 0.3 --output benchmarks/results/base.json
+
+Nothing reaches the real API; the response cache and the grading journal are
+disabled so every run grades the same answers again.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.mock_openai import MockOpenAIServer
+from benchmarks.synthetic import ANSWER_COLUMN, GRADE_COLUMN, SHEET_NAME, make_exam
+
+PROMPT_PATH = 'prompt.txt'
+
+
+def timed(stage: str, results: dict, items: int = None):
+    """
+    Start timing a stage.
+
+    Args:
+        stage: Name of the stage in the results
+        results: Dictionary of stage results to fill
+        items: Number of items processed, to report a throughput
+
+    Returns:
+        Function to call when the stage ends, optionally with the final item count
+    """
+    start = time.perf_counter()
+
+    def stop(count: int = items, **extra):
+        seconds = time.perf_counter() - start
+        results[stage] = {'seconds': round(seconds, 4), 'items': count,
+                          'items_per_second': round(count / seconds, 1) if count and seconds else None, **extra}
+        return results[stage]
+
+    return stop
+
+
+def run(
+    answers: int = 1000,
+    duplicates: float = 0.3,
+    length: int = 10,
+    graded: float = 0.1,
+    file_format: str = 'xlsx',
+    export_format: str = None,
+    server_options: dict = None,
+    grading_options: dict = None,
+    workdir: str = None
+) -> dict:
+    """
+    Run every stage benchmark on one synthetic exam.
+
+    Args:
+        answers: Number of students in the exam
+        duplicates: Probability that an answer repeats an earlier one
+        length: Average words per answer
+        graded: Share of answers already graded
+        file_format: 'xlsx', 'csv' or 'parquet'
+        export_format: Format of the exported copy (see save_results), None for the original one
+        server_options: Arguments of MockOpenAIServer (latency, error_rate, rpm...)
+        grading_options: Options of evaluate_dataframe
+        workdir: Folder for the exam and the exported files; a temporary one if None
+
+    Returns:
+        dict: Configuration, environment and one entry per stage
+    """
+    from core import embedding, metrics
+    from core.batch import DEFAULT_TEXT_OPTIONS, run_job
+    from core.export import expand_results, save_results
+    from core.loader import load_answers
+    from core.processor import evaluate_dataframe
+    from core.table import Table
+
+    server_options = server_options or {}
+    grading_options = {'use_cache': False, 'journal_path': None, **(grading_options or {}), 'prompt_path': PROMPT_PATH}
+    report = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {'answers': answers, 'duplicates': duplicates, 'length': length, 'graded': graded,
+                   'format': file_format, 'export_format': export_format, 'server': server_options,
+                   'grading': {k: v for k, v in grading_options.items() if k != 'question_index'}},
+        'stages': {},
+    }
+    stages = report['stages']
+    collector = metrics.enable()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        path = os.path.join(workdir, f"examen_sintetico.{file_format}")
+        truth = make_exam(path, answers, duplicates, length, graded)['Nota real']
+
+        stop = timed('model_load', stages)
+        embedding.get_embedding_model()
+        stop(None)
+
+        stop = timed('load', stages, answers)
+        df, idxCols = load_answers(path, SHEET_NAME, ANSWER_COLUMN, GRADE_COLUMN)
+        stop()
+
+        stop = timed('normalize', stages, answers)
+        table = Table(df, DEFAULT_TEXT_OPTIONS, ANSWER_COLUMN, GRADE_COLUMN, idxCols)
+        df_processed = table.getTableProcessed()
+        relations = table.getRelationDict()
+        stop(unique_answers=len(df_processed))
+
+        base = df_processed[df_processed['Nota'].notna()]
+        ungraded = df_processed[df_processed['Nota'].isna()]['Respuesta'].tolist()
+
+        stop = timed('index', stages, len(base))
+        index, base_embeddings, idx_map = embedding.build_index(
+            base['Respuesta'].tolist(), base['Nota'].astype(int).tolist(), grading_options.get('index_type', 'auto')
+        )
+        stop()
+
+        stop = timed('retrieval', stages, len(ungraded))
+        vectors, _, _ = embedding.search_batch(index, ungraded)
+        embedding.retrieve_examples_by_label(
+            index, idx_map, vectors, lambda ids: base_embeddings[np.maximum(ids, 0)],
+            grading_options.get('examples_per_grade', 3), grading_options.get('diversity', 0.0)
+        )
+        stop()
+
+        with _mock_api(server_options) as server:
+            stop = timed('grading', stages, len(ungraded))
+            df_result = evaluate_dataframe(df_processed.copy(), options=grading_options)
+            graded_rows = df_result[df_result['nota IA'].notna()] if 'nota IA' in df_result else df_result.iloc[:0]
+            stop(failed=int((graded_rows['nota IA'] == -1).sum()),
+                 accuracy=_accuracy(graded_rows, relations, truth),
+                 summary=dict(df_result.attrs.get('summary', {})),
+                 api=dict(server.stats))
+            server.reset_stats()
+
+            stop = timed('export', stages, answers)
+            ai_results = expand_results(df_result, relations)
+            save_results(path, SHEET_NAME, idxCols[1], {}, ai_results, os.path.join(workdir, 'outputs'), output_format=export_format)
+            stop(exported_rows=len(ai_results))
+
+            job = {'file': path, 'sheet': SHEET_NAME, 'answer_column': ANSWER_COLUMN, 'grade_column': GRADE_COLUMN,
+                   'prompt': os.path.abspath(PROMPT_PATH), 'options': grading_options}
+            stop = timed('end_to_end', stages, answers)
+            result = run_job(job, os.path.join(workdir, 'outputs'))
+            stop(status=result['status'], error=result.get('error'), api=dict(server.stats))
+
+    # Inner stages, LLM latency percentiles and token usage of the whole benchmark
+    metrics.disable()
+    report['metrics'] = collector.report()
+    return report
+
+
+@contextlib.contextmanager
+def _mock_api(server_options: dict):
+    """Run the mock server and point the grader's client to it while in use."""
+    from core import grader
+
+    saved = {key: os.environ.get(key) for key in ('OPENAI_BASE_URL', 'OPENAI_API_KEY')}
+    saved_client = grader.client
+    with MockOpenAIServer(**server_options) as server:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+        os.environ['OPENAI_API_KEY'] = 'mock'
+        grader.client = None
+        try:
+            yield server
+        finally:
+            grader.client = saved_client
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def _accuracy(graded_rows, relations: dict, truth) -> float:
+    """Share of students whose AI grade matches the true grade of the synthetic exam."""
+    hits = total = 0
+    for text, nota in graded_rows[['Respuesta', 'nota IA']].itertuples(index=False):
+        for idRow in relations[text]:
+            total += 1
+            hits += float(nota) == truth.iloc[idRow]
+    return round(hits / total, 4) if total else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=1000, help="students in the synthetic exam")
+    parser.add_argument('--duplicates', type=float, default=0.3, help="probability of repeating an earlier answer")
+    parser.add_argument('--length', type=int, default=10, help="average words per answer")
+    parser.add_argument('--graded', type=float, default=0.1, help="share of answers already graded")
+    parser.add_argument('--format', default='xlsx', choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('--export-format', default=None, choices=['xlsx', 'csv', 'parquet'],
+                        help="format of the exported copy (default: the original format)")
+    parser.add_argument('--latency', type=float, default=0.2, help="mock API seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.05, help="mock API random extra seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="mock API probability of a 500 error")
+    parser.add_argument('--rpm', type=int, default=None, help="mock API requests per minute before 429")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="mock API probability of a random 429")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent grading requests")
+    parser.add_argument('--pack-size', type=int, default=1, help="answers per grading request")
+    parser.add_argument('--output', default=None, help="JSON file (default: benchmarks/results/<date>.json)")
+    args = parser.parse_args()
+
+    server_options = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+                      'rpm': args.rpm, 'rate_limit_rate': args.rate_limit_rate}
+    grading_options = {'max_workers': args.workers, 'pack_size': args.pack_size}
+    report = run(args.answers, args.duplicates, args.length, args.graded, args.format, args.export_format,
+                 server_options, grading_options)
+
+    output = args.output or os.path.join('benchmarks', 'results', f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{'etapa':<12}{'segundos':>10}{'elementos':>11}{'por segundo':>13}")
+    for stage, result in report['stages'].items():
+        print(f"{stage:<12}{result['seconds']:>10.3f}{result['items'] or '':>11}{result['items_per_second'] or '':>13}")
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == '__main__':
+    main()
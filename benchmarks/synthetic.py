@@ -0,0 +1,116 @@
+"""
+Synthetic exam generator.
+
+Writes an exam file with one open question in the layout the application
+expects (student, answer column, grade column), for benchmarks and load tests:
+
+    python -m benchmarks.synthetic exam.xlsx --answers 5000 --duplicates 0.4 --length 12
+
+A share of the answers is graded, like the subset a teacher grades by hand
+before asking the AI for the rest. Duplicates repeat an earlier answer with
+changes in case, accents and punctuation only, so they collapse after text
+normalization.
+"""
+import argparse
+import os
+import random
+import pandas as pd
+
+ANSWER_COLUMN = 'P1'
+GRADE_COLUMN = 'Nota P1'
+SHEET_NAME = 'Hoja1'
+
+# Fragments of correct and incorrect answers to the question in prompt.txt
+CORRECT = ['el protagonista', 'es un recién nacido', 'que nunca llora', 'y eso es misterioso',
+           'porque el bebé no llora', 'al contrario que otros bebés', 'es raro que no llore']
+INCORRECT = ['porque es bonito', 'habla de una familia', 'el título es largo', 'me gustó la historia',
+             'porque pasa en un pueblo', 'no lo sé', 'el niño juega mucho']
+FILLER = ['creo que', 'en mi opinión', 'básicamente', 'además', 'también', 'por eso', 'la verdad']
+
+
+def make_exam(
+    path: str,
+    n_answers: int = 1000,
+    duplicate_rate: float = 0.3,
+    answer_length: int = 10,
+    graded_fraction: float = 0.1,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Generate a synthetic exam and save it.
+
+    Args:
+        path: Output file (.xlsx, .csv or .parquet)
+        n_answers: Number of students
+        duplicate_rate: Probability that an answer repeats an earlier one
+        answer_length: Average number of words per answer
+        graded_fraction: Share of answers that already have a grade
+        seed: Random seed
+
+    Returns:
+        The generated DataFrame, with the true grade in 'Nota real'
+    """
+    rng = random.Random(seed)
+    answers, truth = [], []
+    for _ in range(n_answers):
+        if answers and rng.random() < duplicate_rate:
+            position = rng.randrange(len(answers))
+            answers.append(_variant(answers[position], rng))
+            truth.append(truth[position])
+            continue
+
+        correct = rng.random() < 0.5
+        answers.append(_answer(CORRECT if correct else INCORRECT, answer_length, rng))
+        truth.append(int(correct))
+
+    graded = [rng.random() < graded_fraction for _ in range(n_answers)]
+    df = pd.DataFrame({
+        'Alumno': [f'alumno {i + 1}' for i in range(n_answers)],
+        ANSWER_COLUMN: answers,
+        GRADE_COLUMN: [grade if keep else None for grade, keep in zip(truth, graded)],
+        'Nota real': truth,
+    })
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    elif path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_excel(path, sheet_name=SHEET_NAME, index=False)
+    return df
+
+
+def _answer(fragments, length: int, rng: random.Random) -> str:
+    """Build an answer of about `length` words from topic fragments and filler."""
+    words = []
+    target = max(1, int(rng.gauss(length, length / 4)))
+    while len(words) < target:
+        words.extend((rng.choice(fragments) if rng.random() < 0.6 else rng.choice(FILLER)).split())
+    return " ".join(words[:target]).capitalize() + "."
+
+
+def _variant(answer: str, rng: random.Random) -> str:
+    """Same answer as written by another student: only case, accents and punctuation change."""
+    variant = answer.lower() if rng.random() < 0.5 else answer.upper()
+    if rng.random() < 0.5:
+        variant = variant.translate(str.maketrans('áéíóúÁÉÍÓÚ', 'aeiouAEIOU'))
+    return variant.rstrip('.') + rng.choice(['', '.', '!', ' ...'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="output file (.xlsx, .csv or .parquet)")
+    parser.add_argument('--answers', type=int, default=1000, help="number of students")
+    parser.add_argument('--duplicates', type=float, default=0.3, help="probability of repeating an earlier answer")
+    parser.add_argument('--length', type=int, default=10, help="average words per answer")
+    parser.add_argument('--graded', type=float, default=0.1, help="share of answers already graded")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_exam(args.path, args.answers, args.duplicates, args.length, args.graded, args.seed)
+    print(f"{len(df)} respuestas ({df[ANSWER_COLUMN].nunique()} distintas) guardadas en {args.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Headless batch grading.
+
+Grades every (file, sheet, answer column, grade column, prompt) job of a
+manifest without opening the GUI and writes the corrected copies plus a
+JSON report:
+
+    python cli.py manifest.json --workers 4 --output-dir outputs
+
+Example manifest:
+
+    {
+        "defaults": {"prompt": "prompt.txt", "threshold": 80},
+        "jobs": [
+            {"file": "exam.xlsx", "sheet": "1A", "answer_column": "P1", "grade_column": "Nota P1"},
+            {"file": "exam.xlsx", "sheet": "1A", "answer_column": "P2", "grade_column": "Nota P2",
+             "prompt": "prompts/p2.txt", "options": {"pack_size": 8}}
+        ]
+    }
+"""
+import argparse
+import os
+import sys
+from core.batch import load_manifest, run_batch, write_report
+from core.export import OUTPUT_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help="JSON or CSV file with the jobs")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per job, up to the CPU count)")
+    parser.add_argument('--output-dir', default='outputs', help="folder for the corrected files")
+    parser.add_argument('--report', default=None, help="JSON report (default: <output-dir>/informe_lote.json)")
+    parser.add_argument('--metrics', action='store_true', help="add per-stage timings, LLM latency, tokens and cost of each job to the report")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                        help="write the corrected copies as a streamed xlsx, CSV or Parquet (default: the original format)")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error en el manifiesto: {e}", file=sys.stderr)
+        return 2
+
+    if args.metrics:
+        for job in jobs:
+            job['metrics'] = True
+    if args.format:
+        for job in jobs:
+            job['output_format'] = args.format
+
+    print(f"{len(jobs)} trabajos en {args.manifest}")
+    results = run_batch(jobs, output_dir=args.output_dir, workers=args.workers)
+    report = write_report(results, args.report or os.path.join(args.output_dir, 'informe_lote.json'))
+
+    errors = sum(result['status'] != 'ok' for result in results)
+    print(f"{len(results) - errors} correctos, {errors} con errores. Informe: {report}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
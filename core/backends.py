@@ -0,0 +1,155 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+
+class GradingBackend(ABC):
+    """
+    Interface of the graders that work on answer embeddings.
+
+    A backend is trained on the embeddings of the answers already graded by
+    the teacher and then grades new answers from their embeddings alone.
+    """
+    name = ''
+
+    @abstractmethod
+    def fit(self, embeddings: np.ndarray, labels: List[int]) -> 'GradingBackend':
+        """
+        Train the backend on graded answers.
+
+        Args:
+            embeddings: One embedding per graded answer
+            labels: Grade of each answer
+
+        Returns:
+            The backend itself
+        """
+
+    @abstractmethod
+    def grade(self, embeddings: np.ndarray) -> List[Tuple[float, str, float]]:
+        """
+        Grade answers from their embeddings.
+
+        Args:
+            embeddings: One embedding per answer to grade
+
+        Returns:
+            list: (grade, feedback, confidence) per answer, confidence in 0-100
+        """
+
+
+class LocalClassifierBackend(GradingBackend):
+    """
+    Grades answers with a lightweight classifier trained on the base embeddings.
+
+    Runs on the CPU without any network call, in well under a millisecond per
+    answer. Probabilities are calibrated with cross-validation when there are
+    enough examples of each grade, so the confidence can be compared with a
+    threshold just like the one returned by the LLM.
+
+    Attributes:
+        method (str): 'logistic' (logistic regression) or 'knn' (distance-weighted vote)
+        n_neighbors (int): Neighbours used by the 'knn' method
+        classes (np.ndarray): Grades seen during training
+    """
+    name = 'local'
+
+    METHODS = {'logistic': 'regresión logística', 'knn': 'vecinos más cercanos'}
+
+    def __init__(self, method: str = 'logistic', n_neighbors: int = 7):
+        """
+        Initialize the backend.
+
+        Args:
+            method: 'logistic' or 'knn'
+            n_neighbors: Neighbours used by the 'knn' method
+
+        Raises:
+            ValueError: If the method is unknown.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Clasificador local desconocido: {method}")
+        self.method = method
+        self.n_neighbors = n_neighbors
+        self.classes = None
+        self._model = None
+
+    def fit(self, embeddings: np.ndarray, labels: List[int]) -> 'LocalClassifierBackend':
+        """
+        Train the classifier on graded answers.
+
+        Args:
+            embeddings: One embedding per graded answer
+            labels: Grade of each answer
+
+        Returns:
+            The backend itself
+
+        Raises:
+            ValueError: If all graded answers have the same grade.
+        """
+        # scikit-learn is slow to import and only needed here
+        from sklearn.calibration import CalibratedClassifierCV
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.neighbors import KNeighborsClassifier
+
+        labels = np.asarray(labels)
+        self.classes, counts = np.unique(labels, return_counts=True)
+        if len(self.classes) < 2:
+            raise ValueError("El clasificador local necesita ejemplos valorados con al menos dos notas distintas.")
+
+        if self.method == 'logistic':
+            model = LogisticRegression(C=1.0, max_iter=1000, class_weight='balanced')
+        else:
+            model = KNeighborsClassifier(n_neighbors=min(self.n_neighbors, len(labels)), weights='distance')
+
+        # Calibrate only when every grade has enough examples for the folds
+        folds = min(5, int(counts.min()))
+        if folds >= 2:
+            model = CalibratedClassifierCV(model, method='sigmoid', cv=folds)
+
+        self._model = model.fit(_normalize(embeddings), labels)
+        return self
+
+    def grade(self, embeddings: np.ndarray) -> List[Tuple[float, str, float]]:
+        """
+        Grade answers from their embeddings.
+
+        Args:
+            embeddings: One embedding per answer to grade
+
+        Returns:
+            list: (grade, feedback, confidence) per answer, confidence in 0-100
+        """
+        if self._model is None:
+            raise RuntimeError("El clasificador local no está entrenado.")
+        if len(embeddings) == 0:
+            return []
+
+        probabilities = self._model.predict_proba(_normalize(embeddings))
+        best = probabilities.argmax(axis=1)
+        grades = self._model.classes_[best].astype(float)
+        confidences = np.round(probabilities[np.arange(len(best)), best] * 100, 1)
+
+        feedback = f"Clasificador local ({self.METHODS[self.method]})"
+        return [(float(g), feedback, float(c)) for g, c in zip(grades, confidences)]
+
+
+def make_backend(name: str) -> GradingBackend:
+    """
+    Create a local grading backend by name.
+
+    Args:
+        name: 'logistic' or 'knn'
+
+    Returns:
+        An untrained backend
+    """
+    return LocalClassifierBackend(method=name)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Scale embeddings to unit length so distances behave like cosine similarity."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
@@ -0,0 +1,289 @@
+import csv
+import json
+import os
+import pathlib
+import time
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+# Text processing applied before grouping identical answers, as in the home window
+DEFAULT_TEXT_OPTIONS = {'lowercase': True, 'punctuations': True, 'normalize': True}
+
+JOB_FIELDS = ('file', 'sheet', 'answer_column', 'grade_column', 'prompt')
+
+
+def load_manifest(path: str) -> List[dict]:
+    """
+    Read the list of grading jobs of a batch.
+
+    A JSON manifest is either a list of jobs or an object with a "jobs" list
+    and optional "defaults" applied to every job. A CSV manifest has one job
+    per row with the columns file, sheet, answer_column, grade_column and
+    prompt. The sheet may only be left out for CSV and Parquet files.
+    Relative paths are resolved from the manifest's folder.
+
+    Each job may also set "threshold" (minimum confidence of the AI grades
+    written to the output), "text_options" (see DEFAULT_TEXT_OPTIONS),
+    "options" (grading options of evaluate_dataframe), "output_format"
+    (see core.export.OUTPUT_FORMATS; the original format by default) and
+    "metrics" (true to add the job's performance metrics to its result).
+
+    Args:
+        path: Path of a .json or .csv manifest
+
+    Returns:
+        list: Jobs as dictionaries with absolute paths
+
+    Raises:
+        ValueError: If the manifest is malformed or a job misses a field.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            jobs = [{key: value for key, value in row.items() if value not in (None, '')} for row in csv.DictReader(f)]
+        defaults = {}
+    else:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict):
+            jobs, defaults = manifest.get('jobs', []), manifest.get('defaults', {})
+        else:
+            jobs, defaults = manifest, {}
+        if not isinstance(jobs, list):
+            raise ValueError("El manifiesto debe contener una lista de trabajos.")
+
+    resolved = []
+    for number, job in enumerate(jobs, 1):
+        job = {**defaults, **job}
+        job.setdefault('prompt', 'prompt.txt')
+        # CSV and Parquet files have no sheets
+        sheetless = os.path.splitext(str(job.get('file', '')))[1].lower() in ('.csv', '.parquet')
+        missing = [field for field in JOB_FIELDS if not (field == 'sheet' and sheetless) and not job.get(field)]
+        if missing:
+            raise ValueError(f"Al trabajo {number} del manifiesto le falta: {', '.join(missing)}")
+        for field in ('file', 'prompt'):
+            job[field] = os.path.join(base, job[field])
+        if 'threshold' in job:
+            job['threshold'] = float(job['threshold'])
+        resolved.append(job)
+    return resolved
+
+
+def run_batch(jobs: List[dict], output_dir: str = 'outputs', workers: int = None) -> List[dict]:
+    """
+    Grade every job of a batch in a pool of processes.
+
+    Each process loads the embedding model once and reuses it for all the
+    jobs it runs; inside a job, answers are graded concurrently as in the GUI.
+    The concurrent requests allowed by each job's max_workers option are
+    shared out among the processes, so the batch as a whole stays within
+    them. Once every job is graded, the jobs of each file are written
+    together into one corrected copy. A failed job is reported and does
+    not stop the others.
+
+    Args:
+        jobs: Jobs from load_manifest
+        output_dir: Folder for the corrected files
+        workers: Number of processes; one per job, up to the CPU count, if None
+
+    Returns:
+        list: Result of each job (see run_job), in manifest order
+    """
+    from core.processor import DEFAULT_OPTIONS
+
+    workers = max(1, workers or min(len(jobs), os.cpu_count() or 1))
+    graded = []
+    for job in jobs:
+        options = job.get('options', {})
+        max_workers = max(1, int(options.get('max_workers', DEFAULT_OPTIONS['max_workers'])) // workers)
+        graded.append({**job, 'options': {**options, 'max_workers': max_workers}})
+
+    results = [None] * len(jobs)
+    corrections = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(grade_job, job): number for number, job in enumerate(graded)}
+        for future in as_completed(futures):
+            number = futures[future]
+            try:
+                results[number], corrections[number] = future.result()
+            except Exception as e:
+                # The worker process itself died
+                results[number] = _job_header(jobs[number]) | {'status': 'error', 'error': str(e)}
+            if results[number]['status'] != 'ok':
+                print(_format_result(results[number]))
+
+        # One corrected copy per file and output format, with all its graded questions
+        outputs = {}
+        for number, job in enumerate(jobs):
+            if corrections[number] is not None:
+                outputs.setdefault((job['file'], job.get('output_format')), []).append(number)
+        futures = {
+            executor.submit(export_file, jobs[numbers[0]], [corrections[n] for n in numbers], output_dir): numbers
+            for numbers in outputs.values()
+        }
+        for future in as_completed(futures):
+            numbers = futures[future]
+            try:
+                output = future.result()
+            except Exception as e:
+                output = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+            for number in numbers:
+                results[number].update(output)
+                print(_format_result(results[number]))
+
+    return results
+
+
+def run_job(job: dict, output_dir: str = 'outputs') -> dict:
+    """
+    Grade one question of one sheet and write the corrected copy.
+
+    Args:
+        job: Job from load_manifest
+        output_dir: Folder for the corrected file
+
+    Returns:
+        dict: Result of grade_job with the output path and export time, or
+              the export error
+    """
+    result, correction = grade_job(job)
+    if correction is not None:
+        try:
+            result.update(export_file(job, [correction], output_dir))
+        except Exception as e:
+            result.update({'status': 'error', 'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+    return result
+
+
+def grade_job(job: dict) -> tuple:
+    """
+    Grade one question of one sheet.
+
+    The steps are those of the GUI: load the two columns, group identical
+    answers with Table, grade the ungraded ones with evaluate_dataframe and
+    keep the AI grades whose confidence reaches the job's threshold.
+
+    Args:
+        job: Job from load_manifest
+
+    Returns:
+        tuple: (result, correction). The result holds the job fields plus
+               status ('ok' or 'error'), answer counts, grading summary,
+               elapsed seconds, error message and, if the job asks for them,
+               performance metrics (see core.metrics). The correction is the
+               question's entry for export_file, or None if the job failed.
+    """
+    from core import metrics
+    from core.export import expand_results
+    from core.loader import load_answers
+    from core.processor import evaluate_dataframe
+    from core.table import Table
+
+    result = _job_header(job)
+    correction = None
+    collector = metrics.enable() if job.get('metrics') else None
+    start = time.perf_counter()
+    try:
+        df, idxCols = load_answers(job['file'], job.get('sheet'), job['answer_column'], job['grade_column'])
+        table = Table(df, {**DEFAULT_TEXT_OPTIONS, **job.get('text_options', {})},
+                      job['answer_column'], job['grade_column'], idxCols)
+        df_processed = table.getTableProcessed()
+        relations = table.getRelationDict()
+        _, idxCorr = table.getIdxCols()
+
+        journal_path = os.path.join('.cache', 'journals', f"{pathlib.PurePath(job['file']).stem}{_job_suffix(job)}.jsonl")
+        options = {'journal_path': journal_path, **job.get('options', {}), 'prompt_path': job['prompt']}
+        df_result = evaluate_dataframe(df_processed, options=options)
+
+        # Same selection as Close and Save in the correction window, without failed rows
+        ai_results = expand_results(df_result, relations, job.get('threshold', 0), skip_failed=True)
+        correction = {'sheet': job.get('sheet'), 'idxCorr': idxCorr, 'grades': {}, 'ai_results': ai_results,
+                      'label': job['answer_column']}
+        result.update({
+            'status': 'ok',
+            'answers': len(df),
+            'unique_answers': len(df_processed),
+            'ungraded': int(pd.to_numeric(df_processed['Nota'], errors='coerce').isna().sum()),
+            'exported_rows': len(ai_results),
+            'failed': int((pd.to_numeric(df_result.reindex(columns=['nota IA'])['nota IA'], errors='coerce') == -1).sum()),
+            'summary': dict(df_result.attrs.get('summary', {})),
+        })
+    except Exception as e:
+        result.update({'status': 'error', 'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    if collector is not None:
+        metrics.disable()
+        result['metrics'] = collector.report()
+    return result, correction
+
+
+def export_file(job: dict, corrections: List[dict], output_dir: str = 'outputs') -> dict:
+    """
+    Write the graded questions of one file into a single corrected copy.
+
+    Args:
+        job: Any job of the file, for its 'file' and 'output_format'
+        corrections: Corrections returned by grade_job for the jobs of the file
+        output_dir: Folder for the corrected copy
+
+    Returns:
+        dict: 'output' (path of the copy, or paths of a CSV or Parquet copy of
+              several sheets, comma-separated) and 'export_seconds'
+    """
+    from core.export import save_corrections
+
+    start = time.perf_counter()
+    paths = save_corrections(job['file'], corrections, output_dir, output_format=job.get('output_format'))
+    return {'output': ', '.join(paths), 'export_seconds': round(time.perf_counter() - start, 2)}
+
+
+def write_report(results: List[dict], path: str) -> str:
+    """
+    Save the results of a batch as a JSON report.
+
+    Args:
+        results: Results from run_batch
+        path: Report file
+
+    Returns:
+        Path of the report
+    """
+    report = {
+        'jobs': len(results),
+        'ok': sum(result['status'] == 'ok' for result in results),
+        'errors': sum(result['status'] != 'ok' for result in results),
+        'seconds': round(sum(result.get('seconds', 0) for result in results), 2),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def _init_worker():
+    """Load the embedding model once per worker process."""
+    from core import embedding
+    embedding.get_embedding_model()
+
+
+def _job_header(job: dict) -> dict:
+    return {field: job.get(field) for field in JOB_FIELDS}
+
+
+def _job_suffix(job: dict) -> str:
+    """Added to the file name for a job's journal: ' - <sheet> - <answer column>'."""
+    return "".join(f" - {part}" for part in (job.get('sheet'), job['answer_column']) if part)
+
+
+def _format_result(result: dict) -> str:
+    """One console line per finished job."""
+    label = f"{pathlib.PurePath(result['file']).name} [{result.get('sheet') or '-'}] {result['answer_column']}"
+    if result['status'] != 'ok':
+        return f"ERROR  {label}: {result['error']}"
+    return (f"OK     {label}: {result['ungraded']} sin nota, {result['exported_rows']} filas exportadas "
+            f"en {result['seconds']} s -> {result['output']}")
@@ -0,0 +1,472 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+import numpy as np
+from filelock import FileLock
+from typing import Dict, List, Optional, Tuple
+
+KEY_DTYPE = np.uint64  # 64-bit blake2b digest
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text before hashing so trivial differences share a cache entry.
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Text in NFC form with collapsed whitespace
+    """
+    return ' '.join(unicodedata.normalize('NFC', str(text)).split())
+
+
+def _atomic_save(path: str, array: np.ndarray):
+    """Save a .npy file through a temporary file so a crash never leaves it half written."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class EmbeddingCache:
+    """
+    Persistent on-disk cache of text embeddings for one embedding model.
+
+    Vectors live in a memory-mapped float32 matrix ('vectors.f32'); row i belongs
+    to the 64-bit key stored at position i of 'keys.npy'. Keys hash the model name
+    together with the normalized text. When the cache exceeds its size limit the
+    least recently used rows are overwritten.
+
+    Several processes (batch workers) can share the cache: reads and writes
+    hold a lock file, and the key index is reloaded whenever another process
+    wrote it since this one last read it.
+
+    Attributes:
+        model_name (str): Name of the embedding model the vectors belong to
+        directory (str): Folder holding this model's cache files
+        max_bytes (int): Maximum size of the vector matrix on disk
+        hits (int): Number of lookups served from the cache
+        misses (int): Number of lookups that required encoding
+    """
+
+    def __init__(self, root: str, model_name: str, max_size_mb: float = 512):
+        """
+        Open (or create) the cache for a model.
+
+        Args:
+            root: Root cache folder, shared by all models
+            model_name: Name of the embedding model
+            max_size_mb: Maximum size of the vector matrix in megabytes
+        """
+        self.model_name = model_name
+        self.directory = os.path.join(root, re.sub(r'[^\w.-]', '_', model_name))
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(self.directory, 'cache.lock'))
+        self._vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self._keys_path = os.path.join(self.directory, 'keys.npy')
+        self._access_path = os.path.join(self.directory, 'access.npy')
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+
+        self.dim = None
+        self._vectors = None
+        self._keys = np.empty(0, dtype=KEY_DTYPE)
+        self._access = np.empty(0, dtype=np.int64)
+        self._rows = {}
+        # Version of the files on disk when this process last read or wrote them
+        self._version = None
+        with self._file_lock:
+            self._load()
+
+    def key(self, text: str) -> int:
+        """
+        Compute the cache key of a text.
+
+        Args:
+            text: Raw text
+
+        Returns:
+            64-bit blake2b digest of model name and normalized text
+        """
+        digest = hashlib.blake2b(f'{self.model_name}\0{normalize_text(text)}'.encode('utf-8'), digest_size=8)
+        return int.from_bytes(digest.digest(), 'little')
+
+    def lookup(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Fetch cached embeddings.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            tuple: (matrix with one row per text, zeros where missing or None if
+                    the cache is still empty, positions of the texts not cached)
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            if self.dim is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+
+            out = np.zeros((len(texts), self.dim), dtype=np.float32)
+            missing = []
+            found_rows = []
+            now = time.time_ns()
+            for i, text in enumerate(texts):
+                row = self._rows.get(self.key(text))
+                if row is None:
+                    missing.append(i)
+                else:
+                    out[i] = self._vectors[row]
+                    found_rows.append(row)
+
+            if found_rows:
+                self._access[found_rows] = now
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return out, missing
+
+    def store(self, texts: List[str], vectors: np.ndarray):
+        """
+        Add embeddings to the cache and persist them.
+
+        Args:
+            texts: Texts that were encoded
+            vectors: Their embeddings, one row per text
+        """
+        if len(texts) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock, self._file_lock:
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimensión de embedding inesperada: {vectors.shape[1]} != {self.dim}")
+
+            max_rows = max(1, self.max_bytes // (self.dim * 4))
+            entries = {}
+            for text, vector in zip(texts, vectors):
+                entries[self.key(text)] = vector
+            # Entries beyond the cache size would evict each other
+            entries = dict(list(entries.items())[:max_rows])
+
+            rows = []
+            new_keys = []
+            for key in entries:
+                row = self._rows.get(key)
+                if row is None:
+                    new_keys.append(key)
+                else:
+                    rows.append(row)
+
+            new_rows = self._allocate_rows(len(new_keys), max_rows, protected=rows)
+            for key, row in zip(new_keys, new_rows):
+                self._rows.pop(int(self._keys[row]), None)
+                self._keys[row] = key
+                self._rows[key] = row
+
+            all_rows = rows + new_rows
+            self._vectors[all_rows] = np.stack([entries[int(self._keys[row])] for row in all_rows])
+            self._access[all_rows] = time.time_ns()
+
+            self._flush()
+
+    def clear(self):
+        """Remove every cached embedding of this model."""
+        with self._lock, self._file_lock:
+            self._clear()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _clear(self):
+        # Caller must hold self._lock and self._file_lock
+        for path in (self._vectors_path, self._keys_path, self._access_path, self._meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dim = None
+        self._vectors = None
+        self._keys = np.empty(0, dtype=KEY_DTYPE)
+        self._access = np.empty(0, dtype=np.int64)
+        self._rows = {}
+        self._version = None
+
+    def _version_on_disk(self) -> Optional[str]:
+        """Version written by the last flush of any process, or None if there is no cache."""
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('version', '')
+        except (OSError, ValueError):
+            return None
+
+    def _refresh(self):
+        """
+        Reload the key index if another process changed the cache since this one used it.
+
+        Access times of lookups not yet persisted by this process are kept.
+        """
+        # Caller must hold self._lock and self._file_lock
+        if self._version_on_disk() == self._version:
+            return
+        access = dict(zip(self._keys.tolist(), self._access.tolist()))
+        self._load()
+        if access and len(self._keys):
+            pending = np.fromiter((access.get(key, 0) for key in self._keys.tolist()), dtype=np.int64, count=len(self._keys))
+            np.maximum(self._access, pending, out=self._access)
+
+    def _load(self):
+        """Load the key index and map the vector matrix, or start empty if the cache does not exist."""
+        if not os.path.exists(self._meta_path):
+            self._clear()
+            return
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            keys = np.load(self._keys_path)
+            access = np.load(self._access_path)
+            dim = int(meta['dim'])
+            # Caches written before versions were added have none
+            version = meta.get('version', '')
+            capacity = os.path.getsize(self._vectors_path) // (dim * 4)
+            if len(keys) != len(access) or len(keys) > capacity:
+                raise ValueError("índice de caché inconsistente")
+        except (OSError, ValueError, KeyError):
+            # A corrupted cache is only a performance loss: start again
+            self._clear()
+            return
+
+        self.dim = dim
+        self._keys = keys.astype(KEY_DTYPE)
+        self._access = access.astype(np.int64)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, dim))
+        self._rows = {int(k): i for i, k in enumerate(self._keys.tolist())}
+        self._version = version
+
+    def _allocate_rows(self, n: int, max_rows: int, protected: List[int]) -> List[int]:
+        """
+        Return the rows where n new entries go, growing or evicting as needed.
+
+        Args:
+            n: Number of new entries
+            max_rows: Maximum number of rows allowed by the size limit
+            protected: Rows written by the current call, never evicted
+
+        Returns:
+            List of row indices to write into
+        """
+        count = len(self._keys)
+        n_append = min(n, max_rows - count)
+        rows = list(range(count, count + n_append))
+        if n_append > 0:
+            self._ensure_capacity(count + n_append, max_rows)
+            self._keys = np.concatenate([self._keys, np.zeros(n_append, dtype=KEY_DTYPE)])
+            self._access = np.concatenate([self._access, np.zeros(n_append, dtype=np.int64)])
+
+        n_evict = n - n_append
+        if n_evict > 0:
+            # Cache full: overwrite the least recently used rows
+            access = self._access.copy()
+            access[protected + rows] = np.iinfo(np.int64).max
+            rows += np.argsort(access, kind='stable')[:n_evict].tolist()
+
+        return rows
+
+    def _ensure_capacity(self, rows: int, max_rows: int):
+        """Grow the memory-mapped matrix geometrically so appends stay cheap."""
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+
+        new_capacity = min(max_rows, max(rows, capacity * 2, 1024))
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(new_capacity, self.dim))
+
+    def _flush(self):
+        """Persist vectors, keys and access times."""
+        self._vectors.flush()
+        _atomic_save(self._keys_path, self._keys)
+        _atomic_save(self._access_path, self._access)
+        self._version = uuid.uuid4().hex
+        tmp = self._meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': self.dim, 'version': self._version}, f)
+        os.replace(tmp, self._meta_path)
+
+
+def request_key(model: str, params: dict, messages: List[dict]) -> str:
+    """
+    Content address of an LLM request.
+
+    Args:
+        model: Model name
+        params: Sampling parameters (temperature, max_tokens, ...)
+        messages: Full chat messages
+
+    Returns:
+        sha256 hex digest of the canonical JSON of the request
+    """
+    payload = json.dumps({'model': model, 'params': params, 'messages': messages},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of LLM responses stored in a SQLite file.
+
+    Responses are keyed by request_key(), so an identical system+user prompt
+    sent with the same model and parameters is answered without an API call.
+    The connection is opened lazily and shared between grading threads.
+
+    Attributes:
+        path (str): Path of the SQLite database
+        hits (int): Number of requests served from the cache
+        misses (int): Number of requests not found in the cache
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path of the SQLite database, created on first use
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Request key
+
+        Returns:
+            Cached response content, or None on a miss
+        """
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT content FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str):
+        """
+        Store a response.
+
+        Args:
+            key: Request key
+            content: Response content returned by the model
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, content, created) VALUES (?, ?, ?)',
+                (key, content, time.time())
+            )
+            conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller must hold self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL)'
+            )
+        return self._conn
+
+
+class GradingJournal:
+    """
+    Append-only JSON Lines journal of graded rows.
+
+    Each graded answer is written and fsynced as soon as it completes, so a
+    crash or a closed window loses at most the rows still in flight. Entries are
+    keyed by answer and prompt digest: after editing the prompt or the graded
+    base, affected rows are graded again instead of being resumed.
+
+    Attributes:
+        path (str): Path of the journal file
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the journal.
+
+        Args:
+            path: Path of the journal file, created on first record
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[Tuple[str, str], dict]:
+        """
+        Read every completed entry.
+
+        A truncated last line (crash while writing) is ignored.
+
+        Returns:
+            Dictionary mapping (answer, prompt digest) to the recorded result
+        """
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[(entry['answer'], entry['prompt'])] = entry
+                except (ValueError, KeyError):
+                    continue
+        return entries
+
+    def record(self, answer: str, prompt_digest: str, nota: float, feedback: str, confidence: float):
+        """
+        Append one graded row and flush it to disk.
+
+        Args:
+            answer: Student answer
+            prompt_digest: Digest of the prompt used to grade it
+            nota: Grade
+            feedback: Feedback text
+            confidence: Confidence value
+        """
+        line = json.dumps({
+            'answer': answer, 'prompt': prompt_digest,
+            'nota': nota, 'feedback': feedback, 'confidence': confidence
+        }, ensure_ascii=False)
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
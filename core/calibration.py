@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+def curves(confidence, correct=None) -> pd.DataFrame:
+    """
+    Coverage and accuracy of the AI grades kept at every confidence threshold.
+
+    Computed in one sort and cumulative sum: for each distinct confidence t,
+    the rows with confidence >= t are those up to the last occurrence of t
+    in the descending order.
+
+    Args:
+        confidence: Confidence of each graded row; non-numeric values are ignored
+        correct: Whether each row's AI grade agrees with the human grade, or
+                 None when there are no human grades to compare with
+
+    Returns:
+        DataFrame with one row per distinct confidence, highest first:
+        'umbral', 'n' (rows kept), 'cobertura' (% of rows kept) and, if
+        correct is given, 'acierto' (% of kept rows that agree)
+    """
+    confidence = pd.to_numeric(pd.Series(confidence).reset_index(drop=True), errors='coerce')
+    valid = confidence.notna().to_numpy()
+    values = confidence.to_numpy(dtype=float)[valid]
+
+    order = np.argsort(-values, kind='stable')
+    values = values[order]
+    # Last position of each distinct value in the descending order
+    last = np.flatnonzero(np.append(values[1:] != values[:-1], True)) if len(values) else np.empty(0, dtype=int)
+    kept = last + 1
+
+    result = pd.DataFrame({
+        'umbral': values[last],
+        'n': kept,
+        'cobertura': kept / max(len(values), 1) * 100,
+    })
+    if correct is not None:
+        hits = np.cumsum(np.asarray(correct, dtype=float)[valid][order])
+        result['acierto'] = hits[last] / kept * 100
+    return result
+
+
+def at_threshold(table: pd.DataFrame, threshold: float) -> pd.Series:
+    """
+    Row of a curves table that applies at a threshold.
+
+    Args:
+        table: Result of curves
+        threshold: Minimum confidence
+
+    Returns:
+        The row of the lowest tabulated confidence >= threshold, or None if
+        no row reaches it
+    """
+    # 'umbral' is descending: count the values that are >= threshold
+    position = int(np.searchsorted(-table['umbral'].to_numpy(), -threshold, side='right')) - 1
+    if position < 0:
+        return None
+    return table.iloc[position]
+
+
+def suggest_threshold(table: pd.DataFrame, target_accuracy: float, min_rows: int = 1) -> float:
+    """
+    Lowest threshold whose kept rows reach a target accuracy.
+
+    Args:
+        table: Result of curves, with the 'acierto' column
+        target_accuracy: Required accuracy, in %
+        min_rows: Minimum number of kept rows for a threshold to count
+
+    Returns:
+        The threshold with the largest coverage meeting the target, or None
+    """
+    ok = table[(table['acierto'] >= target_accuracy) & (table['n'] >= min_rows)]
+    if ok.empty:
+        return None
+    return float(ok['umbral'].iloc[-1])
+
+
+def agreement(df_result: pd.DataFrame) -> tuple:
+    """
+    Confidence and agreement with the human grade of the rows of a test run.
+
+    Args:
+        df_result: DataFrame returned by evaluate_dataframe in test mode
+
+    Returns:
+        tuple: (confidence Series, boolean array of AI grade == human grade);
+               failed rows (grade -1) count as wrong
+    """
+    graded = df_result[df_result['nota IA'].notna()]
+    nota_ia = pd.to_numeric(graded['nota IA'], errors='coerce')
+    nota = pd.to_numeric(graded['Nota'], errors='coerce')
+    return graded['confidence'], (nota_ia == nota).to_numpy()
@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Tuple
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    similarity: float = 0.9,
+    block_size: int = 1024
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group answers that say the same thing in different words.
+
+    Greedy threshold clustering on cosine similarity: answers are taken in
+    order of how many neighbours they have above the threshold, and each one
+    not yet assigned starts a cluster with its neighbours that are not yet
+    assigned either, until every answer is assigned. Every member is therefore
+    at least `similarity` away from the answer that opened its cluster, which
+    avoids the chaining of single-linkage clustering. Each cluster is then
+    represented by its medoid, the member most similar to the rest.
+
+    The similarity matrix is computed in blocks of rows, once to count the
+    neighbours and once for the answers that open clusters, and is never
+    kept whole, so memory stays linear in the number of answers.
+
+    Args:
+        embeddings: One embedding per answer
+        similarity: Minimum cosine similarity to join a cluster
+        block_size: Rows of the similarity matrix computed at once
+
+    Returns:
+        tuple: (cluster id of each answer, position of the medoid of each cluster,
+                cosine similarity of each answer to its cluster's medoid)
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    n = len(vectors)
+
+    degree = np.empty(n, dtype=np.int64)
+    for start in range(0, n, block_size):
+        degree[start:start + block_size] = (vectors[start:start + block_size] @ vectors.T >= similarity).sum(axis=1)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    order = np.argsort(-degree, kind='stable')
+    n_clusters = 0
+    cursor = 0
+    while cursor < n:
+        # Next answers still unassigned; some may join a cluster opened earlier in the block
+        seeds = []
+        while cursor < n and len(seeds) < block_size:
+            if labels[order[cursor]] == -1:
+                seeds.append(order[cursor])
+            cursor += 1
+        if not seeds:
+            break
+
+        for seed, row in zip(seeds, vectors[seeds] @ vectors.T):
+            if labels[seed] != -1:
+                continue
+            members = np.flatnonzero((row >= similarity) & (labels == -1))
+            # An answer is always similar to itself, but guard against rounding
+            labels[np.union1d(members, [seed])] = n_clusters
+            n_clusters += 1
+
+    medoids = np.empty(n_clusters, dtype=np.int64)
+    to_medoid = np.empty(n, dtype=np.float32)
+    order = np.argsort(labels, kind='stable')
+    for cluster, members in enumerate(np.split(order, np.cumsum(np.bincount(labels, minlength=n_clusters))[:-1])):
+        # Sum of similarities to the other members, without the m x m matrix
+        total_similarity = vectors[members] @ vectors[members].sum(axis=0)
+        medoids[cluster] = members[total_similarity.argmax()]
+        to_medoid[members] = vectors[members] @ vectors[medoids[cluster]]
+
+    return labels, medoids, to_medoid
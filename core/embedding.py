@@ -1,75 +1,440 @@
-from sentence_transformers import SentenceTransformer
-import faiss
+import threading
+import time
 import numpy as np
-from typing import Tuple, List, Dict
+from typing import Callable, Tuple, List, Dict, TYPE_CHECKING
+from core import metrics, utils
+from core.cache import EmbeddingCache
 
-# Initialize the embedding model globally to avoid reloading
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# torch, sentence_transformers and faiss are slow to import: they are only
+# loaded on first use so the GUI can start without them
+if TYPE_CHECKING:
+    import faiss
 
-def build_index(responses: List[str], labels: List[int]) -> Tuple[faiss.Index, np.ndarray, Dict[int, Tuple[str, int]]]:
+MODEL_NAME = 'all-MiniLM-L6-v2'
+CACHE_DIR = '.cache/embeddings'
+
+# Index types accepted by build_index/make_index; 'auto' picks one from the bank size
+INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivf', 'ivfpq')
+
+# The embedding model is loaded once, on first use or by warm_up()
+embedding_model = None
+_model_lock = threading.Lock()
+
+# Persistent embedding cache shared by every index build and retrieval
+embedding_cache = EmbeddingCache(CACHE_DIR, MODEL_NAME)
+
+def get_embedding_model():
+    """
+    Returns the shared SentenceTransformer, loading it on first call.
+
+    Returns:
+        The loaded embedding model
+    """
+    global embedding_model
+    if embedding_model is None:
+        with _model_lock:
+            if embedding_model is None:
+                start = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                embedding_model = SentenceTransformer(MODEL_NAME)
+                utils.record_timing('Carga del modelo de embeddings', time.perf_counter() - start)
+    return embedding_model
+
+def warm_up() -> threading.Thread:
+    """
+    Loads the embedding model and FAISS in a background thread.
+
+    Meant to run while the user is still choosing the file and columns, so the
+    first Test or AI Correction does not pay the model loading time.
+
+    Returns:
+        The started daemon thread
+    """
+    def _load():
+        start = time.perf_counter()
+        try:
+            get_embedding_model()
+            import faiss
+            print(f"Modelo de embeddings precargado en {time.perf_counter() - start:.1f} s")
+        except Exception as e:
+            # The error will be raised again on first real use
+            print(f"Error precargando el modelo de embeddings: {e}")
+
+    thread = threading.Thread(target=_load, name='embedding-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+@metrics.timed('encode')
+def encode(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Encodes texts, only running the model on texts missing from the cache.
+
+    Args:
+        texts: Texts to encode
+        batch_size: Encoder batch size
+
+    Returns:
+        float32 matrix with one embedding per text, in input order
+    """
+    texts = [str(t) for t in texts]
+    vectors, missing = embedding_cache.lookup(texts)
+    metrics.count('embedding_cache_hits', len(texts) - len(missing))
+    metrics.count('embedding_cache_misses', len(missing))
+
+    if missing:
+        # Encode each distinct missing text once
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        encoded = get_embedding_model().encode(unique, convert_to_numpy=True, batch_size=batch_size)
+        embedding_cache.store(unique, encoded)
+
+        if vectors is None:
+            vectors = np.zeros((len(texts), encoded.shape[1]), dtype=np.float32)
+        position = {text: i for i, text in enumerate(unique)}
+        for i in missing:
+            vectors[i] = encoded[position[texts[i]]]
+
+    return vectors
+
+def build_index(
+    responses: List[str],
+    labels: List[int],
+    index_type: str = 'auto',
+    embeddings: np.ndarray = None
+) -> Tuple['LabelPartitionedIndex', np.ndarray, Dict[int, Tuple[str, int]]]:
     """
     Builds a FAISS index for semantic similarity search of responses.
+
+    Only responses missing from the embedding cache are encoded. Vectors are
+    normalized and searched by inner product, so scores are cosine similarities.
+    The index holds one sub-index per label, with response positions as ids.
     
     Args:
         responses: List of text responses to index
-        labels: List of corresponding labels (1=correct, 0=incorrect)
+        labels: List of corresponding labels (any integer grades)
+        index_type: One of INDEX_TYPES (see make_index), chosen per label
+        embeddings: Normalized embeddings of the responses, if already computed
         
     Returns:
-        tuple: (FAISS index, response embeddings, index-to-response/label mapping)
+        tuple: (partitioned index, normalized response embeddings, index-to-response/label mapping)
     """
     # Generate embeddings for all responses
-    embeddings = embedding_model.encode(responses, convert_to_numpy=True)
-    dim = embeddings.shape[1]
+    if embeddings is None:
+        embeddings = normalize(encode(responses))
 
     # Create and populate FAISS index
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
+    index = LabelPartitionedIndex(embeddings.shape[1], lambda vectors: make_index(vectors, index_type))
+    index.add(embeddings, np.arange(len(responses)), labels)
 
     # Create mapping from index to (response, label) pairs
     idx_map = {i: (resp, lbl) for i, (resp, lbl) in enumerate(zip(responses, labels))}
     return index, embeddings, idx_map
 
-def retrieve_examples(
-    index: faiss.Index, 
-    idx_map: Dict[int, Tuple[str, int]], 
-    answer: str, 
-    top_k: int = 10
-) -> Tuple[List[str], List[str]]:
+def make_index(embeddings: np.ndarray, index_type: str = 'auto') -> 'faiss.Index':
     """
-    Retrieves similar correct and incorrect examples for a given answer.
-    
+    Creates an empty inner-product index suited to a bank of normalized embeddings.
+
+    Parameters follow the size of the bank:
+        - flat: exact search, best below ~10k answers
+        - hnsw: graph search, 32 links per node, efSearch 64
+        - ivf: 4*sqrt(n) inverted lists, probing 1/16 of them (at least 8)
+        - ivfpq: as ivf, with vectors compressed to 1 byte per 4 dimensions
+    'auto' uses flat below 10k answers, hnsw below 2M and ivfpq above, where
+    the memory of uncompressed vectors becomes the limit. Indexes that need
+    training are trained on (a sample of) the given embeddings.
+
+    Args:
+        embeddings: Normalized float32 embeddings the index will hold
+        index_type: One of INDEX_TYPES
+
+    Returns:
+        Trained, empty FAISS index
+
+    Raises:
+        ValueError: If the index type is unknown.
+    """
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: {index_type}")
+
+    n, dim = embeddings.shape
+    if index_type == 'auto':
+        index_type = 'flat' if n < 10_000 else 'hnsw' if n < 2_000_000 else 'ivfpq'
+
+    if index_type == 'flat':
+        return faiss.IndexFlatIP(dim)
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+        return index
+
+    # k-means needs ~39 points per list; small banks get fewer lists
+    nlist = int(max(1, min(4 * np.sqrt(n), n // 39)))
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == 'ivfpq' and n >= 39 * 256 and dim % 4 == 0:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, dim // 4, 8, faiss.METRIC_INNER_PRODUCT)
+    else:
+        # Too few vectors to train the product quantizer
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+
+    # Train the centroids on 100 points per list, or 50,000 if that is more; smaller banks are used whole
+    sample = max(100 * nlist, 50_000)
+    if n > sample:
+        embeddings = embeddings[np.random.default_rng(0).choice(n, sample, replace=False)]
+    index.train(embeddings)
+    index.nprobe = min(nlist, max(8, nlist // 16))
+    return index
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales embeddings to unit length, so inner product equals cosine similarity.
+
+    Args:
+        vectors: Embedding matrix
+
+    Returns:
+        New float32 matrix with unit-length rows
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+class LabelPartitionedIndex:
+    """
+    Set of FAISS sub-indexes, one per label, searched together or per label.
+
+    Searching each label on its own always yields the k nearest examples of
+    every grade, whatever the balance of the neighbourhood. Vectors are kept
+    under caller-given ids (IndexIDMap2), so they can be removed and moved
+    between labels.
+
+    Attributes:
+        d (int): Embedding dimension
+        partitions (dict): Label -> FAISS index
+    """
+
+    def __init__(self, dim: int, index_factory: Callable[[np.ndarray], 'faiss.Index'] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            dim: Embedding dimension
+            index_factory: Creates the (trained, empty) index of a label from its
+                vectors; exact inner-product search if None
+        """
+        self.d = dim
+        self.partitions = {}
+        self._factory = index_factory
+
+    @property
+    def ntotal(self) -> int:
+        """Number of indexed vectors."""
+        return sum(index.ntotal for index in self.partitions.values())
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray, labels: List[int]):
+        """
+        Add vectors under the given ids.
+
+        Args:
+            vectors: Normalized embeddings
+            ids: int64 id of each vector
+            labels: Label of each vector
+        """
+        import faiss
+
+        labels = np.asarray(labels)
+        ids = np.asarray(ids, dtype=np.int64)
+        for label in np.unique(labels):
+            mask = labels == label
+            label = label.item()
+            if label not in self.partitions:
+                base = self._factory(vectors[mask]) if self._factory is not None else faiss.IndexFlatIP(self.d)
+                self.partitions[label] = faiss.IndexIDMap2(base)
+            self.partitions[label].add_with_ids(np.ascontiguousarray(vectors[mask]), ids[mask])
+
+    def remove(self, ids: np.ndarray, label=None):
+        """
+        Remove vectors by id.
+
+        Args:
+            ids: Ids to remove
+            label: Label holding them, or None to look in every label
+        """
+        import faiss
+
+        selector = faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64))
+        for key in ([label] if label is not None else list(self.partitions)):
+            if key in self.partitions:
+                self.partitions[key].remove_ids(selector)
+                if self.partitions[key].ntotal == 0:
+                    del self.partitions[key]
+
+    def reconstruct(self, id_: int, label) -> np.ndarray:
+        """Stored vector of an id in a label."""
+        return self.partitions[label].reconstruct(int(id_))
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest neighbours across all labels.
+
+        Args:
+            vectors: Normalized queries
+            k: Neighbours per query
+
+        Returns:
+            tuple: (similarities, ids), nearest first; -1 ids where there are fewer than k
+        """
+        results = self.search_by_label(vectors, k)
+        if not results:
+            return np.full((len(vectors), k), -np.inf, dtype=np.float32), np.full((len(vectors), k), -1, dtype=np.int64)
+
+        D = np.concatenate([D for D, _ in results.values()], axis=1)
+        I = np.concatenate([I for _, I in results.values()], axis=1)
+        D = np.where(I < 0, -np.inf, D)
+        order = np.argsort(-D, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def search_by_label(self, vectors: np.ndarray, k: int) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Nearest neighbours of each label.
+
+        Args:
+            vectors: Normalized queries
+            k: Neighbours per query and label
+
+        Returns:
+            dict: label -> (similarities, ids), each of shape (queries, k)
+        """
+        return {label: index.search(vectors, k) for label, index in sorted(self.partitions.items())}
+
+def retrieve_examples_by_label(
+    index: LabelPartitionedIndex,
+    idx_map: Dict[int, Tuple[str, int]],
+    vectors: np.ndarray,
+    lookup_vectors: Callable[[np.ndarray], np.ndarray],
+    k: int = 3,
+    diversity: float = 0.0
+) -> List[Dict[int, List[str]]]:
+    """
+    Retrieves the k most similar examples of every label for many answers.
+
+    Each label is searched on its own, so every prompt gets the same number
+    of examples per grade at a fixed search cost. With diversity > 0,
+    examples are chosen by maximal marginal relevance among 4k candidates:
+    each new example maximizes (1 - diversity) * similarity to the answer
+    minus diversity * similarity to the examples already chosen, which skips
+    near-identical examples.
+
+    Args:
+        index: Partitioned index of the graded answers
+        idx_map: Mapping from ids to (response, label) pairs
+        vectors: Normalized answer embeddings
+        lookup_vectors: Returns the stored embeddings of an array of ids
+        k: Examples per label
+        diversity: Weight of redundancy in MMR, between 0 (plain nearest) and 1
+
+    Returns:
+        list: For each answer, label -> example texts, most relevant first
+    """
+    candidates = k * 4 if diversity > 0 else k * 2
+    examples = [{} for _ in range(len(vectors))]
+
+    for label, (D, I) in index.search_by_label(vectors, candidates).items():
+        candidate_vectors = lookup_vectors(I) if diversity > 0 else None
+        for row, (similarities, ids) in enumerate(zip(D, I)):
+            valid = ids >= 0
+            similarities, ids = similarities[valid], ids[valid]
+            if diversity > 0:
+                chosen = _mmr(similarities, candidate_vectors[row][valid], k, diversity, [idx_map[i][0] for i in ids])
+            else:
+                chosen = range(len(ids))
+
+            texts = []
+            for position in chosen:
+                text = idx_map[ids[position]][0]
+                # Skip repeated texts
+                if text not in texts:
+                    texts.append(text)
+                if len(texts) == k:
+                    break
+            examples[row][label] = texts
+
+    return examples
+
+def _mmr(similarities: np.ndarray, candidates: np.ndarray, k: int, diversity: float, texts: List[str]) -> List[int]:
+    """
+    Greedy maximal marginal relevance selection.
+
+    Args:
+        similarities: Similarity of each candidate to the query
+        candidates: Candidate embeddings
+        k: Number of candidates to select
+        diversity: Weight of the redundancy penalty
+        texts: Candidate texts; repeated texts are never selected twice
+
+    Returns:
+        Positions of the selected candidates, in selection order
+    """
+    selected, seen = [], set()
+    redundancy = np.full(len(similarities), -np.inf, dtype=np.float32)
+    available = np.ones(len(similarities), dtype=bool)
+    while len(selected) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0)
+        score = np.where(available, (1 - diversity) * similarities - diversity * penalty, -np.inf)
+        best = int(score.argmax())
+        available[best] = False
+        if texts[best] in seen:
+            continue
+        seen.add(texts[best])
+        selected.append(best)
+        redundancy = np.maximum(redundancy, candidates @ candidates[best])
+    return selected
+
+def search_batch(
+    index: 'faiss.Index',
+    answers: List[str],
+    top_k: int = 10,
+    batch_size: int = 64,
+    vectors: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Encodes answers in one pass and searches their nearest graded answers.
+
     Args:
         index: Pre-built FAISS index
-        idx_map: Mapping from FAISS indices to (response, label) pairs
-        answer: Input answer to find similar examples for
-        top_k: Number of similar items to retrieve initially
-        
+        answers: Input answers, at least one
+        top_k: Number of neighbours per answer
+        batch_size: Encoder batch size
+        vectors: Normalized embeddings of the answers, if already computed
+
     Returns:
-        tuple: (list of 3 most similar correct examples, 
-               list of 3 most similar incorrect examples)
+        tuple: (normalized answer embeddings, cosine similarities, FAISS ids),
+               one row per answer, nearest first; missing neighbours have id -1
     """
+    # Encode every query answer in one pass
+    if vectors is None:
+        vectors = normalize(encode(answers, batch_size=batch_size))
 
-    # Encode the query answer
-    vector = embedding_model.encode([answer], convert_to_numpy=True)
-    
-    # Search for similar items in the index
-    D, I = index.search(vector, top_k)
-    correct, incorrect = [], []
-
-    for idx in I[0]:
-        # Skip invalid indices
-        if idx == -1 or idx not in idx_map:
-            continue 
-        resp, lbl = idx_map[idx]
-
-        # Collcet unique examples until we have enough
-        if lbl == 1 and resp not in correct:
-            correct.append(resp)
-        elif lbl == 0 and resp not in incorrect:
-            incorrect.append(resp)
-
-        # Early exit if we have enough examples
-        if len(correct) >= 3 and len(incorrect) >= 3:
-            break
-
-    return correct[:3], incorrect[:3]
\ No newline at end of file
+    # Single matrix search for all answers
+    with metrics.span('search'):
+        D, I = index.search(vectors, top_k)
+    return vectors, D, I
+
+def neighbor_similarities(vectors: np.ndarray, neighbors: np.ndarray, I: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity between each answer and its retrieved neighbours.
+
+    Args:
+        vectors: Answer embeddings, one row per answer
+        neighbors: Embeddings of the retrieved neighbours, shaped I.shape + (dimension,)
+        I: FAISS ids returned by search_batch
+
+    Returns:
+        Matrix shaped like I; missing neighbours (id -1) get -1
+    """
+    dots = np.einsum('nd,nkd->nk', vectors, neighbors)
+    norms = np.linalg.norm(vectors, axis=1)[:, None] * np.linalg.norm(neighbors, axis=2)
+    similarities = dots / np.maximum(norms, 1e-12)
+    similarities[I < 0] = -1
+    return similarities
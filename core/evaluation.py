@@ -0,0 +1,182 @@
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from core import metrics
+from core.embedding import encode, normalize
+from core.export import AI_COLUMNS
+from core.processor import DEFAULT_OPTIONS, evaluate_dataframe
+from core.ratelimit import AdaptiveLimiter
+
+
+def cross_validate(
+    df: pd.DataFrame,
+    n_splits: int = 5,
+    n_repeats: int = 1,
+    options: dict = None,
+    parallel_folds: int = 4,
+    seed: int = 42,
+    on_progress: Callable[[int, int], None] = None,
+    cancel_event: threading.Event = None
+) -> pd.DataFrame:
+    """
+    Estimate the accuracy of the AI grades with stratified k-fold cross-validation.
+
+    The graded answers are split into n_splits folds keeping the share of each
+    grade, n_repeats times with different shuffles. Every fold is graded by
+    evaluate_dataframe using the other folds as examples, so each answer gets
+    one out-of-fold grade per repeat.
+
+    All graded answers are encoded once; each fold builds its index from
+    slices of that matrix instead of encoding again. Folds run concurrently
+    and share one rate limiter, so together they make no more requests than a
+    single run.
+
+    Args:
+        df: DataFrame with the 'Respuesta' and 'Nota' columns; rows without
+            a grade are ignored
+        n_splits: Number of folds, lowered to the count of the rarest grade
+        n_repeats: Number of differently shuffled k-fold splits
+        options: Grading options of evaluate_dataframe; the journal and the
+                 question index are not used
+        parallel_folds: Maximum number of folds graded at the same time
+        seed: Seed of the shuffles
+        on_progress: Called with (graded rows, rows to grade) across all folds
+        cancel_event: Event that stops every fold when set
+
+    Returns:
+        DataFrame with the out-of-fold grades ('nota IA', 'feedback IA',
+        'confidence') of every graded row and repeat, plus 'fold' and
+        'repeat'. Rows not graded because of a cancellation are left out.
+        df.attrs['evaluation'] holds the accuracy (%) and Cohen's kappa of
+        each fold with their mean and standard deviation, the summed
+        confusion matrix (rows: human grade, columns: AI grade, in the order
+        of 'labels') and the number of failed rows, which are excluded.
+
+    Raises:
+        ValueError: If some grade has fewer than two answers.
+    """
+    from sklearn.model_selection import RepeatedStratifiedKFold
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+
+    # AI results of an earlier run would pass for grades of rows a cancelled fold left ungraded
+    df = df.drop(columns=AI_COLUMNS + ['cluster'], errors='ignore')
+    df['Nota'] = pd.to_numeric(df['Nota'], errors='coerce')
+    df = df[df['Nota'].notna()]
+    labels = df['Nota'].astype(int).to_numpy()
+
+    counts = np.unique(labels, return_counts=True)[1]
+    n_splits = min(n_splits, int(counts.min())) if len(counts) else 0
+    if n_splits < 2:
+        raise ValueError("Se necesitan al menos dos respuestas valoradas de cada nota para la validación cruzada.")
+
+    # One embedding matrix for every fold, aligned with the rows of df
+    embeddings = normalize(encode(df['Respuesta'].tolist()))
+
+    splitter = RepeatedStratifiedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=seed)
+    folds = list(splitter.split(np.zeros(len(df)), labels))
+
+    fold_options = {
+        **options,
+        'embeddings': embeddings,
+        'limiter': options['limiter'] or AdaptiveLimiter(max_concurrency=options['max_workers']),
+        'journal_path': None,
+        'question_index': None,
+    }
+    nota_column = df.columns.get_loc('Nota')
+    total = len(df) * n_repeats
+    done = [0] * len(folds)
+    progress_lock = threading.Lock()
+
+    def run_fold(number, test_rows):
+        def fold_progress(graded, _):
+            if on_progress is None:
+                return
+            with progress_lock:
+                done[number] = graded
+                on_progress(sum(done), total)
+
+        # Hide the grades of the fold so it is graded from the other folds. The fold
+        # gets its own index: copies share its lookup engine, which is built lazily
+        # and not safely from several threads
+        fold_df = df.copy()
+        fold_df.index = df.index.copy(deep=True)
+        fold_df.iloc[test_rows, nota_column] = np.nan
+        with metrics.span('evaluation_fold'):
+            result = evaluate_dataframe(
+                fold_df, options=fold_options, on_progress=fold_progress, cancel_event=cancel_event
+            )
+
+        predicted = result.iloc[test_rows].copy()
+        predicted['Nota'] = df['Nota'].iloc[test_rows]
+        predicted['fold'] = number % n_splits
+        predicted['repeat'] = number // n_splits
+        return predicted
+
+    with ThreadPoolExecutor(max_workers=max(1, int(parallel_folds))) as executor:
+        futures = [executor.submit(run_fold, number, test_rows) for number, (_, test_rows) in enumerate(folds)]
+        predictions = [future.result() for future in futures]
+
+    result = pd.concat(predictions)
+    if 'nota IA' in result.columns:
+        result = result[pd.to_numeric(result['nota IA'], errors='coerce').notna()]
+    else:
+        result = result.iloc[0:0].assign(**{'nota IA': [], 'feedback IA': [], 'confidence': []})
+    result.attrs['evaluation'] = summarize(result, np.unique(labels).tolist())
+
+    evaluation = result.attrs['evaluation']
+    print(
+        f"Validación cruzada ({n_splits} particiones x {n_repeats} repeticiones): "
+        f"acierto {evaluation['accuracy_mean']:.1f}% ± {evaluation['accuracy_std']:.1f}, "
+        f"kappa {evaluation['kappa_mean']:.2f} ± {evaluation['kappa_std']:.2f} "
+        f"({evaluation['failed']} respuestas fallidas)"
+    )
+    confusion = pd.DataFrame(evaluation['confusion'], index=evaluation['labels'], columns=evaluation['labels'])
+    print(f"Matriz de confusión (filas: nota, columnas: nota IA):\n{confusion}")
+    return result
+
+
+def summarize(predictions: pd.DataFrame, labels: list) -> dict:
+    """
+    Accuracy, agreement and confusion matrix of out-of-fold grades.
+
+    Args:
+        predictions: Result rows of cross_validate, with 'Nota', 'nota IA', 'fold' and 'repeat'
+        labels: Grades, in the order of the confusion matrix
+
+    Returns:
+        dict: 'folds' (repeat, fold, n, accuracy, kappa of each fold),
+              'accuracy_mean', 'accuracy_std', 'kappa_mean', 'kappa_std',
+              'confusion', 'labels' and 'failed'
+    """
+    from sklearn.metrics import cohen_kappa_score, confusion_matrix
+
+    nota_ia = pd.to_numeric(predictions['nota IA'], errors='coerce')
+    failed = nota_ia == -1
+    valid = predictions[~failed].assign(**{'nota IA': nota_ia[~failed]})
+
+    folds = []
+    confusion = np.zeros((len(labels), len(labels)), dtype=int)
+    for (repeat, fold), rows in valid.groupby(['repeat', 'fold']):
+        truth, predicted = rows['Nota'].astype(int), rows['nota IA'].astype(int)
+        confusion += confusion_matrix(truth, predicted, labels=labels)
+        # Kappa is undefined when both graders give a single grade
+        kappa = cohen_kappa_score(truth, predicted, labels=labels) if len(set(truth) | set(predicted)) > 1 else np.nan
+        folds.append({'repeat': int(repeat), 'fold': int(fold), 'n': len(rows),
+                      'accuracy': float((truth == predicted).mean() * 100), 'kappa': float(kappa)})
+
+    accuracy = np.array([f['accuracy'] for f in folds], dtype=float)
+    kappa = np.array([f['kappa'] for f in folds], dtype=float)
+    kappa = kappa[~np.isnan(kappa)]
+    return {
+        'folds': folds,
+        'accuracy_mean': float(accuracy.mean()) if len(accuracy) else np.nan,
+        'accuracy_std': float(accuracy.std()) if len(accuracy) else np.nan,
+        'kappa_mean': float(kappa.mean()) if len(kappa) else np.nan,
+        'kappa_std': float(kappa.std()) if len(kappa) else np.nan,
+        'confusion': confusion.tolist(),
+        'labels': labels,
+        'failed': int(failed.sum()),
+    }
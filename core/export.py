@@ -0,0 +1,343 @@
+import collections
+import itertools
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List
+from core import metrics
+
+AI_HEADERS = ["Nota IA", "Feedback IA", "Confidence"]
+
+# Columns of the processed table written under each header of AI_HEADERS
+AI_COLUMNS = ['nota IA', 'feedback IA', 'confidence']
+
+# Formats a corrected copy can be written in besides the original one
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+# Rows written between two progress reports
+PROGRESS_STEP = 5000
+
+
+def expand_results(df: pd.DataFrame, relations: dict, threshold: float = None, skip_failed: bool = False) -> pd.DataFrame:
+    """
+    AI results of the original rows, from the results of the processed texts.
+
+    Each kept row of df is repeated over the original rows that hold its
+    text with one vectorized take, instead of one assignment per row.
+
+    Args:
+        df: Processed table with 'Respuesta' and, once graded, the AI columns
+        relations: Processed text -> original data rows (see Table.getRelationDict)
+        threshold: Minimum confidence of an exported grade, or None to keep every graded row
+        skip_failed: If True, rows whose grading failed (grade -1) are not exported
+
+    Returns:
+        DataFrame indexed by original data row (0-based), in order, with the
+        AI_HEADERS columns as text; rows not graded or below the threshold are absent
+
+    Raises:
+        ValueError: If a text of df has no original rows in relations.
+    """
+    results = df.reindex(columns=['Respuesta'] + AI_COLUMNS)
+    confidence = pd.to_numeric(results['confidence'], errors='coerce')
+    keep = confidence.notna()
+    if threshold is not None:
+        keep &= confidence >= threshold
+    if skip_failed:
+        keep &= pd.to_numeric(results['nota IA'], errors='coerce') != -1
+    results = results[keep.to_numpy()]
+
+    missing = [text for text in results['Respuesta'] if text not in relations]
+    if missing:
+        raise ValueError(f"Error en el texto: {missing[0]} -> no se encuentra en el archivo original")
+
+    groups = [relations[text] for text in results['Respuesta']]
+    lengths = np.fromiter((len(group) for group in groups), dtype=np.int64, count=len(groups))
+    rows = np.fromiter(itertools.chain.from_iterable(groups), dtype=np.int64, count=int(lengths.sum()))
+    source = np.repeat(np.arange(len(results)), lengths)
+
+    expanded = pd.DataFrame(
+        {header: results[column].astype(str).to_numpy()[source] for header, column in zip(AI_HEADERS, AI_COLUMNS)},
+        index=rows
+    )
+    return expanded.sort_index()
+
+
+def output_path(file_name: str, output_dir: str = 'outputs', extension: str = None, suffix: str = '') -> str:
+    """
+    Build the path of the corrected copy of an exam file.
+
+    Args:
+        file_name: Path of the original file
+        output_dir: Folder for corrected files, created if missing
+        extension: Extension of the output file; defaults to the original one
+        suffix: Text added after the name, to tell apart several copies of one file
+
+    Returns:
+        Path '<output_dir>/<name><suffix> - corregido<extension>'
+    """
+    path = pathlib.PurePath(file_name)
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"{path.stem}{suffix} - corregido{extension or path.suffix}")
+
+
+def ai_headers(label: str = None) -> list:
+    """
+    Headers of the AI columns of a question.
+
+    Args:
+        label: Question added to each header, or None for AI_HEADERS
+
+    Returns:
+        list: 'Nota IA (<label>)', 'Feedback IA (<label>)' and 'Confidence (<label>)'
+    """
+    return list(AI_HEADERS) if label is None else [f"{header} ({label})" for header in AI_HEADERS]
+
+
+def save_results(
+    file_name: str,
+    sheet_name: str,
+    idxCorr: int,
+    grades: Dict[int, str],
+    ai_results: pd.DataFrame,
+    output_dir: str = 'outputs',
+    suffix: str = '',
+    output_format: str = None,
+    on_progress: Callable[[int, int], None] = None
+) -> str:
+    """
+    Write manual grades and AI results into a copy of the original file.
+
+    The original file is only opened here, at export time. By default the
+    copy has the format of the original and, for Excel workbooks, keeps their
+    other sheets and formatting. With output_format only the graded sheet is
+    written, as values: 'xlsx' streams it into a write-only workbook, which
+    is much faster on large exams; 'csv' and 'parquet' write a table.
+
+    Args:
+        file_name: Path of the original file
+        sheet_name: Worksheet that was graded (ignored for CSV and Parquet)
+        idxCorr: Index of the grade column in the file
+        grades: Original data row (0-based) -> manual grade, None to clear it
+        ai_results: AI results by original data row (see expand_results)
+        output_dir: Folder for corrected files
+        suffix: Text added to the output file name (see output_path)
+        output_format: None for the original format, or one of OUTPUT_FORMATS
+        on_progress: Called with (rows written, total rows) while writing
+
+    Returns:
+        Path of the saved file
+
+    Raises:
+        ValueError: If output_format is not supported.
+    """
+    correction = {'sheet': sheet_name, 'idxCorr': idxCorr, 'grades': grades, 'ai_results': ai_results}
+    return save_corrections(file_name, [correction], output_dir, suffix, output_format, on_progress)[0]
+
+
+@metrics.timed('export')
+def save_corrections(
+    file_name: str,
+    corrections: List[dict],
+    output_dir: str = 'outputs',
+    suffix: str = '',
+    output_format: str = None,
+    on_progress: Callable[[int, int], None] = None
+) -> List[str]:
+    """
+    Write the grades and AI results of several questions into one copy of the original file.
+
+    Works as save_results for every question at once. The AI columns of a
+    question are inserted after its grade column, so the columns already
+    there move right instead of being overwritten; a copy that already has
+    them, such as a file corrected before, gets them updated in place. When
+    a sheet has several questions, the headers carry the question's label.
+    With output_format, every graded sheet is written to the same workbook;
+    CSV and Parquet copies get one file per sheet.
+
+    Args:
+        file_name: Path of the original file
+        corrections: One dict per question with 'sheet', 'idxCorr', 'grades'
+                     and 'ai_results' (see save_results) and an optional 'label'
+        output_dir: Folder for corrected files
+        suffix: Text added to the output file name (see output_path)
+        output_format: None for the original format, or one of OUTPUT_FORMATS
+        on_progress: Called with (rows written, total rows) while writing
+
+    Returns:
+        list: Paths of the saved files
+
+    Raises:
+        ValueError: If output_format is not supported.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de salida no soportado: {output_format}")
+    report = on_progress or (lambda done, total: None)
+
+    questions_per_sheet = collections.Counter(correction['sheet'] for correction in corrections)
+    # Rightmost questions first, so inserted columns do not move the grade columns still to write
+    corrections = sorted(corrections, key=lambda correction: -correction['idxCorr'])
+
+    def headers_of(correction):
+        shared = questions_per_sheet[correction['sheet']] > 1
+        return ai_headers(correction.get('label') if shared else None)
+
+    if output_format is None and extension in ('.xlsx', '.xlsm'):
+        import openpyxl as xl
+
+        wb = xl.load_workbook(file_name, keep_vba=extension == '.xlsm')
+        total = sum(len(correction['grades']) + len(correction['ai_results']) for correction in corrections)
+        report(0, total)
+
+        done = 0
+        for correction in corrections:
+            excel = wb[correction['sheet']]
+            idxCorr, ai_results = correction['idxCorr'], correction['ai_results']
+            for idRow, value in correction['grades'].items():
+                excel.cell(row=idRow + 2, column=idxCorr + 1).value = value
+            done += len(correction['grades'])
+
+            columns = []
+            if len(ai_results):
+                headers = headers_of(correction)
+                existing = {cell.value: cell.column for cell in excel[1] if cell.value is not None}
+                if all(header in existing for header in headers):
+                    columns = [existing[header] for header in headers]
+                else:
+                    excel.insert_cols(idxCorr + 2, len(headers))
+                    columns = list(range(idxCorr + 2, idxCorr + 2 + len(headers)))
+                    for column, header in zip(columns, headers):
+                        excel.cell(row=1, column=column).value = header
+            for idRow, *values in ai_results[AI_HEADERS].itertuples():
+                for column, value in zip(columns, values):
+                    excel.cell(row=idRow + 2, column=column).value = value
+                done += 1
+                if done % PROGRESS_STEP == 0:
+                    report(done, total)
+
+        path = output_path(file_name, output_dir, suffix=suffix)
+        wb.save(path)
+        report(total, total)
+        return [path]
+
+    # Everything else is rebuilt as a table with whole-column assignments
+    tables = {sheet: _read_table(file_name, sheet, extension) for sheet in questions_per_sheet}
+    total = sum(len(df) for df in tables.values())
+    report(0, total)
+
+    # Columns holding grades, written as one type to Parquet
+    written = {sheet: [] for sheet in tables}
+    for correction in corrections:
+        df, idxCorr, ai_results = tables[correction['sheet']], correction['idxCorr'], correction['ai_results']
+        grades = correction['grades']
+        grade_col = df.columns[idxCorr]
+        df[grade_col] = df[grade_col].astype(object)
+        if grades:
+            df.iloc[list(grades), idxCorr] = list(grades.values())
+        written[correction['sheet']].append(grade_col)
+
+        if len(ai_results):
+            headers = headers_of(correction)
+            for offset, (header, source) in enumerate(zip(headers, AI_HEADERS)):
+                if header not in df.columns:
+                    df.insert(idxCorr + 1 + offset, header, None)
+                column = df[header].astype(object)
+                column.iloc[ai_results.index.to_numpy()] = ai_results[source].to_numpy()
+                df[header] = column
+            written[correction['sheet']].extend(headers)
+
+    output_format = output_format or {'.csv': 'csv', '.parquet': 'parquet'}.get(extension, 'xlsx')
+    if output_format == 'xlsx':
+        paths = [output_path(file_name, output_dir, extension='.xlsx', suffix=suffix)]
+        _write_xlsx_streaming(tables, paths[0], report)
+    else:
+        paths = []
+        for sheet, df in tables.items():
+            sheet_suffix = f"{suffix} - {sheet}" if len(tables) > 1 else suffix
+            path = output_path(file_name, output_dir, extension=f'.{output_format}', suffix=sheet_suffix)
+            if output_format == 'csv':
+                df.to_csv(path, index=False)
+            else:
+                for column in dict.fromkeys(written[sheet]):
+                    df[column] = _arrow_safe(df[column])
+                df.to_parquet(path, index=False)
+            paths.append(path)
+    report(total, total)
+    return paths
+
+
+def _read_table(file_name: str, sheet_name: str, extension: str) -> pd.DataFrame:
+    """
+    Read the whole graded sheet or table of an exam file.
+
+    Args:
+        file_name: Path of the original file
+        sheet_name: Worksheet to read (ignored for CSV and Parquet)
+        extension: Lowercase extension of the file
+
+    Returns:
+        DataFrame with every column of the sheet
+    """
+    if extension == '.csv':
+        return pd.read_csv(file_name)
+    if extension == '.parquet':
+        return pd.read_parquet(file_name)
+    if extension not in ('.xlsx', '.xlsm'):
+        return pd.read_excel(file_name, sheet_name=sheet_name)
+
+    # Streaming the values of the sheet is much faster than pd.read_excel
+    import openpyxl as xl
+
+    wb = xl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = [f"Unnamed: {i}" if value is None else str(value) for i, value in enumerate(next(rows, ()))]
+        return pd.DataFrame.from_records(list(rows), columns=header)
+    finally:
+        wb.close()
+
+
+def _write_xlsx_streaming(tables: Dict[str, pd.DataFrame], path: str, report: Callable[[int, int], None]):
+    """
+    Write tables to a write-only workbook, row by row without keeping cells in memory.
+
+    Args:
+        tables: Worksheet name (None for 'Hoja1') -> table to write
+        path: Output workbook
+        report: Progress callback (rows written, total rows)
+    """
+    import openpyxl as xl
+
+    wb = xl.Workbook(write_only=True)
+    total = sum(len(df) for df in tables.values())
+    done = 0
+    for sheet_name, df in tables.items():
+        ws = wb.create_sheet(sheet_name or 'Hoja1')
+        ws.append([str(column) for column in df.columns])
+
+        # Missing values become empty cells
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+            done += 1
+            if done % PROGRESS_STEP == 0:
+                report(done, total)
+    wb.save(path)
+
+
+def _arrow_safe(series: pd.Series) -> pd.Series:
+    """
+    Give a mixed object column a single type so it can be written to Parquet.
+
+    Args:
+        series: Column holding strings, numbers and missing values
+
+    Returns:
+        Numeric column if every value is numeric, otherwise a string column
+    """
+    try:
+        return pd.to_numeric(series)
+    except (ValueError, TypeError):
+        return series.map(lambda value: None if pd.isna(value) else str(value))
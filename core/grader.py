@@ -1,29 +1,278 @@
 import json
 import re
-from openai import OpenAI
-from core import utils
+import threading
+import time
+from core import metrics, utils
+from core.cache import ResponseCache, request_key
+from core.ratelimit import AdaptiveLimiter, backoff_delay
 import os
 
-client = OpenAI(api_key=utils.read_api_key_from_file()) 
+MODEL = "gpt-4o"
+PARAMS = {"temperature": 0, "max_tokens": 64}
 
-def grade(system_prompt, user_prompt):
+# Appended to the system prompt when several answers are graded in one request
+PACKED_INSTRUCTION = (
+    "Se te darán varias respuestas de estudiantes numeradas como [1], [2], ... "
+    "Evalúa cada una por separado con los mismos criterios. En lugar de un único objeto, "
+    "devuelve solo un array JSON con un objeto por respuesta, en el mismo orden, con los campos "
+    "\"id\" (número de la respuesta), \"grade\", \"feedback\" y \"confidence\"."
+)
+
+# The OpenAI client (and the openai package) is created on first use
+client = None
+_client_lock = threading.Lock()
+
+# Responses already paid for, reused across runs and sessions
+response_cache = ResponseCache('.cache/responses.sqlite')
+
+def get_client():
+    """
+    Return the shared OpenAI client, creating it on first call.
+
+    The key is read from api_key.txt, or from OPENAI_API_KEY if the file is
+    missing or empty. OPENAI_BASE_URL points the client to another
+    OpenAI-compatible server, such as the benchmark mock server.
+
+    Returns:
+        openai.OpenAI client
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(
+                    api_key=utils.read_api_key_from_file() or os.environ.get('OPENAI_API_KEY'),
+                    base_url=os.environ.get('OPENAI_BASE_URL') or None,
+                    # Retries are handled by _request with the shared limiter
+                    max_retries=0
+                )
+    return client
+
+def grade(system_prompt, user_prompt, limiter: AdaptiveLimiter = None, max_retries: int = 6,
+          cache: ResponseCache = None):
+    """
+    Grade a single answer with GPT-4o.
+
+    If a cache is given, an identical request (model, parameters and messages)
+    graded before is answered from it without calling the API.
+
+    Rate-limit (429), timeout, connection and server errors are retried with the
+    delay requested by the provider's headers (or exponential back-off), so only
+    non-recoverable errors turn into a -1 grade.
+
+    Args:
+        system_prompt: System message for the model
+        user_prompt: User message containing the answer to grade
+        limiter: Shared concurrency limiter; a private one is used if None
+        max_retries: Maximum number of retries for recoverable errors
+        cache: Response cache to read from and write to, or None
+
+    Returns:
+        tuple: (grade, feedback, confidence). grade is -1 on failure.
+    """
+    messages = _messages(system_prompt, user_prompt)
+
+    key = None
+    if cache is not None:
+        key = request_key(MODEL, PARAMS, messages)
+        content = cache.get(key)
+        if content is not None:
+            metrics.count('response_cache_hits')
+            return _parse_response(content)
+        metrics.count('response_cache_misses')
+
+    content, error = _request(messages, PARAMS, limiter, max_retries)
+    if error is not None:
+        return -1, error, 0
+    result = _parse_response(content)
+
+    # Only cache answers we could parse, so bad outputs are retried later
+    if key is not None and result[0] != -1:
+        cache.put(key, content)
+    return result
+
+def grade_batch(system_prompt, user_prompt, n_answers: int, limiter: AdaptiveLimiter = None,
+                max_retries: int = 6, cache: ResponseCache = None):
+    """
+    Grade several answers packed into a single request.
+
+    The user prompt must list the answers numbered from 1 (see pack_answers).
+    The model is asked for a JSON array with one object per answer, and every
+    item is parsed on its own, so a malformed or missing item does not discard
+    the rest of the response.
+
+    Args:
+        system_prompt: System message for the model
+        user_prompt: User message containing the numbered answers
+        n_answers: Number of answers in the user prompt
+        limiter: Shared concurrency limiter; a private one is used if None
+        max_retries: Maximum number of retries for recoverable errors
+        cache: Response cache to read from and write to, or None
+
+    Returns:
+        list: One (grade, feedback, confidence) tuple per answer, in prompt order.
+              Items the model did not return correctly are None, so they can be
+              graded again on their own. If the request fails, every item is None.
+    """
+    messages = _messages(system_prompt + "\n\n" + PACKED_INSTRUCTION, user_prompt)
+    params = {**PARAMS, "max_tokens": PARAMS["max_tokens"] * n_answers}
+
+    key = None
+    if cache is not None:
+        key = request_key(MODEL, params, messages)
+        content = cache.get(key)
+        if content is not None:
+            metrics.count('response_cache_hits')
+            return _parse_batch_response(content, n_answers)
+        metrics.count('response_cache_misses')
+
+    content, error = _request(messages, params, limiter, max_retries)
+    if error is not None:
+        # Each answer is retried in its own request; the error is reported there if it persists
+        return [None] * n_answers
+    results = _parse_batch_response(content, n_answers)
+
+    # Only cache complete responses, so partial outputs are retried later
+    if key is not None and all(result is not None for result in results):
+        cache.put(key, content)
+    return results
+
+def pack_answers(answers) -> str:
+    """
+    Number answers for a packed request.
+
+    Args:
+        answers: Student answers, in the order results are expected
+
+    Returns:
+        One '[i] answer' line per answer, numbered from 1
+    """
+    return "\n".join(f"[{i}] {' '.join(str(answer).split())}" for i, answer in enumerate(answers, 1))
+
+def _messages(system_prompt, user_prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _request(messages, params, limiter: AdaptiveLimiter = None, max_retries: int = 6):
+    """
+    Send a chat completion, retrying recoverable errors.
+
+    Args:
+        messages: Chat messages
+        params: Model parameters (temperature, max_tokens...)
+        limiter: Shared concurrency limiter; a private one is used if None
+        max_retries: Maximum number of retries for recoverable errors
+
+    Returns:
+        tuple: (message content, None) on success or (None, error message)
+    """
+    from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+    if limiter is None:
+        limiter = AdaptiveLimiter(max_concurrency=1)
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            metrics.count('llm_retries')
+        limiter.acquire()
+        start = time.perf_counter()
+        try:
+            raw = get_client().chat.completions.with_raw_response.create(
+                model=MODEL,
+                messages=messages,
+                **params
+            )
+            limiter.on_success(raw.headers)
+            completion = raw.parse()
+            metrics.record_request(time.perf_counter() - start, MODEL, getattr(completion, 'usage', None))
+            return completion.choices[0].message.content, None
+        except RateLimitError as e:
+            metrics.record_request(time.perf_counter() - start, MODEL, outcome='rate_limited')
+            # Quota exhaustion is also a 429 but waiting will not fix it
+            if getattr(e, 'code', None) == 'insufficient_quota' or attempt == max_retries:
+                return None, f"Error GPT-4o: {e}"
+            delay = limiter.on_rate_limited(e.response.headers, attempt)
+        except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+            metrics.record_request(time.perf_counter() - start, MODEL, outcome='retryable_error')
+            if attempt == max_retries:
+                return None, f"Error GPT-4o: {e}"
+            delay = backoff_delay(attempt)
+        except Exception as e:
+            metrics.record_request(time.perf_counter() - start, MODEL, outcome='error')
+            return None, f"Error GPT-4o: {e}"
+        finally:
+            limiter.release()
+
+        # Sleep without holding a slot so other workers can resume after the pause
+        time.sleep(delay)
+
+    return None, "Error GPT-4o: reintentos agotados"
+
+def _parse_response(content):
+    """
+    Extract grade, feedback and confidence from the model's JSON answer.
+
+    Args:
+        content: Raw message content returned by the model
+
+    Returns:
+        tuple: (grade, feedback, confidence)
+    """
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0,
-            max_tokens=64
-        )
-
-        content = response.choices[0].message.content
-        match = re.search(r'\{.*\}', content, re.DOTALL)
+        match = re.search(r'\{.*\}', content or '', re.DOTALL)
         if match:
             result = json.loads(match.group().replace('\n', ' '))
             return float(result.get('grade', -1)), result.get('feedback', ''), float(result.get('confidence', 0))
         else:
             return -1, "Formato JSON no encontrado", 0
     except Exception as e:
-        return -1, f"Error GPT-4o: {e}", 0
\ No newline at end of file
+        return -1, f"Error GPT-4o: {e}", 0
+
+
+def _parse_batch_response(content, n_answers):
+    """
+    Extract one result per answer from the model's JSON array.
+
+    Items are matched by their "id" field, falling back to their position.
+    If the array itself is not valid JSON (for instance, truncated), every
+    complete object found in the text is still used.
+
+    Args:
+        content: Raw message content returned by the model
+        n_answers: Number of answers in the request
+
+    Returns:
+        list: (grade, feedback, confidence) or None for each answer
+    """
+    results = [None] * n_answers
+    content = content or ''
+
+    items = None
+    match = re.search(r'\[.*\]', content, re.DOTALL)
+    if match:
+        try:
+            items = json.loads(match.group())
+        except ValueError:
+            items = None
+    if not isinstance(items, list):
+        items = []
+        for obj in re.findall(r'\{[^{}]*\}', content):
+            try:
+                items.append(json.loads(obj))
+            except ValueError:
+                items.append(None)
+
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(item.get('id', position + 1)) - 1
+            result = (float(item['grade']), str(item.get('feedback', '')), float(item.get('confidence', 0)))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= i < n_answers and results[i] is None:
+            results[i] = result
+    return results
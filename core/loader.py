@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from core import metrics
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + ('.xls', '.csv', '.parquet')
+
+
+@metrics.timed('load')
+def load_answers(file_name: str, sheet_name: str, texts_col: str, corr_col: str) -> Tuple[pd.DataFrame, Tuple[int, int]]:
+    """
+    Load only the answer and grade columns of an exam file.
+
+    Excel workbooks are streamed in read-only mode, so neither the other
+    sheets nor the other columns are kept in memory. CSV and Parquet files
+    only read the two requested columns.
+
+    Args:
+        file_name: Path of an .xlsx/.xlsm/.xls, .csv or .parquet file
+        sheet_name: Worksheet to read (ignored for CSV and Parquet)
+        texts_col: Header of the column with the answers
+        corr_col: Header of the column with the grades
+
+    Returns:
+        tuple: (DataFrame with columns [texts_col, corr_col], one row per data row
+                of the file, (index of texts_col, index of corr_col) in the file)
+
+    Raises:
+        ValueError: If the format is not supported or the sheet or columns do not exist.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+
+    if extension in EXCEL_EXTENSIONS:
+        return _load_excel_streaming(file_name, sheet_name, texts_col, corr_col)
+
+    if extension == '.xls':
+        header = list(pd.read_excel(file_name, sheet_name=sheet_name, nrows=0).columns)
+        positions = _column_positions(header, texts_col, corr_col)
+        df = pd.read_excel(file_name, sheet_name=sheet_name, usecols=[texts_col, corr_col])
+    elif extension == '.csv':
+        header = list(pd.read_csv(file_name, nrows=0).columns)
+        positions = _column_positions(header, texts_col, corr_col)
+        df = pd.read_csv(file_name, usecols=[texts_col, corr_col])
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        header = pq.read_schema(file_name).names
+        positions = _column_positions(header, texts_col, corr_col)
+        df = pd.read_parquet(file_name, columns=[texts_col, corr_col])
+    else:
+        raise ValueError(f"Formato de archivo no soportado: {extension}")
+
+    return df[[texts_col, corr_col]], positions
+
+
+def _load_excel_streaming(file_name: str, sheet_name: str, texts_col: str, corr_col: str) -> Tuple[pd.DataFrame, Tuple[int, int]]:
+    """
+    Read two columns of a worksheet in a single read-only pass.
+
+    Args:
+        file_name: Path of the workbook
+        sheet_name: Worksheet to read
+        texts_col: Header of the column with the answers
+        corr_col: Header of the column with the grades
+
+    Returns:
+        Same as load_answers
+    """
+    import openpyxl as xl
+
+    wb = xl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"La hoja '{sheet_name}' no existe en el archivo.")
+        ws = wb[sheet_name]
+
+        rows = ws.iter_rows(values_only=True)
+        header = [None if value is None else str(value) for value in next(rows, ())]
+        idxTexts, idxCorr = _column_positions(header, texts_col, corr_col)
+
+        texts, grades = [], []
+        for row in rows:
+            texts.append(row[idxTexts] if idxTexts < len(row) else None)
+            grades.append(row[idxCorr] if idxCorr < len(row) else None)
+    finally:
+        wb.close()
+
+    # Drop trailing empty rows, as pandas does
+    last = len(texts)
+    while last > 0 and texts[last - 1] is None and grades[last - 1] is None:
+        last -= 1
+
+    # Empty cells become NaN so they behave like pd.read_excel output
+    df = pd.DataFrame({
+        texts_col: [np.nan if value is None else value for value in texts[:last]],
+        corr_col: [np.nan if value is None else value for value in grades[:last]],
+    })
+    return df, (idxTexts, idxCorr)
+
+
+def _column_positions(header: List[str], texts_col: str, corr_col: str) -> Tuple[int, int]:
+    """
+    Find the positions of the answer and grade columns in a header row.
+
+    Args:
+        header: Column names in file order
+        texts_col: Header of the column with the answers
+        corr_col: Header of the column with the grades
+
+    Returns:
+        tuple: (index of texts_col, index of corr_col)
+
+    Raises:
+        ValueError: If a column is missing.
+    """
+    positions = []
+    for column in (texts_col, corr_col):
+        if column not in header:
+            raise ValueError(f"La columna '{column}' no existe en el archivo.")
+        positions.append(header.index(column))
+    return positions[0], positions[1]
@@ -0,0 +1,258 @@
+import csv
+import functools
+import json
+import os
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+# USD per million tokens (input, cached input, output), used to estimate the cost of a run
+PRICES = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+}
+
+# Shared no-op span returned while metrics are disabled
+_NO_SPAN = nullcontext()
+
+# Collector of the current run; None while metrics are disabled
+_collector = None
+
+
+class RunMetrics:
+    """
+    Performance metrics of a grading run.
+
+    Collects the time spent in each pipeline stage, the latency and token
+    usage of every LLM request, error and retry counts and cache hit
+    counters. Safe to update from the grading threads.
+
+    Stage times are inclusive: a stage that runs inside another (encoding
+    while building the index) is counted in both.
+
+    Attributes:
+        started (float): time.time() when the collector was created
+        stages (dict): Stage name -> [calls, total seconds]
+        latencies (list): Seconds of every LLM request, successful or not
+        counters (dict): Event name -> count (requests, errors, cache hits...)
+        tokens (dict): Model -> {'prompt', 'cached', 'completion'} token totals
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.latencies = []
+        self.counters = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as one call of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self.stages.setdefault(stage, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_request(self, seconds: float, model: str, usage=None, outcome: str = 'ok'):
+        """
+        Record one LLM request.
+
+        Args:
+            seconds: Latency of the request
+            model: Model name
+            usage: 'usage' object of the response, if any
+            outcome: 'ok', 'rate_limited', 'error' or 'retryable_error'
+        """
+        with self._lock:
+            self.latencies.append(seconds)
+            self.counters['llm_requests'] = self.counters.get('llm_requests', 0) + 1
+            if outcome != 'ok':
+                self.counters[f'llm_{outcome}'] = self.counters.get(f'llm_{outcome}', 0) + 1
+            if usage is not None:
+                totals = self.tokens.setdefault(model, {'prompt': 0, 'cached': 0, 'completion': 0})
+                details = getattr(usage, 'prompt_tokens_details', None)
+                totals['prompt'] += getattr(usage, 'prompt_tokens', 0) or 0
+                totals['cached'] += getattr(details, 'cached_tokens', 0) or 0
+                totals['completion'] += getattr(usage, 'completion_tokens', 0) or 0
+
+    def report(self) -> dict:
+        """
+        Summary of the run.
+
+        Returns:
+            dict: stages (calls, seconds), llm (requests, latency percentiles in
+                  ms, errors, retries), tokens and estimated cost, caches (hits,
+                  misses and hit rate) and raw counters
+        """
+        with self._lock:
+            latencies = np.array(self.latencies, dtype=float) * 1000
+            counters = dict(self.counters)
+            tokens = {model: dict(totals) for model, totals in self.tokens.items()}
+            stages = {stage: {'calls': calls, 'seconds': round(seconds, 4)} for stage, (calls, seconds) in self.stages.items()}
+
+        cost = 0.0
+        for model, totals in tokens.items():
+            price_in, price_cached, price_out = PRICES.get(model, PRICES['gpt-4o'])
+            cost += ((totals['prompt'] - totals['cached']) * price_in + totals['cached'] * price_cached
+                     + totals['completion'] * price_out) / 1e6
+
+        llm = {
+            'requests': counters.get('llm_requests', 0),
+            'rate_limited': counters.get('llm_rate_limited', 0),
+            'errors': counters.get('llm_error', 0) + counters.get('llm_retryable_error', 0),
+            'retries': counters.get('llm_retries', 0),
+        }
+        if len(latencies):
+            llm.update({f'latency_p{p}_ms': round(float(np.percentile(latencies, p)), 1) for p in (50, 90, 99)})
+            llm['latency_mean_ms'] = round(float(latencies.mean()), 1)
+            llm['latency_max_ms'] = round(float(latencies.max()), 1)
+
+        caches = {}
+        for cache in ('response_cache', 'embedding_cache'):
+            hits, misses = counters.get(f'{cache}_hits', 0), counters.get(f'{cache}_misses', 0)
+            caches[cache] = {'hits': hits, 'misses': misses,
+                             'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'elapsed_seconds': round(time.time() - self.started, 2),
+            'stages': stages,
+            'llm': llm,
+            'tokens': tokens,
+            'estimated_cost_usd': round(cost, 4),
+            'caches': caches,
+            'counters': counters,
+        }
+
+    def save(self, path: str) -> str:
+        """
+        Write the report as JSON, or as CSV (section, metric, value) if the path ends in .csv.
+
+        Args:
+            path: Output file
+
+        Returns:
+            Path of the report
+        """
+        report = self.report()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'metric', 'value'])
+                writer.writerows(flatten(report))
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+
+def flatten(report: dict) -> list:
+    """
+    Rows (section, metric, value) of a report, nested keys joined with dots.
+
+    Args:
+        report: Report from RunMetrics.report
+
+    Returns:
+        list: One row per leaf value
+    """
+    rows = []
+    for section, value in report.items():
+        if isinstance(value, dict):
+            rows.extend((section, key, item) for key, item in _leaves(value))
+        else:
+            rows.append(('run', section, value))
+    return rows
+
+
+def _leaves(values: dict, prefix: str = ''):
+    for key, value in values.items():
+        if isinstance(value, dict):
+            yield from _leaves(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def enable() -> RunMetrics:
+    """
+    Start collecting metrics in a new, empty collector.
+
+    Returns:
+        The active collector
+    """
+    global _collector
+    _collector = RunMetrics()
+    return _collector
+
+
+def disable():
+    """Stop collecting metrics; spans become no-ops."""
+    global _collector
+    _collector = None
+
+
+def current() -> Optional[RunMetrics]:
+    """Active collector, or None if metrics are disabled."""
+    return _collector
+
+
+def span(stage: str):
+    """
+    Time a block as a pipeline stage:
+
+        with metrics.span('export'):
+            ...
+
+    Returns a shared no-op context manager while metrics are disabled.
+    """
+    collector = _collector
+    return collector.span(stage) if collector is not None else _NO_SPAN
+
+
+def timed(stage: str):
+    """
+    Decorator timing every call of a function as a pipeline stage.
+
+    Args:
+        stage: Name of the stage
+
+    Returns:
+        Decorator; the wrapped function only checks whether metrics are enabled
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            collector = _collector
+            if collector is None:
+                return function(*args, **kwargs)
+            with collector.span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name: str, n: int = 1):
+    """Add n to an event counter of the active collector, if any."""
+    collector = _collector
+    if collector is not None:
+        collector.count(name, n)
+
+
+def record_request(seconds: float, model: str, usage=None, outcome: str = 'ok'):
+    """Record an LLM request in the active collector, if any (see RunMetrics.record_request)."""
+    collector = _collector
+    if collector is not None:
+        collector.record_request(seconds, model, usage, outcome)
@@ -1,9 +1,48 @@
-from core.embedding import build_index, retrieve_examples
-from core.grader import grade
+from core.embedding import build_index, encode, neighbor_similarities, retrieve_examples_by_label, search_batch
+from core.backends import make_backend
+from core.clustering import cluster_embeddings
+from core import grader, metrics
+from core.grader import grade, grade_batch, pack_answers
+from core.cache import GradingJournal, request_key
+from core.prompting import PromptBuilder
+from core.ratelimit import AdaptiveLimiter
+from concurrent.futures import ThreadPoolExecutor, as_completed, CancelledError
+from typing import Callable
+import threading
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import re
 
+# Default grading options, overridable per call through the 'options' argument
+DEFAULT_OPTIONS = {
+    'max_workers': 8,   # Maximum number of concurrent GPT-4o requests
+    'max_retries': 6,   # Retries for rate-limit, timeout and server errors
+    'use_cache': True,  # Serve identical prompts from the response cache
+    'journal_path': None,  # Append-only journal used to resume interrupted runs
+    'pack_size': 1,     # Answers graded per request when they share their examples
+    'backend': 'llm',   # 'llm', 'local' (offline classifier only) or 'hybrid' (classifier first)
+    'local_model': 'logistic',  # Local classifier: 'logistic' or 'knn'
+    'local_threshold': 90,      # Confidence from which 'hybrid' keeps the classifier's grade
+    'neighbor_similarity': None,  # Cosine similarity to copy the grade of graded neighbours (None = off)
+    'neighbor_agreement': 3,      # Nearest graded answers that must all pass it with the same grade
+    'cluster_similarity': None,   # Cosine similarity to group ungraded answers and grade one per group (None = off)
+    'cluster_spot_check': None,   # Members less similar than this to their medoid are also sent to GPT-4o
+    'index_type': 'auto',         # Retrieval index: 'auto', 'flat', 'hnsw', 'ivf' or 'ivfpq'
+    'question_index': None,       # Persistent QuestionIndex updated instead of rebuilding the index
+    'examples_per_grade': 3,      # Retrieved examples of each grade in every prompt
+    'diversity': 0.0,             # MMR redundancy weight for the examples (0 = plain nearest)
+    'max_example_tokens': 200,    # Longer examples are truncated (None = no limit)
+    'example_budget': 1200,       # Tokens of all the examples of a prompt (None = no limit)
+    'example_dedup': 0.9,         # Word overlap from which two examples count as one (None = exact only)
+    'prompt_path': 'prompt.txt',  # File with the SYSTEM PROMPT and USER PROMPT sections
+    'embeddings': None,           # Normalized embeddings of the rows of df, to skip encoding them
+    'limiter': None,              # AdaptiveLimiter shared with other runs (None = one per run)
+}
+
+# Values of the 'backend' option
+BACKENDS = ('llm', 'local', 'hybrid')
+
 def leer_prompts(path_txt: str) -> tuple[str, str]:
     """
     Read and extract system and user prompts from a text file.
@@ -35,77 +74,440 @@ def leer_prompts(path_txt: str) -> tuple[str, str]:
 
     return system_prompt, user_prompt
 
-def evaluate_dataframe(df: pd.DataFrame, test: bool = False) -> pd.DataFrame:
+def evaluate_dataframe(
+    df: pd.DataFrame,
+    test: bool = False,
+    options: dict = None,
+    on_result: Callable[[object, dict], None] = None,
+    on_progress: Callable[[int, int], None] = None,
+    cancel_event: threading.Event = None
+) -> pd.DataFrame:
     """
     Evaluate student responses using semantic similarity and AI grading.
 
+    Answers are graded concurrently through a bounded thread pool that shares an
+    adaptive rate limiter, so throughput follows the account's rate limits
+    instead of the latency of each request. Rows found in the journal with the
+    same prompt are restored without grading them again.
+
+    With pack_size > 1, answers whose nearest graded answer is the same are
+    graded together, up to pack_size per request, with the union of their
+    examples within example_budget, so the instructions and examples are sent
+    once per pack instead of once per answer. Answers the model does not grade
+    correctly inside a pack are graded again on their own.
+
+    The 'local' backend grades every answer with a classifier trained on the
+    embeddings of the graded answers, without any API call. The 'hybrid'
+    backend keeps the classifier's grade when its confidence reaches
+    local_threshold and sends only the remaining answers to GPT-4o.
+
+    If neighbor_similarity is set, an answer whose neighbor_agreement nearest
+    graded answers are all at least that similar and share the same grade
+    gets that grade directly, marked as propagated from neighbours, without
+    calling GPT-4o.
+
+    If cluster_similarity is set, the remaining answers are grouped by semantic
+    similarity and only the medoid of each group is sent to GPT-4o; its grade
+    is then propagated to the other members. Members less similar to the
+    medoid than cluster_spot_check are graded by GPT-4o as well, as a check.
+
+    A summary of how each row was graded is printed and kept in the attrs of
+    the returned DataFrame.
+
+    Each graded row is reported through on_result as soon as it completes. When
+    cancel_event is set, pending rows are dropped, requests already in flight
+    are still collected, and the rows graded so far are returned.
+
+    The prompt template receives the examples of grade 1 in {examples_correct},
+    those of grade 0 in {examples_incorrect}, and the examples of every grade,
+    under one heading per grade, in {examples_by_grade}. Prompts are assembled
+    by a PromptBuilder: the template text before its first field is sent
+    unchanged in every request, right after the system prompt, so it should
+    hold the question and the criteria.
+
     Args:
         df: DataFrame containing student responses and grades.
              Must contain columns: 'Respuesta', 'Nota'
         test: If True, uses half of graded examples for testing purposes.
+        options: Grading options overriding DEFAULT_OPTIONS
+            - max_workers: Maximum number of concurrent requests
+            - max_retries: Retries for recoverable API errors
+            - use_cache: Reuse cached responses for identical prompts
+            - journal_path: Path of the resume journal, or None to disable it
+            - pack_size: Maximum number of answers per request
+            - backend: 'llm', 'local' or 'hybrid'
+            - local_model: Local classifier, 'logistic' or 'knn'
+            - local_threshold: Minimum confidence (0-100) of a 'hybrid' local grade
+            - neighbor_similarity: Minimum cosine similarity for neighbour propagation, or None
+            - neighbor_agreement: Number of nearest graded answers that must agree
+            - cluster_similarity: Minimum cosine similarity within a cluster, or None
+            - cluster_spot_check: Similarity to the medoid below which members are also graded, or None
+            - index_type: FAISS index used for retrieval (see embedding.make_index)
+            - question_index: QuestionIndex of the question; it is synced with the graded
+              answers (and saved) instead of building a new index. Not used in test mode,
+              whose base is only part of the graded answers.
+            - examples_per_grade: Examples of each grade retrieved for every prompt
+            - diversity: Weight (0-1) of the MMR penalty against near-identical examples
+            - max_example_tokens: Maximum tokens of one example, or None
+            - example_budget: Maximum tokens of the examples of one prompt, or None
+            - example_dedup: Word overlap (0-1) from which examples are deduplicated, or None
+            - prompt_path: Prompt file of the question (see leer_prompts)
+            - embeddings: Normalized embeddings with one row per row of df, in order,
+              used instead of encoding the answers (see core.evaluation)
+            - limiter: AdaptiveLimiter to share with runs made in parallel, or None
+        on_result: Called with (df index, {column: value}) for every graded row
+        on_progress: Called with (graded rows, rows to grade) after every row
+        cancel_event: Event that stops the run when set
 
     Returns:
-        DataFrame with added columns: 'nota IA', 'feedback IA', 'confidence'
+        DataFrame with added columns: 'nota IA', 'feedback IA', 'confidence', and
+        'cluster' when clustering is enabled. Rows not graded because of a
+        cancellation are left empty. df.attrs['summary'] counts the rows graded
+        by each route ('local', 'neighbors', 'clusters', 'llm'), the GPT-4o calls
+        saved ('saved_calls') and the spot checks that disagreed with their medoid.
 
     Raises:
-        ValueError: If no graded examples are available for building the index.
+        ValueError: If the backend is unknown, no graded examples are available for
+            building the index, or the local classifier cannot be trained.
     """
     
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if options['backend'] not in BACKENDS:
+        raise ValueError(f"Backend de corrección desconocido: {options['backend']}")
+
     df = df.copy()
     df['Nota'] = pd.to_numeric(df['Nota'], errors='coerce')
 
     # Load prompts fromf ile
-    txt_path = "prompt.txt"
-    system_prompt, user_prompt_template = leer_prompts(txt_path)
+    system_prompt, user_prompt_template = leer_prompts(options['prompt_path'])
 
     # Split data into base (graded) and to_evaluate (ungraded) sets
     if test==False:
         base = df[df['Nota'].notna()]        # Use all graded examples  
         to_evaluate = df[df['Nota'].isna()]  # Evaluate ungraded examples
     else:
-        # For testing: use 50% of correct and incorrect examples as base
-        correctas = df[df['Nota'] == 1]
-        incorrectas = df[df['Nota'] == 1]
-
-        base_correctas = correctas.sample(frac=0.5, random_state=42)
-        base_incorrectas = incorrectas.sample(frac=0.5, random_state=42)
-
-        base = pd.concat([base_correctas, base_incorrectas])
-        to_evaluate = df.drop(base.index)
+        # For testing: use 50% of the graded examples of each grade as base
+        graded = df[df['Nota'].notna()]
+        base = graded.groupby('Nota', group_keys=False).sample(frac=0.5, random_state=42)
+        to_evaluate = graded.drop(base.index)
 
     if base.empty:
         raise ValueError("No hay ejemplos previamente valorados para construir el índice.")
 
+    embeddings = options['embeddings']
+
+    def row_vectors(rows):
+        # Precomputed embeddings of some rows of df, or None to encode them
+        return None if embeddings is None else embeddings[df.index.get_indexer(rows.index)]
+
     # Prepare data for index building
     base_respuestas = base['Respuesta'].tolist()
     base_labels = base['Nota'].astype(int).tolist()
 
-    # Build semantic search window
-    index, _, idx_map = build_index(base_respuestas, base_labels)
+    # Build semantic search window, or only apply the changes to the persistent one
+    with metrics.span('index'):
+        question_index = options['question_index'] if not test else None
+        if question_index is not None:
+            question_index.sync(base_respuestas, base_labels)
+            try:
+                question_index.save()
+            except OSError as e:
+                # Grading can go on; the index is rebuilt from the grades next time
+                print(f"No se pudo guardar el índice de la pregunta: {e}")
+            index, idx_map = question_index.search_index(options['index_type']), question_index.idx_map()
+            lookup_vectors = question_index.vectors
+            base_ids = np.array([question_index.answer_id(text) for text in base_respuestas], dtype=np.int64)
+        else:
+            index, base_embeddings, idx_map = build_index(
+                base_respuestas, base_labels, options['index_type'], row_vectors(base)
+            )
+            lookup_vectors = lambda ids: base_embeddings[np.maximum(ids, 0)]
+            base_ids = np.arange(len(base_respuestas))
+
+    total = len(to_evaluate)
+    graded = 0
+    summary = {'local': 0, 'neighbors': 0, 'clusters': 0, 'llm': 0, 'saved_calls': 0, 'spot_check_disagreements': 0}
+    df.attrs['summary'] = summary
+
+    def store(idx, nota, feedback, confidence):
+        # Store results at the original index of the answer
+        nonlocal graded
+        values = {'nota IA': nota, 'feedback IA': feedback, 'confidence': confidence}
+        for column, value in values.items():
+            df.at[idx, column] = value
+        graded += 1
+        if on_result is not None:
+            on_result(idx, values)
+        if on_progress is not None:
+            on_progress(graded, total)
+
+    # Offline first pass: grade from the embeddings with a local classifier
+    if options['backend'] in ('local', 'hybrid') and not to_evaluate.empty:
+        classifier = make_backend(options['local_model'])
+        try:
+            with metrics.span('local_model'):
+                classifier.fit(lookup_vectors(base_ids), base_labels)
+        except ValueError:
+            if options['backend'] == 'local':
+                raise
+            classifier = None
+
+        if classifier is not None:
+            with metrics.span('local_model'):
+                vectors = row_vectors(to_evaluate)
+                results = classifier.grade(vectors if vectors is not None else encode(to_evaluate['Respuesta'].tolist()))
+            accepted = []
+            for idx, (nota, feedback, confidence) in zip(to_evaluate.index, results):
+                if options['backend'] == 'local' or confidence >= options['local_threshold']:
+                    store(idx, nota, feedback, confidence)
+                    accepted.append(idx)
+            to_evaluate = to_evaluate.drop(accepted)
+            summary['local'] = summary['saved_calls'] = len(accepted)
+
+    # Retrieve similar examples for every answer in one batched search
+    answers = to_evaluate['Respuesta'].tolist()
+    by_label = []
+    keep = np.ones(len(answers), dtype=bool)
+    members = {}
+    spot_checks = {}
+    # Graded neighbours that must agree to copy their grade
+    k = max(1, int(options['neighbor_agreement']))
+    if answers:
+        with metrics.span('retrieval'):
+            vectors, _, I = search_batch(index, answers, top_k=max(10, k), vectors=row_vectors(to_evaluate))
+
+            # Fixed number of examples per grade, one search per grade
+            by_label = retrieve_examples_by_label(
+                index, idx_map, vectors, lookup_vectors, options['examples_per_grade'], options['diversity']
+            )
+
+        # Copy the grade of near-duplicates whose graded neighbours all agree
+        if options['neighbor_similarity'] is not None:
+            similarities = neighbor_similarities(vectors, lookup_vectors(I[:, :k]), I[:, :k])
+            labels = np.array([[idx_map[i][1] if i in idx_map else -1 for i in row] for row in I[:, :k]])
+            propagated = (
+                (I[:, :k] >= 0).all(axis=1)
+                & (similarities >= options['neighbor_similarity']).all(axis=1)
+                & (labels == labels[:, :1]).all(axis=1)
+            )
+            for position in np.flatnonzero(propagated):
+                similarity = similarities[position].min()
+                store(
+                    to_evaluate.index[position], float(labels[position, 0]),
+                    f"Propagada de vecinos: {k} respuestas valoradas con similitud ≥ {similarity:.2f}",
+                    round(float(similarity) * 100, 1)
+                )
+
+            keep &= ~propagated
+            summary['neighbors'] = int(propagated.sum())
+            summary['saved_calls'] += summary['neighbors']
+
+        # Grade one medoid per group of equivalent answers
+        if options['cluster_similarity'] is not None and keep.any():
+            positions = np.flatnonzero(keep)
+            with metrics.span('clustering'):
+                labels, medoids, to_medoid = cluster_embeddings(vectors[positions], options['cluster_similarity'])
+            df['cluster'] = None
+            df.loc[to_evaluate.index[positions], 'cluster'] = labels.tolist()
+
+            spot_check = options['cluster_spot_check']
+            for position, cluster, similarity in zip(positions, labels, to_medoid):
+                medoid = to_evaluate.index[positions[medoids[cluster]]]
+                idx = to_evaluate.index[position]
+                if idx == medoid:
+                    continue
+                if spot_check is not None and similarity < spot_check:
+                    spot_checks[idx] = medoid
+                    continue
+                members.setdefault(medoid, []).append((idx, int(cluster), float(similarity)))
+                keep[position] = False
+
+    # Build every prompt first, then grade them concurrently
+    builder = PromptBuilder(
+        system_prompt, user_prompt_template,
+        options['max_example_tokens'], options['example_budget'], options['example_dedup']
+    )
+    prompts = {}
+    retrieved = {}
+    nearest = {}
+    with metrics.span('prompts'):
+        top_ids = I[:, 0] if answers else []
+        for idx, answer, row_examples, top_id, kept in zip(to_evaluate.index, answers, by_label, top_ids, keep):
+            if not kept:
+                continue
+            # Format user prompt with examples and curent answer
+            prompts[idx] = builder.user_prompt(builder.example_fields(row_examples), answer)
+            retrieved[idx] = row_examples
+            nearest[idx] = int(top_id)
+
+    # Resume rows already graded with the same prompt in an interrupted run
+    journal = GradingJournal(options['journal_path']) if options['journal_path'] else None
+    digests = {}
+    if journal is not None:
+        done = journal.load()
+        for idx in list(prompts):
+            digests[idx] = _prompt_digest(system_prompt, prompts[idx])
+            entry = done.get((df.at[idx, 'Respuesta'], digests[idx]))
+            if entry is not None:
+                store(idx, entry['nota'], entry['feedback'], entry['confidence'])
+                del prompts[idx]
+                metrics.count('journal_resumed')
+
+    cache = grader.response_cache if options['use_cache'] else None
+    limiter = options['limiter'] or AdaptiveLimiter(max_concurrency=options['max_workers'])
+
+    def grade_pack(pack, user_prompt):
+        # Grade a pack of rows and return [(idx, (nota, feedback, confidence))]
+        if len(pack) == 1:
+            return [(pack[0], grade(system_prompt, prompts[pack[0]], limiter, options['max_retries'], cache))]
+
+        results = grade_batch(system_prompt, user_prompt, len(pack), limiter, options['max_retries'], cache)
+
+        graded_pack = []
+        for idx, result in zip(pack, results):
+            if result is None:
+                # Malformed or missing item, or failed request: grade the answer on its own
+                result = grade(system_prompt, prompts[idx], limiter, options['max_retries'], cache)
+            graded_pack.append((idx, result))
+        return graded_pack
+
+    # Packed prompts share the examples of all their answers
+    packs = []
+    with metrics.span('prompts'):
+        for pack in _make_packs(prompts, nearest, options['pack_size']):
+            user_prompt = None
+            if len(pack) > 1:
+                fields = builder.example_fields(_merge_examples([retrieved[idx] for idx in pack]))
+                user_prompt = builder.user_prompt(fields, pack_answers(df.loc[pack, 'Respuesta']))
+            packs.append((pack, user_prompt))
 
     # Evaluate new responses with progress bar
-    for idx, row in tqdm(to_evaluate.iterrows(), total=len(to_evaluate), desc="Evaluando nuevas respuestas"):
-        # Retrieve similar examples
-        correct_ex, incorrect_ex = retrieve_examples(
-            index, idx_map, row['Respuesta']
-        )
-
-        # Format user prompt with examples and curent answer
-        user_prompt = user_prompt_template.format(
-            examples_correct="\n".join(correct_ex[:3]),
-            examples_incorrect="\n".join(incorrect_ex[:3]),
-            student_answer=row['Respuesta']
-        )
-
-        # Get AI evaluation
-        nota, feedback, confidence = grade(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
-        )
-
-        # Store results
-        df.at[idx, 'nota IA'] = nota
-        df.at[idx, 'feedback IA'] = feedback
-        df.at[idx, 'confidence'] = confidence
-
-    return df
\ No newline at end of file
+    with metrics.span('llm_grading'), ThreadPoolExecutor(max_workers=options['max_workers']) as executor:
+        futures = {executor.submit(grade_pack, pack, user_prompt): pack for pack, user_prompt in packs}
+        cancelled = False
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Evaluando nuevas respuestas"):
+            if cancel_event is not None and cancel_event.is_set() and not cancelled:
+                # Drop pending rows; requests in flight still complete below
+                for pending in futures:
+                    pending.cancel()
+                cancelled = True
+
+            try:
+                graded_pack = future.result()
+            except CancelledError:
+                continue
+
+            for idx, (nota, feedback, confidence) in graded_pack:
+                store(idx, nota, feedback, confidence)
+                summary['llm'] += 1
+
+                # Failed rows are not journaled so a rerun grades them again
+                if journal is not None and nota != -1:
+                    journal.record(df.at[idx, 'Respuesta'], digests[idx], nota, feedback, confidence)
+
+    # Propagate each medoid's grade to the members of its cluster
+    for medoid, cluster_members in members.items():
+        nota = df.at[medoid, 'nota IA'] if 'nota IA' in df.columns else None
+        if pd.isna(nota) or nota == -1:
+            # Cancelled or failed: members stay ungraded so a rerun grades them
+            continue
+        feedback, confidence = df.at[medoid, 'feedback IA'], float(df.at[medoid, 'confidence'])
+        for idx, cluster, similarity in cluster_members:
+            store(
+                idx, nota,
+                f"Propagada del representante del grupo {cluster} (similitud {similarity:.2f}): {feedback}",
+                round(min(confidence, similarity * 100), 1)
+            )
+            summary['clusters'] += 1
+
+    # Spot-checked members were graded on their own: count those that disagree with their medoid
+    for idx, medoid in spot_checks.items():
+        if 'nota IA' not in df.columns:
+            break
+        nota, medoid_nota = df.at[idx, 'nota IA'], df.at[medoid, 'nota IA']
+        if not pd.isna(nota) and not pd.isna(medoid_nota) and -1 not in (nota, medoid_nota) and nota != medoid_nota:
+            summary['spot_check_disagreements'] += 1
+    summary['saved_calls'] += summary['clusters']
+
+    print(f"Resumen: {format_summary(summary)}")
+    return df
+
+def format_summary(summary: dict) -> str:
+    """
+    Describe how the rows of a run were graded.
+
+    Args:
+        summary: df.attrs['summary'] of a result of evaluate_dataframe
+
+    Returns:
+        Text with the rows graded by each route and the GPT-4o calls saved
+    """
+    return (
+        f"{summary['llm']} respuestas evaluadas por GPT-4o, {summary['local']} por el clasificador local, "
+        f"{summary['neighbors']} propagadas de vecinos, {summary['clusters']} propagadas de su grupo "
+        f"({summary['saved_calls']} llamadas evitadas, {summary['spot_check_disagreements']} comprobaciones en desacuerdo)"
+    )
+
+def _prompt_digest(system_prompt: str, user_prompt: str) -> str:
+    """
+    Digest identifying the exact request sent for a row.
+
+    Args:
+        system_prompt: System prompt
+        user_prompt: Formatted user prompt
+
+    Returns:
+        Request key of the prompt pair for the current model and parameters
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return request_key(grader.MODEL, grader.PARAMS, messages)
+
+
+def _make_packs(prompts: dict, nearest: dict, pack_size: int) -> list:
+    """
+    Group rows whose nearest graded answer is the same into packs.
+
+    Answers close to the same graded answer retrieve mostly the same
+    examples, so a pack can share them without a much longer prompt.
+
+    Args:
+        prompts: Rows still to grade (df index -> user prompt)
+        nearest: df index -> id of its nearest graded answer
+        pack_size: Maximum number of rows per pack
+
+    Returns:
+        list: Lists of df indexes; a row alone with its neighbour forms a pack of one
+    """
+    pack_size = max(1, int(pack_size))
+    groups = {}
+    for idx in prompts:
+        # Rows without any neighbour are not grouped
+        key = nearest[idx] if nearest[idx] >= 0 else ('row', idx)
+        groups.setdefault(key, []).append(idx)
+
+    packs = []
+    for rows in groups.values():
+        packs.extend(rows[start:start + pack_size] for start in range(0, len(rows), pack_size))
+    return packs
+
+
+def _merge_examples(examples: list) -> dict:
+    """
+    Union of the retrieved examples of the answers of a pack.
+
+    Args:
+        examples: Grade -> example texts of each answer, nearest first
+
+    Returns:
+        dict: Grade -> distinct example texts, taking each answer's nearest
+              ones in turn, so the example budget keeps the closest of all
+    """
+    merged = {}
+    for label in dict.fromkeys(label for row in examples for label in row):
+        texts = [row.get(label, []) for row in examples]
+        ranked = (row[rank] for rank in range(max(map(len, texts), default=0)) for row in texts if rank < len(row))
+        merged[label] = list(dict.fromkeys(ranked))
+    return merged
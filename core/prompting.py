@@ -0,0 +1,226 @@
+import re
+import string
+import threading
+from typing import Dict, List
+from unidecode import unidecode
+from core import metrics
+
+# Characters per token used when tiktoken is not installed (Spanish text with GPT-4o)
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARK = " [...]"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens of a text for GPT-4o.
+
+    Uses tiktoken's o200k_base encoding if the package is installed and an
+    estimate of CHARS_PER_TOKEN characters per token otherwise.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Token count
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text to at most max_tokens tokens, marking the cut.
+
+    Args:
+        text: Text to cut
+        max_tokens: Maximum number of tokens, including the mark
+
+    Returns:
+        The text itself if it fits, otherwise its beginning followed by TRUNCATION_MARK
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK))
+    encoding = _get_encoding()
+    if encoding is None:
+        head = text[:keep * CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    # Do not leave half a word before the mark
+    head = head.rsplit(' ', 1)[0] if ' ' in head.strip() else head
+    return head.rstrip() + TRUNCATION_MARK
+
+
+def _get_encoding():
+    """tiktoken encoding of GPT-4o, or None if tiktoken is not installed."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding('o200k_base')
+                except Exception:
+                    _encoding = False
+    return _encoding or None
+
+
+class PromptBuilder:
+    """
+    Assembles the user prompt of every answer within a token budget.
+
+    The template is split at its first field: the text before it (question
+    statement and criteria in prompt.txt) is the same in every request and,
+    following the system prompt, forms a stable prefix that the provider can
+    cache. Retrieved examples and the student answer come after it.
+
+    Examples longer than max_example_tokens are truncated, near-identical
+    examples of the same grade are kept once, and the examples of a prompt
+    are added nearest first, alternating between grades, until
+    example_budget tokens are used.
+
+    Attributes:
+        system_prompt (str): System prompt
+        template (str): User prompt template with {examples_correct},
+            {examples_incorrect}, {examples_by_grade} and {student_answer}
+        prefix (str): Static text of the template before its first field
+        max_example_tokens (int): Maximum tokens of one example; None for no limit
+        example_budget (int): Maximum tokens of all the examples of a prompt; None for no limit
+        dedup_similarity (float): Word overlap (Jaccard) from which two
+            examples count as the same; None to only drop exact duplicates
+    """
+
+    def __init__(self, system_prompt: str, template: str, max_example_tokens: int = 200,
+                 example_budget: int = 1200, dedup_similarity: float = 0.9):
+        """
+        Initialize the builder.
+
+        Args:
+            system_prompt: System prompt
+            template: User prompt template
+            max_example_tokens: Maximum tokens of one example; None for no limit
+            example_budget: Maximum tokens of all the examples of a prompt; None for no limit
+            dedup_similarity: Word overlap from which two examples count as the same
+        """
+        self.system_prompt = system_prompt
+        self.template = template
+        self.max_example_tokens = max_example_tokens
+        self.example_budget = example_budget
+        self.dedup_similarity = dedup_similarity
+
+        first_field = re.search(r'(?<!\{)\{[a-z_]+\}', template)
+        self.prefix = template[:first_field.start()] if first_field else template
+        static = re.sub(r'(?<!\{)\{[a-z_]+\}', '', template)
+        if len(self.prefix.strip()) < len(static.strip()) / 2:
+            print("Aviso: la plantilla del prompt tiene texto fijo después de los ejemplos; "
+                  "ponerlo antes mejora el uso de la caché de prompts del proveedor.")
+
+    def prefix_tokens(self) -> int:
+        """Tokens of the stable prefix (system prompt and static start of the user prompt)."""
+        return count_tokens(self.system_prompt) + count_tokens(self.prefix)
+
+    def example_fields(self, examples: Dict[int, List[str]]) -> tuple:
+        """
+        Prompt fields holding the examples of one answer, within the budget.
+
+        Args:
+            examples: Grade -> example texts, nearest first
+
+        Returns:
+            tuple: Hashable (field, text) pairs for examples_correct,
+                   examples_incorrect and examples_by_grade
+        """
+        selected = self.select(examples)
+        by_grade = "\n\n".join(
+            f"Ejemplos de respuestas con grade = {label}:\n" + "\n".join(texts)
+            for label, texts in sorted(selected.items()) if texts
+        )
+        return (
+            ('examples_correct', "\n".join(selected.get(1, []))),
+            ('examples_incorrect', "\n".join(selected.get(0, []))),
+            ('examples_by_grade', by_grade),
+        )
+
+    def user_prompt(self, fields: tuple, student_answer: str) -> str:
+        """
+        Fill the template.
+
+        Args:
+            fields: Example fields from example_fields
+            student_answer: Answer (or numbered answers) to grade
+
+        Returns:
+            User prompt
+        """
+        return self.template.format(**dict(fields), student_answer=student_answer)
+
+    def select(self, examples: Dict[int, List[str]]) -> Dict[int, List[str]]:
+        """
+        Deduplicate, truncate and budget the examples of one answer.
+
+        Args:
+            examples: Grade -> example texts, nearest first
+
+        Returns:
+            dict: Grade -> kept example texts, nearest first
+        """
+        # Drop near-identical examples of the same grade; similar answers with
+        # different grades are kept, they show where the grade boundary lies
+        unique = {}
+        for label, texts in examples.items():
+            seen = []
+            unique[label] = []
+            for text in texts:
+                words = _words(text)
+                if any(_similar(words, other, self.dedup_similarity) for other in seen):
+                    metrics.count('examples_deduplicated')
+                    continue
+                seen.append(words)
+                unique[label].append(text)
+
+        # Nearest first, taking one example of each grade in turn
+        selected = {label: [] for label in unique}
+        remaining = self.example_budget
+        rank = 0
+        while any(rank < len(texts) for texts in unique.values()):
+            for label, texts in unique.items():
+                if rank >= len(texts):
+                    continue
+                text = texts[rank]
+                if self.max_example_tokens is not None:
+                    shortened = truncate_tokens(text, self.max_example_tokens)
+                    if shortened != text:
+                        metrics.count('examples_truncated')
+                    text = shortened
+                if remaining is not None:
+                    tokens = count_tokens(text) + 1
+                    if tokens > remaining:
+                        metrics.count('examples_dropped')
+                        continue
+                    remaining -= tokens
+                selected[label].append(text)
+            rank += 1
+        return selected
+
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation + '¿¡')
+
+
+def _words(text: str) -> frozenset:
+    """Word set of a text ignoring case, accents and punctuation."""
+    return frozenset(unidecode(text).lower().translate(_PUNCTUATION).split())
+
+
+def _similar(a: frozenset, b: frozenset, threshold: float) -> bool:
+    """Whether two word sets are the same text or overlap at least threshold (Jaccard)."""
+    if a == b:
+        return True
+    if threshold is None or not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
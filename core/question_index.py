@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+from core import embedding
+from core.cache import normalize_text
+from core.embedding import LabelPartitionedIndex
+
+
+class QuestionIndex:
+    """
+    Persistent retrieval index of the graded answers of one question.
+
+    Answers are identified by a stable id derived from their normalized text,
+    so the index can be updated in place (add, remove, relabel) and kept on
+    disk between sessions. Only answers new to the index are encoded; a
+    relabel only changes the stored grade and a removal only drops vectors.
+
+    Vectors are kept in a LabelPartitionedIndex, one exact inner-product
+    IndexIDMap2 per grade over normalized embeddings, so search returns answer
+    ids and cosine similarities, and examples can be retrieved per grade.
+    Grading searches through search_index, whose per-grade indexes are built
+    with embedding.make_index for the chosen index type.
+
+    Attributes:
+        path (str): File of the FAISS index, or None for an in-memory index.
+            The answers and grades are stored next to it in '<path>.json'
+        answers (dict): Answer id -> (text, label)
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Initialize the index, loading it from disk if it was saved before.
+
+        An index built with another embedding model is discarded.
+
+        Args:
+            path: File of the FAISS index, or None to keep it in memory
+        """
+        self.path = path
+        self.answers = {}
+        self._index = None
+        self._dirty = False
+        # Per-grade indexes of search_index and the grades changed since they were built
+        self._search_type = None
+        self._search_partitions = {}
+        self._changed = set()
+        self._lock = threading.RLock()
+        if path is not None and os.path.exists(path) and os.path.exists(path + '.json'):
+            self._load()
+
+    def __len__(self):
+        return len(self.answers)
+
+    @staticmethod
+    def answer_id(text: str) -> int:
+        """
+        Stable id of an answer.
+
+        Args:
+            text: Answer text
+
+        Returns:
+            Positive 63-bit blake2b digest of the normalized text
+        """
+        digest = hashlib.blake2b(normalize_text(str(text)).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') & 0x7FFF_FFFF_FFFF_FFFF
+
+    @property
+    def index(self) -> LabelPartitionedIndex:
+        """Partitioned index of the answers (None until the first answer is added)."""
+        return self._index
+
+    def idx_map(self) -> Dict[int, Tuple[str, int]]:
+        """Copy of the answer id -> (text, label) mapping, as used by retrieval."""
+        with self._lock:
+            return dict(self.answers)
+
+    def add(self, texts: List[str], labels: List[int]):
+        """
+        Add graded answers; answers already in the index are relabeled.
+
+        Args:
+            texts: Answer texts
+            labels: Grade of each answer
+        """
+        with self._lock:
+            new = {}
+            for text, label in zip(texts, labels):
+                answer_id = self.answer_id(text)
+                if answer_id in self.answers:
+                    self._move(answer_id, int(label))
+                else:
+                    new[answer_id] = (str(text), int(label))
+            if not new:
+                return
+
+            vectors = embedding.normalize(embedding.encode([text for text, _ in new.values()]))
+            if self._index is None:
+                self._index = LabelPartitionedIndex(vectors.shape[1])
+            self._index.add(
+                vectors,
+                np.fromiter(new, dtype=np.int64, count=len(new)),
+                [label for _, label in new.values()]
+            )
+            self.answers.update(new)
+            self._changed.update(label for _, label in new.values())
+            self._dirty = True
+
+    def remove(self, texts: List[str]):
+        """
+        Remove answers from the index; unknown answers are ignored.
+
+        Args:
+            texts: Answer texts
+        """
+        with self._lock:
+            by_label = {}
+            for answer_id in set(map(self.answer_id, texts)):
+                if answer_id in self.answers:
+                    by_label.setdefault(self.answers.pop(answer_id)[1], []).append(answer_id)
+            for label, ids in by_label.items():
+                self._index.remove(ids, label)
+                self._changed.add(label)
+                self._dirty = True
+
+    def relabel(self, texts: List[str], labels: List[int]):
+        """
+        Change the grade of answers already in the index; unknown answers are ignored.
+
+        Args:
+            texts: Answer texts
+            labels: New grade of each answer
+        """
+        with self._lock:
+            for text, label in zip(texts, labels):
+                answer_id = self.answer_id(text)
+                if answer_id in self.answers:
+                    self._move(answer_id, int(label))
+
+    def update(self, texts: List[str], grades: list):
+        """
+        Apply grades edited by the user: add or relabel graded answers and
+        remove the answers whose grade was cleared.
+
+        Args:
+            texts: Answer texts
+            grades: New grades; empty or non-numeric values count as cleared
+        """
+        grades = pd.to_numeric(pd.Series(list(grades), dtype=object), errors='coerce')
+        graded = grades.notna().to_numpy()
+        texts = list(texts)
+        with self._lock:
+            self.remove([text for text, keep in zip(texts, graded) if not keep])
+            self.add([text for text, keep in zip(texts, graded) if keep], grades[graded].astype(int).tolist())
+
+    def sync(self, texts: List[str], labels: List[int]):
+        """
+        Make the index hold exactly the given graded answers.
+
+        Only the differences with the current content are applied, so the
+        cost follows the number of grades that changed.
+
+        Args:
+            texts: Every graded answer of the question
+            labels: Grade of each answer
+        """
+        with self._lock:
+            keep = {self.answer_id(text) for text in texts}
+            self.remove([text for answer_id, (text, _) in self.answers.items() if answer_id not in keep])
+            self.add(texts, labels)
+
+    def search(self, vectors: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest graded answers of each query.
+
+        Args:
+            vectors: Normalized query embeddings
+            top_k: Neighbours per query
+
+        Returns:
+            tuple: (cosine similarities, answer ids), -1 where there is no neighbour
+        """
+        with self._lock:
+            return self._index.search(vectors, top_k)
+
+    def search_index(self, index_type: str = 'auto') -> LabelPartitionedIndex:
+        """
+        Index to search the answers with, one embedding.make_index index per grade.
+
+        The index of a grade is rebuilt from the stored vectors only when the
+        grade changed since the last call. Exact (flat) indexes are the stored
+        ones themselves rather than copies.
+
+        Args:
+            index_type: One of embedding.INDEX_TYPES
+
+        Returns:
+            LabelPartitionedIndex with the answer ids, or None if the index is empty
+        """
+        import faiss
+
+        with self._lock:
+            if self._index is None:
+                return None
+            if index_type != self._search_type:
+                self._search_type = index_type
+                self._search_partitions = {}
+
+            partitions = {}
+            for label, stored in self._index.partitions.items():
+                partition = self._search_partitions.get(label)
+                if partition is None or label in self._changed:
+                    vectors = stored.index.reconstruct_n(0, stored.ntotal)
+                    base = embedding.make_index(vectors, index_type)
+                    if isinstance(base, faiss.IndexFlat):
+                        partition = stored
+                    else:
+                        partition = faiss.IndexIDMap(base)
+                        partition.add_with_ids(vectors, faiss.vector_to_array(stored.id_map))
+                partitions[label] = partition
+            self._search_partitions = partitions
+            self._changed = set()
+
+            index = LabelPartitionedIndex(self._index.d)
+            index.partitions = dict(partitions)
+            return index
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Stored embeddings of answers.
+
+        Args:
+            ids: Array of answer ids of any shape; -1 gives a zero vector
+
+        Returns:
+            Array of shape ids.shape + (dimension,)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            unique = np.unique(ids[ids >= 0])
+            out = np.zeros(ids.shape + (self._index.d,), dtype=np.float32)
+            if len(unique):
+                rows = np.stack([
+                    self._index.reconstruct(answer_id, self.answers[int(answer_id)][1]) for answer_id in unique
+                ])
+                out[ids >= 0] = rows[np.searchsorted(unique, ids[ids >= 0])]
+            return out
+
+    def save(self):
+        """Write the index and its answers to disk if they changed since the last save."""
+        import faiss
+
+        with self._lock:
+            if self.path is None or not self._dirty or self._index is None:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+            # All labels go into one file; the grades are in the .json file
+            merged = faiss.IndexIDMap2(faiss.IndexFlatIP(self._index.d))
+            for partition in self._index.partitions.values():
+                merged.add_with_ids(partition.index.reconstruct_n(0, partition.ntotal), faiss.vector_to_array(partition.id_map))
+
+            tmp = self.path + '.tmp'
+            faiss.write_index(merged, tmp)
+            os.replace(tmp, self.path)
+
+            meta = {
+                'model': embedding.MODEL_NAME,
+                'answers': [[answer_id, text, label] for answer_id, (text, label) in self.answers.items()],
+            }
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp, self.path + '.json')
+            self._dirty = False
+
+    def _load(self):
+        """Read a saved index, ignoring it if it is unreadable or from another model."""
+        import faiss
+
+        try:
+            with open(self.path + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('model') != embedding.MODEL_NAME:
+                return
+            index = faiss.read_index(self.path)
+        except (OSError, ValueError, RuntimeError):
+            return
+
+        answers = {int(answer_id): (text, int(label)) for answer_id, text, label in meta['answers']}
+        ids = faiss.vector_to_array(index.id_map)
+        if index.ntotal != len(answers) or not all(int(answer_id) in answers for answer_id in ids):
+            return
+
+        self._index = LabelPartitionedIndex(index.d)
+        if len(ids):
+            self._index.add(index.index.reconstruct_n(0, index.ntotal), ids, [answers[int(i)][1] for i in ids])
+        self.answers = answers
+
+    def _move(self, answer_id: int, label: int):
+        """Change the grade of an indexed answer, moving its vector to the new label."""
+        text, old = self.answers[answer_id]
+        if old == label:
+            return
+        vector = self._index.reconstruct(answer_id, old)
+        self._index.remove([answer_id], old)
+        self._index.add(vector[None, :], np.array([answer_id], dtype=np.int64), [label])
+        self.answers[answer_id] = (text, label)
+        self._changed.update((old, label))
+        self._dirty = True
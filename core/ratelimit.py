@@ -0,0 +1,179 @@
+import random
+import re
+import threading
+import time
+from typing import Mapping, Optional
+
+# Durations in OpenAI rate-limit headers look like "20ms", "1s" or "6m0s"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNIT_SECONDS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset duration into seconds.
+
+    Args:
+        value: Header value such as "1s", "6m0s", "120ms" or a plain number of seconds
+
+    Returns:
+        Duration in seconds, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Extract how long the provider asks us to wait from response headers.
+
+    Checks 'retry-after-ms', 'retry-after' and the 'x-ratelimit-reset-*' headers.
+
+    Args:
+        headers: Response headers (case-insensitive mapping)
+
+    Returns:
+        Seconds to wait, or None if no hint is present
+    """
+    if not headers:
+        return None
+
+    retry_ms = headers.get('retry-after-ms')
+    if retry_ms is not None:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+
+    for header in ('retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        seconds = parse_duration(headers.get(header))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class AdaptiveLimiter:
+    """
+    Shared concurrency gate for API calls with additive-increase / multiplicative-decrease.
+
+    All workers acquire a slot before calling the API. A 429 halves the number of
+    allowed in-flight requests and pauses every worker until the provider's reset
+    time; each window of successful calls raises the limit again by one, so the
+    pool settles close to the account's RPM/TPM limit instead of hammering it.
+
+    Attributes:
+        max_concurrency (int): Upper bound on in-flight requests
+        limit (int): Current number of allowed in-flight requests
+        throttled (int): Number of 429 responses received
+    """
+
+    def __init__(self, max_concurrency: int = 8, low_watermark: int = 2):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrency: Maximum number of simultaneous requests
+            low_watermark: Remaining requests/tokens below which we pause
+                           pre-emptively until the reported reset time
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.limit = self.max_concurrency
+        self.low_watermark = low_watermark
+        self.throttled = 0
+        self._in_flight = 0
+        self._successes = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until a request slot is available and no back-off is active."""
+        with self._cond:
+            while True:
+                wait = self._blocked_until - time.monotonic()
+                if wait <= 0 and self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self):
+        """Free a request slot."""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        """
+        Record a successful call and pause early if the quota is nearly used up.
+
+        Args:
+            headers: Response headers carrying 'x-ratelimit-remaining-*' values
+        """
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+            if headers:
+                for kind in ('requests', 'tokens'):
+                    remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                    try:
+                        low = remaining is not None and int(remaining) <= self.low_watermark
+                    except ValueError:
+                        low = False
+                    if low:
+                        reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                        if reset:
+                            self._block_for(reset)
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]], attempt: int) -> float:
+        """
+        Record a 429 response, shrink concurrency and pause every worker.
+
+        Args:
+            headers: Headers of the 429 response
+            attempt: Zero-based retry attempt of the caller
+
+        Returns:
+            Seconds the caller is expected to wait
+        """
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        with self._cond:
+            self.throttled += 1
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self._block_for(delay)
+        return delay
+
+    def _block_for(self, seconds: float):
+        # Caller must hold self._cond
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._cond.notify_all()
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential back-off with full jitter.
+
+    Args:
+        attempt: Zero-based retry attempt
+        base: Delay of the first retry in seconds
+        cap: Maximum delay in seconds
+
+    Returns:
+        Seconds to wait before retrying
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
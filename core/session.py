@@ -0,0 +1,239 @@
+import json
+import os
+import pathlib
+import time
+import numpy as np
+import pandas as pd
+from core import embedding, metrics
+
+SESSION_VERSION = 1
+
+# Folder suffix of the session of an exam sheet
+SESSION_SUFFIX = '.session'
+
+MANIFEST = 'manifest.json'
+TABLE = 'table.parquet'
+RELATIONS = 'relations.parquet'
+EMBEDDINGS = 'embeddings.npy'
+TEST_CURVES = 'test_curves.parquet'
+
+
+def session_path(file_name: str, sheet_name: str) -> str:
+    """
+    Folder of the session of an exam sheet, next to the exam file.
+
+    Args:
+        file_name: Path of the exam file
+        sheet_name: Graded worksheet
+
+    Returns:
+        Path '<folder>/<name> - <sheet>.session'
+    """
+    path = pathlib.PurePath(file_name)
+    return os.path.join(str(path.parent), f"{path.stem} - {sheet_name}{SESSION_SUFFIX}")
+
+
+class Session:
+    """
+    Grading session of one exam sheet kept on disk, to reopen it as it was left.
+
+    A session is a folder with:
+    - manifest.json: exam file, sheet, column positions, threshold, grades
+      applied or edited but not yet exported, grades changed since the
+      table was written, and the format version
+    - table.parquet: processed table with the grades and AI results
+    - relations.parquet: processed table row of every original data row
+    - embeddings.npy: embeddings of the processed answers (NaN rows where
+      the answer was never encoded)
+    - test_curves.parquet: threshold curves of the last test, if any
+
+    Saving is incremental: the relations are written once, the embeddings
+    only when more answers have been encoded, the table only when more than
+    its grades changed, and the manifest, with the grades changed since,
+    on every save. Every file is replaced atomically, so an interrupted save
+    leaves the previous version readable.
+
+    Attributes:
+        path (str): Session folder
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the session.
+
+        Args:
+            path: Session folder (see session_path); created on the first save
+        """
+        self.path = path
+        # Set by load; a new session of the same sheet rewrites everything
+        self._relations_saved = False
+        self._embedded = -1
+        # Grades and columns of the table as last written, to save grade edits apart
+        self._saved_grades = None
+        self._saved_columns = None
+
+    def exists(self) -> bool:
+        """Whether the session has been saved."""
+        return os.path.exists(os.path.join(self.path, MANIFEST))
+
+    def save(self, df: pd.DataFrame, relations: dict, info: dict, test_curves: pd.DataFrame = None,
+             table_changed: bool = True):
+        """
+        Write the current state of the session.
+
+        When only grades changed since the table was written, they are stored
+        in the manifest and the table is left as it is.
+
+        Args:
+            df: Processed table with 'Respuesta', 'Nota' and the AI columns
+            relations: Processed text -> original data rows (see Table.getRelationDict)
+            info: JSON-serializable state of the correction window: file_name,
+                  sheet_name, idxTexts, idxCorr, numTotalOriginal, threshold,
+                  pending_grades and dirty_grades
+            test_curves: Curves of the last test run, or None
+            table_changed: False if no column but 'Nota' changed since the last save
+        """
+        with metrics.span('session_save'):
+            os.makedirs(self.path, exist_ok=True)
+            texts = df['Respuesta'].tolist()
+
+            if not self._relations_saved:
+                # Original row -> position of its text in the table
+                positions = pd.Index(texts).get_indexer(list(relations))
+                codes = np.full(sum(len(rows) for rows in relations.values()), -1, dtype=np.int64)
+                for position, rows in zip(positions, relations.values()):
+                    codes[rows] = position
+                self._write_parquet(pd.DataFrame({'posicion': codes}), RELATIONS)
+                self._relations_saved = True
+
+            # Embeddings already computed are taken from the cache; nothing is encoded here
+            vectors, missing = embedding.embedding_cache.lookup(texts)
+            embedded = len(texts) - len(missing) if vectors is not None else 0
+            if embedded > self._embedded:
+                if vectors is not None:
+                    vectors[missing] = np.nan
+                    path = os.path.join(self.path, EMBEDDINGS)
+                    with open(path + '.tmp', 'wb') as f:
+                        np.save(f, vectors)
+                    os.replace(path + '.tmp', path)
+                self._embedded = embedded
+
+            grades = _grade_texts(df['Nota'])
+            if (
+                table_changed or self._saved_grades is None
+                or not grades.index.equals(self._saved_grades.index)
+                or list(df.columns) != self._saved_columns
+            ):
+                self._write_parquet(_arrow_safe(df), TABLE)
+                self._saved_grades = grades
+                self._saved_columns = list(df.columns)
+            edited = grades[grades != self._saved_grades]
+            if test_curves is not None:
+                self._write_parquet(test_curves, TEST_CURVES)
+
+            manifest = {
+                'version': SESSION_VERSION,
+                'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'model': embedding.MODEL_NAME,
+                'answers': len(df),
+                'embedded': embedded,
+                **info,
+                'pending_grades': [[int(row), grade] for row, grade in info.get('pending_grades', {}).items()],
+                'dirty_grades': [[int(idx), grade] for idx, grade in info.get('dirty_grades', {}).items()],
+                'grade_edits': [[int(idx), grade] for idx, grade in edited.items()],
+            }
+            tmp = os.path.join(self.path, MANIFEST + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def load(self) -> dict:
+        """
+        Read the session.
+
+        The saved embeddings are put back into the embedding cache, so the
+        answers are not encoded again when grading is resumed.
+
+        Returns:
+            dict: 'df' (processed table), 'relations', 'test_curves' (or None)
+                  and the info given to save, with pending_grades and
+                  dirty_grades as dictionaries
+
+        Raises:
+            ValueError: If the folder is not a session or was written by a newer version.
+        """
+        with metrics.span('session_load'):
+            try:
+                with open(os.path.join(self.path, MANIFEST), encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"No se puede leer la sesión {self.path}: {e}")
+            if manifest.get('version', 0) > SESSION_VERSION:
+                raise ValueError("La sesión se guardó con una versión más reciente de la aplicación.")
+
+            df = pd.read_parquet(os.path.join(self.path, TABLE))
+            self._saved_grades = _grade_texts(df['Nota'])
+            self._saved_columns = list(df.columns)
+            edits = manifest.get('grade_edits', [])
+            if edits:
+                df['Nota'] = df['Nota'].astype(object)
+                df.loc[[int(idx) for idx, _ in edits], 'Nota'] = [grade for _, grade in edits]
+            codes = pd.read_parquet(os.path.join(self.path, RELATIONS))['posicion'].to_numpy()
+
+            # Group original rows by table position with one stable sort, as Table does
+            rows = np.flatnonzero(codes >= 0)
+            order = rows[np.argsort(codes[rows], kind='stable')]
+            groups = np.split(order, np.cumsum(np.bincount(codes[rows], minlength=len(df)))[:-1])
+            relations = {text: group.tolist() for text, group in zip(df['Respuesta'], groups)}
+
+            embeddings_path = os.path.join(self.path, EMBEDDINGS)
+            if manifest.get('model') == embedding.MODEL_NAME and os.path.exists(embeddings_path):
+                vectors = np.load(embeddings_path)
+                present = ~np.isnan(vectors).any(axis=1)
+                _, missing = embedding.embedding_cache.lookup([df['Respuesta'].iat[i] for i in np.flatnonzero(present)])
+                if missing:
+                    rows = np.flatnonzero(present)[missing]
+                    embedding.embedding_cache.store(df['Respuesta'].iloc[rows].tolist(), vectors[rows])
+                self._embedded = int(present.sum())
+
+            self._relations_saved = True
+            curves_path = os.path.join(self.path, TEST_CURVES)
+            test_curves = pd.read_parquet(curves_path) if os.path.exists(curves_path) else None
+
+        info = {
+            key: value for key, value in manifest.items()
+            if key not in ('version', 'saved', 'model', 'answers', 'embedded', 'grade_edits')
+        }
+        info['pending_grades'] = {int(row): grade for row, grade in manifest.get('pending_grades', [])}
+        info['dirty_grades'] = {int(idx): grade for idx, grade in manifest.get('dirty_grades', [])}
+        return {'df': df, 'relations': relations, 'test_curves': test_curves, **info}
+
+    def _write_parquet(self, df: pd.DataFrame, name: str):
+        """Write a Parquet file of the session through a temporary file."""
+        path = os.path.join(self.path, name)
+        df.to_parquet(path + '.tmp', index=True)
+        os.replace(path + '.tmp', path)
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy of the table whose mixed columns can be written to Parquet.
+
+    The correction window keeps empty cells as '' next to numbers, so mixed
+    object columns are stored as text; they are shown the same way.
+
+    Args:
+        df: Processed table
+
+    Returns:
+        Table with every object column as strings or None
+    """
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].map(lambda value: None if pd.isna(value) else str(value))
+    return df
+
+
+def _grade_texts(grades: pd.Series) -> pd.Series:
+    """Grades as shown in the correction window: text, '' where empty."""
+    return grades.map(lambda value: '' if pd.isna(value) else str(value))
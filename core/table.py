@@ -2,6 +2,7 @@ import pandas as pd
 import string
 from unidecode import unidecode
 import numpy as np
+from core import metrics
 
 
 class Table():
@@ -21,7 +22,7 @@ class Table():
         df_original (pd.DataFrame): Original input DataFrame
     """
 
-    def __init__(self, df_original: pd.DataFrame , options: dict, textsCol: str, respostesCol:str):
+    def __init__(self, df_original: pd.DataFrame , options: dict, textsCol: str, respostesCol:str, idxCols: tuple = None):
         """
         Initialize the Table processor.
         
@@ -33,11 +34,18 @@ class Table():
                 - normalize: Normalize accents/unicode if True
             textsCol: Name of column containing texts to process
             respostesCol: Name of column containing corrections
+            idxCols: Positions of (textsCol, respostesCol) in the original file, when
+                     df_original only holds those columns (see core.loader)
         """
         self.options = options
         self.textsCol = textsCol
         self.respostesCol = respostesCol
         self.df_original = df_original
+        self.idxCols = idxCols
+
+        # Results of the single processing pass, computed on first use
+        self._codes = None
+        self._uniques = None
 
     def getTableProcessed(self) -> pd.DataFrame:
         """
@@ -50,13 +58,19 @@ class Table():
             - Freq: Frequency of each response
             - %: Percentage frequency of each response
         """
-        df_filtered = self._process_texts(self.options, self.df_original)
-        df_filtered = df_filtered.drop_duplicates(subset=[self.textsCol])
-        df_filtered = df_filtered.reset_index()
+        codes, uniques = self._process()
+
+        # First original row of each processed text (factorize numbers texts by first appearance)
+        _, first_rows = np.unique(codes, return_index=True)
         
-        freq_texts, freq_percent = self._getFrequencies(df_filtered[self.textsCol])
+        freq_texts, freq_percent = self._getFrequencies(codes)
         
-        df_final = pd.DataFrame({'Respuesta': df_filtered[self.textsCol], 'Nota': df_filtered[self.respostesCol], 'Freq': freq_texts, '%': freq_percent})
+        df_final = pd.DataFrame({
+            'Respuesta': uniques,
+            'Nota': self.df_original[self.respostesCol].to_numpy()[first_rows],
+            'Freq': freq_texts,
+            '%': freq_percent
+        })
         return df_final
     
     def getIdxCols(self) -> tuple:
@@ -66,6 +80,8 @@ class Table():
         Returns:
             Tuple of (text_column_index, correction_column_index)
         """
+        if self.idxCols is not None:
+            return self.idxCols
         idxTexts = self.df_original.columns.get_loc(self.textsCol)
         idxCorr = self.df_original.columns.get_loc(self.respostesCol)
         return idxTexts, idxCorr
@@ -79,89 +95,84 @@ class Table():
             - Key: Processed text
             - Value: List of indices of original texts that map to this processed text
         """
-        df_processed = self._process_texts(self.options, self.df_original)
-        return self._makeRelations(self.df_original, df_processed)
+        codes, uniques = self._process()
+        return self._makeRelations(codes, uniques)
     
     def getTotalTexts(self):
         return len(self.df_original) - 1
+
+    def _process(self) -> tuple:
+        """
+        Run the processing pass once and cache it on the instance.
+
+        Returns:
+            Tuple of (code of the processed text of every original row,
+                      array of distinct processed texts in order of appearance)
+        """
+        if self._codes is None:
+            processed = self._process_texts(self.options, self.df_original)
+            self._codes, self._uniques = pd.factorize(processed)
+        return self._codes, self._uniques
     
-    def _process_texts(self, options: dict, df_original: pd.DataFrame) -> pd.DataFrame:
+    @metrics.timed('normalize')
+    def _process_texts(self, options: dict, df_original: pd.DataFrame) -> np.ndarray:
         """
         Process texts according to the specified options.
+
+        Each distinct raw text is normalized only once and the result is
+        broadcast back to every row holding it.
         
         Args:
             options: Dictionary of processing options
             df_original: DataFrame containing texts to process
             
         Returns:
-            DataFrame with processed texts
+            Array with the processed text of every original row
         """
-        df_filtered = df_original.copy()
-
-        df_filtered[self.textsCol] = df_filtered[self.textsCol].astype(str)
+        raw_codes, raw_uniques = pd.factorize(df_original[self.textsCol].astype(str))
+        texts = pd.Series(raw_uniques, dtype=object)
 
         if options['lowercase']:
-            df_filtered[self.textsCol] = df_filtered[self.textsCol].str.lower().str.strip()
+            texts = texts.str.lower().str.strip()
 
         if options['punctuations']:
-            df_filtered[self.textsCol] = df_filtered[self.textsCol].str.replace('[{}]'.format(string.punctuation), '', regex=True).str.strip()
+            texts = texts.str.replace('[{}]'.format(string.punctuation), '', regex=True).str.strip()
 
         if options['normalize']:
-            df_filtered[self.textsCol] = df_filtered[self.textsCol].apply(unidecode).str.strip()
+            texts = pd.Series([unidecode(text) for text in texts], dtype=object).str.strip()
 
-
-        return df_filtered
+        return texts.to_numpy()[raw_codes]
     
-    def _makeRelations(self, df_original: pd.DataFrame, df_processed: pd.DataFrame) -> dict:
+    def _makeRelations(self, codes: np.ndarray, uniques: np.ndarray) -> dict:
         """
         Create a relation dictionary mapping processed texts to original text indices.
         
         Args:
-            df_original: Original DataFrame
-            df_processed: Processed DataFrame
+            codes: Code of the processed text of every original row
+            uniques: Distinct processed texts
             
         Returns:
             Dictionary mapping processed texts to lists of original indices
         """
-        
-        relationDict = {}
-        original_texts = df_original[self.textsCol].tolist()
-        processed_texts = df_processed[self.textsCol].tolist()
+        # Group original row numbers by code with one stable sort
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+        groups = np.split(order, boundaries)
 
-        for idOriginal in range(len(original_texts)):
-            
-            original = original_texts[idOriginal]
-            processed = processed_texts[idOriginal]
-
-            if processed in relationDict:  
-                relationDict[processed].append(idOriginal)
-            else:
-                relationDict[processed] = [idOriginal]            
-            
-
-        return relationDict
+        return {text: group.tolist() for text, group in zip(uniques, groups)}
     
-    def _getFrequencies(self, processed_texts: pd.Series) -> tuple:
+    def _getFrequencies(self, codes: np.ndarray) -> tuple:
         """
         Calculate frequencies and percentages for processed texts.
         
         Args:
-            processed_texts: Series of processed texts
+            codes: Code of the processed text of every original row
             
         Returns:
             Tuple of (frequency_list, percentage_list)
         """
-        relationDict = self.getRelationDict()
-        freq_texts = []
-        freq_percent = []  
+        freq_texts = np.bincount(codes)
         total_texts = self.getTotalTexts()
+        freq_percent = ['{0:.2f}'.format(p) for p in freq_texts / total_texts * 100]
 
-        for idProcessed in range(len(processed_texts)):
-            processed = processed_texts[idProcessed]
-
-            freq = len(relationDict[processed])
-
-            freq_texts.append(freq)
-            freq_percent.append('{0:.2f}'.format((freq/total_texts) * 100))
-
-        return freq_texts, freq_percent
\ No newline at end of file
+        return freq_texts.tolist(), freq_percent
@@ -1,7 +1,37 @@
+import time
+
+# Process start reference for the startup timing report
+_START = time.perf_counter()
+_timings = []
+
 def read_api_key_from_file(filename="api_key.txt"):
     try:
         with open(filename, "r") as file:
             return file.read().strip()
     except FileNotFoundError:
         print(f"Error: No se encontró el archivo {filename}")
-        return None
\ No newline at end of file
+        return None
+
+def record_timing(label, seconds=None):
+    """
+    Record a startup timing entry.
+
+    Args:
+        label: Description of the measured step
+        seconds: Duration of the step. If None, the time since process start is recorded.
+    """
+    if seconds is None:
+        seconds = time.perf_counter() - _START
+    _timings.append((label, seconds))
+
+def timing_report():
+    """
+    Format the recorded timings.
+
+    Returns:
+        str: One line per recorded step, in recording order
+    """
+    lines = ["Tiempos de arranque:"]
+    for label, seconds in list(_timings):
+        lines.append(f"  {label:<40} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import (
+    QDialog, QDialogButtonBox, QDoubleSpinBox, QHBoxLayout, QLabel, QPushButton, QSlider, QVBoxLayout
+)
+from core import calibration
+
+
+class CalibrationDialog(QDialog):
+    """
+    Coverage and accuracy of the AI grades against the confidence threshold.
+
+    The curves are computed once, when a test or grading run finishes; dragging
+    the threshold only moves a marker, so the plot follows the slider at once.
+
+    Attributes:
+        test_curves (pd.DataFrame): Curves of the last test run (see calibration.curves), or None
+        run_curves (pd.DataFrame): Coverage of the last grading run, or None
+        threshold (int): Threshold selected in the dialog
+    """
+    def __init__(self, test_curves=None, run_curves=None, threshold=80, target_accuracy=95.0, parent=None):
+        """
+        Initialize the dialog and draw the curves.
+
+        Args:
+            test_curves: Coverage and accuracy of the last test run, or None
+            run_curves: Coverage of the last grading run, or None
+            threshold: Initial threshold
+            target_accuracy: Initial accuracy target for the suggested threshold, in %
+            parent: Parent widget
+        """
+        super().__init__(parent)
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+        from matplotlib.figure import Figure
+
+        self.setWindowTitle("Calibración del umbral de confianza")
+        self.resize(760, 560)
+        self.test_curves = test_curves
+        self.run_curves = run_curves
+        self.threshold = int(round(threshold))
+
+        layout = QVBoxLayout(self)
+
+        # Curves are drawn once; only the threshold marker moves afterwards
+        figure = Figure(figsize=(7, 4), tight_layout=True)
+        self.canvas = FigureCanvasQTAgg(figure)
+        axes = figure.add_subplot()
+        if test_curves is not None and not test_curves.empty:
+            axes.step(test_curves['umbral'], test_curves['cobertura'], where='post', label="Cobertura (test)")
+            axes.step(test_curves['umbral'], test_curves['acierto'], where='post', label="Acierto (test)")
+        if run_curves is not None and not run_curves.empty:
+            axes.step(run_curves['umbral'], run_curves['cobertura'], where='post', linestyle='--',
+                      label="Cobertura (corrección)")
+        axes.set_xlim(0, 100)
+        axes.set_ylim(0, 102)
+        axes.set_xlabel("Umbral de confianza")
+        axes.set_ylabel("%")
+        axes.grid(alpha=0.3)
+        axes.legend(loc='lower left')
+        self.axes = axes
+        self.marker = axes.axvline(self.threshold, color='black', linewidth=1, animated=True)
+        layout.addWidget(self.canvas)
+
+        # Everything but the marker is kept as a bitmap after each full draw
+        self._background = None
+        self.canvas.mpl_connect('draw_event', self._save_background)
+
+        self.slider = QSlider(Qt.Orientation.Horizontal, self)
+        self.slider.setRange(0, 100)
+        self.slider.setValue(self.threshold)
+        self.slider.valueChanged.connect(self._move_threshold)
+        layout.addWidget(self.slider)
+
+        self.info = QLabel(self)
+        layout.addWidget(self.info)
+
+        # Suggested threshold for an accuracy target, only with test results
+        target_row = QHBoxLayout()
+        target_row.addWidget(QLabel("Acierto objetivo (%):", self))
+        self.target = QDoubleSpinBox(self)
+        self.target.setRange(0, 100)
+        self.target.setDecimals(1)
+        self.target.setValue(target_accuracy)
+        self.target.valueChanged.connect(self._update_suggestion)
+        target_row.addWidget(self.target)
+        self.suggestion = QLabel(self)
+        target_row.addWidget(self.suggestion)
+        self.use_suggestion = QPushButton("Usar sugerido", self)
+        self.use_suggestion.clicked.connect(self._apply_suggestion)
+        target_row.addWidget(self.use_suggestion)
+        target_row.addStretch()
+        layout.addLayout(target_row)
+        has_accuracy = test_curves is not None and not test_curves.empty
+        for widget in (self.target, self.use_suggestion):
+            widget.setEnabled(has_accuracy)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self._suggested = None
+        self._update_suggestion()
+        self._move_threshold(self.threshold)
+
+    def _move_threshold(self, value):
+        """Move the marker and describe what the threshold keeps."""
+        self.threshold = value
+        self.marker.set_xdata([value, value])
+
+        details = []
+        row = self._row(self.test_curves, value)
+        if row is not None:
+            details.append(f"en el test se conservan {row['cobertura']:.1f}% de las notas con un acierto del {row['acierto']:.1f}%")
+        row = self._row(self.run_curves, value)
+        if row is not None:
+            details.append(f"en la corrección se conservan {int(row['n'])} notas ({row['cobertura']:.1f}%)")
+        self.info.setText(f"Umbral {value}: " + ("; ".join(details) or "no se conserva ninguna nota"))
+        self._draw_marker()
+
+    def _save_background(self, event):
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.axes.draw_artist(self.marker)
+
+    def _draw_marker(self):
+        """Redraw only the marker over the saved background."""
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self.axes.draw_artist(self.marker)
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def _update_suggestion(self):
+        """Recompute the suggested threshold for the accuracy target."""
+        if self.test_curves is None or self.test_curves.empty:
+            self.suggestion.setText("Ejecuta el test para estimar el acierto.")
+            return
+        self._suggested = calibration.suggest_threshold(self.test_curves, self.target.value())
+        if self._suggested is None:
+            self.suggestion.setText("Ningún umbral alcanza ese acierto.")
+        else:
+            self.suggestion.setText(f"Umbral sugerido: {self._suggested:g}")
+        self.use_suggestion.setEnabled(self._suggested is not None)
+
+    def _apply_suggestion(self):
+        if self._suggested is not None:
+            # Integer slider: round up so the target is still met
+            self.slider.setValue(min(100, int(-(-self._suggested // 1))))
+
+    @staticmethod
+    def _row(table, value):
+        if table is None or table.empty:
+            return None
+        return calibration.at_threshold(table, value)
@@ -1,16 +1,32 @@
 import sys
 import os
 import pathlib
-import pandas as pd
-import openpyxl as xl
 from PyQt6.QtWidgets import (
-    QFileDialog, QWidget, QMessageBox, QTableWidgetItem
+    QFileDialog, QWidget, QMessageBox, QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtCore import Qt, QEvent
+from PyQt6.QtCore import Qt, QEvent, QTimer
 from PyQt6.QtGui import QMouseEvent
 from PyQt6 import uic
-from core.processor import evaluate_dataframe
-from gui.helpers import DataFrameViewer
+from core import calibration, metrics
+from core.export import AI_COLUMNS, expand_results
+from core.processor import format_summary
+from core.question_index import QuestionIndex
+from core.session import Session, session_path
+from gui.calibration_widget import CalibrationDialog
+from gui.helpers import DataFrameViewer, GradingOptionsDialog, MetricsDialog
+from gui.models import DataFrameModel, GradedFilterProxyModel
+from gui.workers import ExportWorker, GradingWorker, IndexUpdateWorker, start_worker
+
+# Choices of the output format selector: (label, output_format of save_results)
+SAVE_FORMATS = [
+    ("Guardar como el original", None),
+    ("Guardar en xlsx (rápido)", 'xlsx'),
+    ("Guardar en CSV", 'csv'),
+    ("Guardar en Parquet", 'parquet'),
+]
+
+# Milliseconds between two autosaves of the session, if anything changed
+AUTOSAVE_INTERVAL_MS = 10000
 
 class CorrectionWindow(QWidget):
     """
@@ -31,10 +47,16 @@ class CorrectionWindow(QWidget):
         idxCorr (int): Column index of corrections in original file
         file_name (str): Path to the original Excel file
         sheet_name (str): Name of the worksheet being processed
-        wb (openpyxl.Workbook): Loaded Excel workbook
-        excel (openpyxl.Worksheet): Active worksheet
+        question_index (QuestionIndex): Retrieval index of the graded answers, saved next to the file
+        pending_grades (dict): Original data row -> applied manual grade, written on export
+        metrics (RunMetrics): Performance metrics of the session, shown in the metrics panel
+        test_curves (pd.DataFrame): Coverage and accuracy by threshold of the last test run
+        run_curves (pd.DataFrame): Coverage by threshold of the last grading run
+        session (Session): Session of the sheet, autosaved so it can be reopened as it was left
+        grading_options (dict): Options of the AI grading chosen in the options dialog
     """
-    def __init__(self, df, relations, file_name, idxTexts, idxCorr, numTotalOriginal, sheet_name):
+    def __init__(self, df, relations, file_name, idxTexts, idxCorr, numTotalOriginal, sheet_name,
+                 session=None, restored=None):
         """
         Initialize the correction window with data and UI.
 
@@ -46,6 +68,8 @@ class CorrectionWindow(QWidget):
             idxCorr: Column index of corrections in original file
             numTotalOriginal: Total number of original responses
             sheet_name: Name of the worksheet being processed
+            session: Session the data was read from, or None to start a new one
+            restored: State read from that session (see Session.load)
         """
         super().__init__()
 
@@ -60,10 +84,22 @@ class CorrectionWindow(QWidget):
         self.file_name = file_name
         self.path = pathlib.PurePath(self.file_name)
         self.sheet_name = sheet_name
+        self.numTotalOriginal = numTotalOriginal
 
-        # Load Excel workbook
-        self.wb = xl.load_workbook(self.file_name)
-        self.excel = self.wb[self.sheet_name]
+        # Applied grades are kept here; the original file is only opened on export
+        self.pending_grades = {}
+
+        # Options of the AI grading, see core.processor.DEFAULT_OPTIONS
+        self.grading_options = {'pack_size': 1, 'neighbor_similarity': None, 'cluster_similarity': None}
+
+        # Started by the home window before loading the file, so loading is included
+        self.metrics = metrics.current() or metrics.enable()
+        self.metrics_path = os.path.join(os.getcwd(), 'outputs', f"{self.path.stem} - {self.sheet_name} - metricas.json")
+
+        # Retrieval index of this question, kept next to the file and updated on every Apply
+        self.question_index = QuestionIndex(
+            os.path.join(str(self.path.parent), f"{self.path.stem} - {self.sheet_name}.faiss")
+        )
 
         # Setup UI
         uic.loadUi('assets/CorrectionWindow.ui', self)
@@ -77,12 +113,55 @@ class CorrectionWindow(QWidget):
         self.table.viewport().installEventFilter(self)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.NoContextMenu)
 
+        # Table model over the DataFrame; the proxy hides graded rows on demand
+        self.model = DataFrameModel(editable_columns=['Nota'], parent=self)
+        self.proxy = GradedFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.table.setModel(self.proxy)
+        self.model.valueEdited.connect(self._mark_dirty)
+        self.table.verticalScrollBar().valueChanged.connect(self._resize_visible_rows)
+        self.proxy.layoutChanged.connect(self._resize_visible_rows)
+
         # Connect signals
         self.aplicarCorr.clicked.connect(self.make_corrections)
         self.cerrarGuardar.clicked.connect(self._close_and_save)
         self.testLLM.clicked.connect(self.test_LLM)
         self.corregir_IA.clicked.connect(self.evaluate)
+        self.cancelarIA.clicked.connect(self.cancel_grading)
         self.hideEval.stateChanged.connect(self.hide_evaluated)
+        self.metricas.clicked.connect(self.show_metrics)
+        self.calibracion.clicked.connect(self.show_calibration)
+        self.opcionesIA.clicked.connect(self.show_grading_options)
+        for label, output_format in SAVE_FORMATS:
+            self.formatoSalida.addItem(label, output_format)
+
+        # Grades edited since the last Apply: df index -> new grade
+        self.dirty_grades = {}
+
+        # Background grading or saving state
+        self.worker = None
+        self.worker_thread = None
+
+        # Background update of the question index: answer text -> grade applied while one runs
+        self.index_worker = None
+        self.index_thread = None
+        self._index_queue = {}
+
+        # Threshold curves, computed once per run (see core.calibration)
+        self.test_curves = None
+        self.run_curves = None
+
+        # A new session is written on the first autosave, a reopened one once it changes
+        self.session = session or Session(session_path(self.file_name, self.sheet_name))
+        self._session_dirty = restored is None
+        # Whether more than grades changed, so the whole table must be written again
+        self._session_table_dirty = False
+        if restored is not None:
+            self._restore(restored)
+        self.umbral.textChanged.connect(self._touch_session)
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.save_session)
+        self.autosave_timer.start(AUTOSAVE_INTERVAL_MS)
 
         # Initialize table
         self.write_table()
@@ -90,10 +169,14 @@ class CorrectionWindow(QWidget):
     
     def write_table(self, remove=False, resize=True):
         """
-        Populate the table widget with DataFrame contents.
+        Show the DataFrame contents in the table.
+
+        The model reads cells from the DataFrame on demand, so only the rows
+        on screen are converted and sized.
 
         Args:
             remove: If True, removes already evaluated rows from display
+            resize: If True, fits the visible rows to their contents
         """
         
         self.df.fillna('', inplace=True)
@@ -102,20 +185,7 @@ class CorrectionWindow(QWidget):
         if remove:
             self.df = self.df[self.df['Nota'] == '']
 
-        # Configure table dimensions and headers
-        self.table.setRowCount(self.df.shape[0])
-        self.table.setColumnCount(self.df.shape[1])
-        self.table.setHorizontalHeaderLabels(self.df.columns)
-
-        # Populate table cells
-        for i in range(len(self.df)):
-            for j in range(len(self.df.columns)):
-                if j == 2:
-                    item = QTableWidgetItem()
-                    item.setData(Qt.ItemDataRole.DisplayRole, int(self.df.iat[i,j]))
-                    self.table.setItem(i,j, item)
-                else:
-                    self.table.setItem(i,j, QTableWidgetItem(str(self.df.iat[i,j])))
+        self.model.set_dataframe(self.df)
         
         # Configure column widths
         horizontalHeader = self.table.horizontalHeader()
@@ -125,123 +195,381 @@ class CorrectionWindow(QWidget):
         horizontalHeader.resizeSection(3, 50)
 
         if resize:
-            self.table.resizeRowsToContents()
+            self._resize_visible_rows()
 
         return
 
+    def _resize_visible_rows(self):
+        """Fit the height of the rows currently on screen to their contents."""
+        first = self.table.rowAt(0)
+        if first < 0:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.proxy.rowCount() - 1
+        for row in range(first, last + 1):
+            self.table.resizeRowToContents(row)
+
     
     def make_corrections(self):
-        """Apply manual corrections to the original Excel file."""
-        for row in range(self.table.rowCount()):
+        """
+        Apply the grades edited since the last call to the original Excel file.
+
+        Only rows in the dirty set are recorded, for every original row they stand for.
+        The grades are written to the file on export; the DataFrame already holds
+        the edits, so the table is not rebuilt.
+        """
+        for idx, score in self.dirty_grades.items():
+            text = self.df.at[idx, 'Respuesta']
 
-            score = self.table.item(row, 1).text()
-            text = self.table.item(row, 0).text()
-            
             if text not in self.relations:
-                self.dlg.setText("Error en el texto: ", text, " -> ESTE ERROR NO DEBERIA PASSAR")
+                self.dlg.setText(f"Error en el texto: {text} -> ESTE ERROR NO DEBERIA PASSAR")
                 button = self.dlg.exec()
                 if button == QMessageBox.StandardButton.Ok:
                     return
 
-            # Write corrections to Excel file
-            if score != '':
-                for idRow in self.relations[text]:
-                    cell_to_write = self.excel.cell(row=idRow + 2, column=self.idxCorr + 1)
-                    cell_to_write.value = str(score)
+            # Write corrections to Excel file (a cleared grade clears the cell)
+            value = str(score) if score != '' else None
+            for idRow in self.relations[text]:
+                self.pending_grades[idRow] = value
 
-        # Update progress display
-        self.df = self._dataframe_generation_from_table(self.table)
-        evaluated_count = self.df['Nota'].apply(lambda x: pd.notna(x) and str(x) != '').sum()
-        self.progressBar.setValue(evaluated_count)
-        self.label_prog.setText(str(evaluated_count) + "/" + str(self.totalTexts) + ' Respuestas corregidas')
+        self._update_question_index(self.dirty_grades)
+        self.dirty_grades = {}
+        self._touch_session()
+        self.df_evaluated = self.df[self.df['Nota'] != '']
 
-        self.write_table(remove=False)
+        # Update progress display
+        self._update_progress()
 
         return
+
+    def _update_question_index(self, grades):
+        """
+        Add, relabel or remove the applied answers in the question's retrieval index.
+
+        The update runs in the background, one at a time and in the order the
+        grades were applied; grades applied meanwhile are merged into the next one.
+
+        Args:
+            grades: df index -> grade of the applied rows
+        """
+        for idx, grade in grades.items():
+            self._index_queue[self.df.at[idx, 'Respuesta']] = grade
+        if self._index_queue and self.index_thread is None:
+            self._start_index_update()
+
+    def _start_index_update(self):
+        """Run the queued question index update in its own thread."""
+        grades, self._index_queue = self._index_queue, {}
+        worker = IndexUpdateWorker(self.question_index, list(grades), list(grades.values()))
+        worker.finished.connect(self._index_update_done)
+        worker.failed.connect(self._index_update_failed)
+        self.index_worker = worker
+        self.index_thread = start_worker(worker, self)
+
+    def _index_update_done(self, _=None):
+        """Start the next queued question index update, if any."""
+        self.index_worker = None
+        self.index_thread = None
+        if self._index_queue:
+            self._start_index_update()
+
+    def _index_update_failed(self, message):
+        """Report a failed question index update and go on with the next one."""
+        # The index is synced again from the graded answers before the next grading
+        print(f"Error actualizando el índice de la pregunta: {message}")
+        self._index_update_done()
+
+    def _mark_dirty(self, idx, column, value):
+        """
+        Remember a grade edited in the table until it is applied.
+
+        Args:
+            idx: DataFrame index of the edited row
+            column: Edited column
+            value: New value
+        """
+        if column == 'Nota':
+            self.dirty_grades[idx] = value
+            self._touch_session()
     
     def test_LLM(self):
-        """Test the AI evaluation on already evaluated responses."""
-        df_result = evaluate_dataframe(self.df_evaluated, test=True)
+        """Cross-validate the AI evaluation on already evaluated responses in the background."""
+        worker = GradingWorker(self.df_evaluated, test=True, options=self.grading_options)
+        worker.finished.connect(self._show_test_results)
+        self._start_grading(worker)
+
+    def _show_test_results(self, df_result):
+        """
+        Show the comparison between human and AI grades of a finished test.
+
+        Args:
+            df_result: Out-of-fold grades returned by the grading worker (see cross_validate)
+        """
+        self._end_grading()
+        evaluation = df_result.attrs.get('evaluation')
         df_result = df_result[df_result['nota IA'].notna()].reset_index()
-        
-        columns_to_show = ['Respuesta', 'Nota', 'nota IA', 'feedback IA', 'confidence']
+
+        # Agreement with the human grades estimates the accuracy of each threshold
+        self.test_curves = calibration.curves(*calibration.agreement(df_result))
+        self._fill_thresholds()
+        self._touch_session()
+
+        columns_to_show = ['Respuesta', 'Nota', 'nota IA', 'feedback IA', 'confidence', 'fold']
+        if 'cluster' in df_result.columns:
+            # Let reviewers see which rows were propagated from the same medoid
+            columns_to_show.append('cluster')
         df_result = df_result[columns_to_show]
 
         # Show comparison in a new table
         if not df_result.empty:
             viewer = DataFrameViewer(df_result, parent=self)
+            if evaluation is not None:
+                viewer.setWindowTitle(
+                    f"Resultado del Test: acierto {evaluation['accuracy_mean']:.1f}% ± {evaluation['accuracy_std']:.1f}, "
+                    f"kappa {evaluation['kappa_mean']:.2f} ± {evaluation['kappa_std']:.2f}"
+                )
             viewer.exec()
 
         return
     
+    def show_metrics(self):
+        """Open the performance metrics panel of the session."""
+        MetricsDialog(self.metrics, self.metrics_path, parent=self).exec()
+
     def hide_evaluated(self):
         """Toggle visibility of already evaluated rows based on checkbox state."""
-        column_to_check = 1 # Grage Colum
-        hide_non_empty = self.hideEval.isChecked()
-
-        for row in range(self.table.rowCount()):
-            item = self.table.item(row, column_to_check)
-            value = item.text() if item else ""
-            should_hide = hide_non_empty and value.strip() != ""
-            self.table.setRowHidden(row, should_hide)
+        self.proxy.set_hide_graded(self.hideEval.isChecked())
+        self._resize_visible_rows()
 
     def evaluate(self):
-        """Evaluate responses using AI and display confidence thresholds."""
-        df_result = evaluate_dataframe(self.df, test=False)
+        """Evaluate ungraded responses using AI in the background, showing rows as they are graded."""
+        # Add the AI columns up front so graded rows can be shown as they arrive
+        for column in AI_COLUMNS:
+            if column not in self.df.columns:
+                self.df[column] = ''
+        self.write_table(resize=False)
+
+        # Journal per workbook and sheet so an interrupted run can be resumed
+        journal_path = os.path.join('.cache', 'journals', f"{self.path.stem} - {self.sheet_name}.jsonl")
+        options = {**self.grading_options, 'journal_path': journal_path, 'question_index': self.question_index}
+        worker = GradingWorker(self.df, test=False, options=options)
+        worker.row_graded.connect(self._show_graded_row)
+        worker.finished.connect(self._finish_evaluate)
+        self._start_grading(worker)
+
+    def cancel_grading(self):
+        """Stop the running grading; rows already graded are kept."""
+        if self.worker is not None:
+            self.cancelarIA.setEnabled(False)
+            self.label_prog.setText("Cancelando...")
+            self.worker.cancel()
+
+    def _start_grading(self, worker):
+        """
+        Run a grading worker in its own thread and lock the actions that would conflict with it.
+
+        Args:
+            worker: GradingWorker to run
+        """
+        worker.progress.connect(self._show_grading_progress)
+        worker.failed.connect(self._grading_failed)
+        self._set_grading(True)
+        self.progressBar.setValue(0)
+        self.worker = worker
+        self.worker_thread = start_worker(worker, self)
+
+    def _end_grading(self):
+        """Unlock the window after a grading run and restore the manual grading progress."""
+        self.worker = None
+        self.worker_thread = None
+        self._set_grading(False)
+        self._update_progress()
+
+    def _set_grading(self, running):
+        """Enable or disable the buttons depending on whether a grading run is active."""
+        for button in (self.aplicarCorr, self.testLLM, self.corregir_IA, self.cerrarGuardar):
+            button.setEnabled(not running)
+        self.cancelarIA.setEnabled(running)
+
+    def _show_grading_progress(self, done, total):
+        """Update the progress bar while the AI grades."""
+        self.progressBar.setRange(0, max(total, 1))
+        self.progressBar.setValue(done)
+        self.label_prog.setText(f"{done}/{total} Respuestas evaluadas por IA")
+
+    def _update_progress(self):
+        """Show how many responses have a manual grade."""
+        evaluated_count = self.model.graded_count()
+        self.progressBar.setRange(0, self.totalTexts)
+        self.progressBar.setValue(evaluated_count)
+        self.label_prog.setText(str(evaluated_count) + "/" + str(self.totalTexts) + ' Respuestas corregidas')
+
+    def _show_graded_row(self, idx, values):
+        """
+        Write a row graded by the worker into the DataFrame and the table.
+
+        Args:
+            idx: Index of the row in self.df
+            values: Mapping of AI column name to value
+        """
+        self.model.update_row(idx, values)
+        self._touch_session(table=True)
+
+    def _grading_failed(self, message):
+        """Report a grading error and unlock the window."""
+        self._end_grading()
+        self.dlg.setText(message)
+        self.dlg.exec()
+
+    def _finish_evaluate(self, df_result):
+        """
+        Show the results of a finished (or cancelled) AI grading and the confidence thresholds.
+
+        Args:
+            df_result: DataFrame returned by the grading worker
+        """
+        self._end_grading()
+        # Keep the grades as shown in the table, including edits made during the run
+        df_result['Nota'] = self.df['Nota']
         self.df = df_result
         self.write_table(resize=False)
 
-        # Calculate confidence thresholds
-        confidence_series = pd.to_numeric(df_result['confidence'], errors='coerce').dropna()
-        total_valid = len(confidence_series)
-        umbrales = sorted(confidence_series.unique(), reverse=True)
-        
-        # Prepare threshold data for display
-        data = []
-        for umbral in umbrales:
-            count = (confidence_series >= umbral).sum()
-            porcentaje = (count / total_valid) * 100
-            data.append((umbral, porcentaje))
-
-        # Populate thresholds table
-        self.umbrales.setRowCount(len(data))
-        self.umbrales.setColumnCount(2)
-        self.umbrales.setHorizontalHeaderLabels(['Umbral', 'Porcentaje'])
-
-        for row, (umbral, porcentaje) in enumerate(data):
-            umbral_item = QTableWidgetItem(f"{umbral:.2f}")
-            porcentaje_item = QTableWidgetItem(f"{porcentaje:.2f}%")
-            umbral_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            porcentaje_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.umbrales.setItem(row, 0, umbral_item)
-            self.umbrales.setItem(row, 1, porcentaje_item)
-        
+        self.run_curves = calibration.curves(df_result['confidence'])
+        self._fill_thresholds()
+        self._touch_session(table=True)
+        self.save_session()
+
+        # How many rows were graded without calling GPT-4o
+        summary = df_result.attrs.get('summary')
+        if summary is not None:
+            QMessageBox.information(self, "Corrección IA", f"Resumen: {format_summary(summary)}")
+
         return
 
-    def _dataframe_generation_from_table(self, table):
+    def _fill_thresholds(self):
+        """
+        Show the share of AI grades kept at each confidence threshold of the
+        last grading run and, after a test, the accuracy expected at it.
+        """
+        curves = self.run_curves if self.run_curves is not None else self.test_curves
+        if curves is None:
+            return
+
+        columns = ['Umbral', 'Porcentaje']
+        if self.test_curves is not None:
+            columns.append('Acierto test')
+        self.umbrales.setRowCount(len(curves))
+        self.umbrales.setColumnCount(len(columns))
+        self.umbrales.setHorizontalHeaderLabels(columns)
+        self.umbrales.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
+        for row, (umbral, porcentaje) in enumerate(zip(curves['umbral'], curves['cobertura'])):
+            values = [f"{umbral:.2f}", f"{porcentaje:.2f}%"]
+            if self.test_curves is not None:
+                test_row = calibration.at_threshold(self.test_curves, umbral)
+                values.append(f"{test_row['acierto']:.2f}%" if test_row is not None else '')
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.umbrales.setItem(row, column, item)
+
+    def show_grading_options(self):
+        """Open the options of the AI grading and keep the ones accepted."""
+        dialog = GradingOptionsDialog(self.grading_options, parent=self)
+        if dialog.exec():
+            self.grading_options = dialog.options
+            self._touch_session()
+
+    def show_calibration(self):
+        """Open the coverage/accuracy curves and take the threshold chosen there."""
+        if self.test_curves is None and self.run_curves is None:
+            self.dlg.setText("Ejecuta el test o la corrección con IA para ver las curvas de calibración.")
+            self.dlg.exec()
+            return
+        try:
+            threshold = float(self.umbral.toPlainText())
+        except ValueError:
+            threshold = 80
+        dialog = CalibrationDialog(self.test_curves, self.run_curves, threshold, parent=self)
+        if dialog.exec():
+            self.umbral.setPlainText(str(dialog.threshold))
+
+    @classmethod
+    def from_session(cls, path):
         """
-        Create a DataFrame from the current table contents.
+        Reopen a saved session without reading the exam file again.
 
         Args:
-            table: The QTableWidget to convert
+            path: Session folder (see core.session)
 
         Returns:
-            DataFrame containing the table data
+            CorrectionWindow showing the session as it was left
+
+        Raises:
+            ValueError: If the folder is not a readable session.
         """
-        number_of_rows = table.rowCount()
-        number_of_columns = table.columnCount()
+        session = Session(path)
+        state = session.load()
+        return cls(state['df'], state['relations'], state['file_name'], state['idxTexts'], state['idxCorr'],
+                   state['numTotalOriginal'], state['sheet_name'], session=session, restored=state)
 
-        tmp_df = pd.DataFrame( 
-                    columns=['Respuesta', 'Nota', 'Freq', '%'], 
-                    index=range(number_of_rows) 
-                    ) 
-        
-        for i in range(number_of_rows):
-            for j in range(number_of_columns):
-                tmp_df.iloc[i, j] = str(table.item(i, j).text())  
+    def _restore(self, state):
+        """
+        Take the grades, threshold and curves of a reopened session.
+
+        Args:
+            state: State read from the session (see Session.load)
+        """
+        self.pending_grades = state['pending_grades']
+        self.dirty_grades = state['dirty_grades']
+        self.test_curves = state['test_curves']
+        self.grading_options.update(state.get('grading_options', {}))
+        self.umbral.setPlainText(state.get('threshold', ''))
+        if 'confidence' in self.df.columns:
+            curves = calibration.curves(self.df['confidence'])
+            self.run_curves = curves if len(curves) else None
+        self._fill_thresholds()
+
+    def _touch_session(self, table=False):
+        """
+        Mark the session as changed so the next autosave writes it.
+
+        Args:
+            table: True if the table changed beyond its grades
+        """
+        self._session_dirty = True
+        self._session_table_dirty |= table
+
+    def save_session(self):
+        """Write the session if it changed since the last save."""
+        if not self._session_dirty:
+            return
+        info = {
+            'file_name': os.path.abspath(self.file_name),
+            'sheet_name': self.sheet_name,
+            'idxTexts': int(self.idxTexts),
+            'idxCorr': int(self.idxCorr),
+            'numTotalOriginal': int(self.numTotalOriginal),
+            'threshold': self.umbral.toPlainText(),
+            'pending_grades': self.pending_grades,
+            'dirty_grades': self.dirty_grades,
+            'grading_options': self.grading_options,
+        }
+        try:
+            self.session.save(self.df, self.relations, info, self.test_curves, self._session_table_dirty)
+        except Exception as e:
+            # Correcting can go on; the next autosave tries again
+            print(f"No se pudo guardar la sesión: {e}")
+            return
+        self._session_dirty = False
+        self._session_table_dirty = False
+
+    def closeEvent(self, event):
+        """Save the session before the window closes."""
+        self.save_session()
+        super().closeEvent(event)
 
-        return tmp_df   
-    
     def eventFilter(self, source, event):
         """
         Handle mouse events for quick grading in the table.
@@ -255,20 +583,22 @@ class CorrectionWindow(QWidget):
         """
         
         if source == self.table.viewport() and isinstance(event, QMouseEvent):
-            item = self.table.itemAt(event.pos())
+            index = self.table.indexAt(event.pos())
             
-            if item is not None and self.radioEdicionNotas.isChecked():
+            if index.isValid() and self.radioEdicionNotas.isChecked():
                 try:
                     nota_col = list(self.df.columns).index("Nota")
-                    if item.column() == nota_col:
-                        if event.button() == Qt.MouseButton.LeftButton:
-                            item.setText("1")
-                            return True
-                        elif event.button() == Qt.MouseButton.RightButton:
-                            item.setText("0")
-                            return True
-                        elif event.button() == Qt.MouseButton.MiddleButton:
-                            item.setText("")
+                    if index.column() == nota_col:
+                        grades = {
+                            Qt.MouseButton.LeftButton: "1",
+                            Qt.MouseButton.RightButton: "0",
+                            Qt.MouseButton.MiddleButton: "",
+                        }
+                        if event.button() in grades:
+                            # Grade on press only: a hidden graded row would let the
+                            # release land on the next row
+                            if event.type() == QEvent.Type.MouseButtonPress:
+                                self.proxy.setData(index, grades[event.button()])
                             return True
                 except ValueError:
                     pass
@@ -276,44 +606,58 @@ class CorrectionWindow(QWidget):
         return super().eventFilter(source, event)
 
     def _close_and_save(self):
-        """Save AI evaluations to Excel and close the application."""
-        umbral_final = float(self.umbral.toPlainText())
-
-        for row in range(self.table.rowCount()):
-            score_AI = self.table.item(row, 4).text()
-            feedback = self.table.item(row, 5).text()
-            confidence = self.table.item(row, 6).text()
-            text = self.table.item(row, 0).text()
-
-            if confidence != '':
-                if float(confidence) < umbral_final:
-                    continue
-
-            if text not in self.relations:
-                self.dlg.setText("Error en el texto: ", text, " -> ESTE ERROR NO DEBERIA PASSAR")
-                button = self.dlg.exec()
-                if button == QMessageBox.StandardButton.Ok:
-                    return
-            
-
-            self.excel.cell(row=1, column=self.idxCorr + 2).value = "Nota IA"
-            self.excel.cell(row=1, column=self.idxCorr + 3).value = "Feedback IA"
-            self.excel.cell(row=1, column=self.idxCorr + 4).value = "Confidence"
-            # Write full evaluation to Excel
-            for idRow in self.relations[text]:
-                # Write AI score
-                cell_to_write = self.excel.cell(row=idRow + 2, column=self.idxCorr + 2)
-                cell_to_write.value = str(score_AI)
-
-                # Write feedback
-                cell_to_write = self.excel.cell(row=idRow + 2, column=self.idxCorr + 3)
-                cell_to_write.value = str(feedback)
-
-                # Write confidence
-                cell_to_write = self.excel.cell(row=idRow + 2, column=self.idxCorr + 4)
-                cell_to_write.value = str(confidence)
-
-        # Save to outputs directory
-        self.wb.save(os.getcwd() + '\outputs\\' + self.path.name.replace(".xlsx"," - corregido") + ".xlsx")
-
-        sys.exit()
\ No newline at end of file
+        """Save manual grades and AI evaluations to a copy of the original file in the background, then close the application."""
+        # Without a threshold every graded row is saved
+        text = self.umbral.toPlainText().strip()
+        try:
+            threshold = float(text) if text else None
+        except ValueError:
+            self.dlg.setText(f"El umbral debe ser un número: {text}")
+            self.dlg.exec()
+            return
+
+        try:
+            # AI results of every original row, in the order of the file
+            ai_results = expand_results(self.df, self.relations, threshold)
+        except ValueError as e:
+            self.dlg.setText(str(e))
+            self.dlg.exec()
+            return
+
+        worker = ExportWorker(
+            self.file_name, self.sheet_name, self.idxCorr, dict(self.pending_grades), ai_results,
+            output_dir=os.path.join(os.getcwd(), 'outputs'), output_format=self.formatoSalida.currentData()
+        )
+        worker.progress.connect(self._show_save_progress)
+        worker.finished.connect(self._finish_save)
+        worker.failed.connect(self._save_failed)
+
+        self._set_grading(True)
+        self.cancelarIA.setEnabled(False)
+        self.formatoSalida.setEnabled(False)
+        self.progressBar.setRange(0, 0)
+        self.label_prog.setText("Guardando...")
+        self.worker = worker
+        self.worker_thread = start_worker(worker, self)
+
+    def _show_save_progress(self, done, total):
+        """Update the progress bar while the file is written."""
+        self.progressBar.setRange(0, max(total, 1))
+        self.progressBar.setValue(done)
+        self.label_prog.setText(f"Guardando... {done}/{total} filas")
+
+    def _finish_save(self, path):
+        """Save the metrics report and the session, and close the application."""
+        print(f"Archivo guardado en {path}")
+        self.save_session()
+        try:
+            self.metrics.save(self.metrics_path)
+        except OSError as e:
+            print(f"No se pudo guardar el informe de métricas: {e}")
+
+        sys.exit()
+
+    def _save_failed(self, message):
+        """Report a saving error and unlock the window so the user can try again."""
+        self.formatoSalida.setEnabled(True)
+        self._grading_failed(f"No se pudo guardar el archivo: {message}")
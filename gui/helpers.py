@@ -1,4 +1,10 @@
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem
+import pandas as pd
+from PyQt6.QtWidgets import (
+    QDialog, QDialogButtonBox, QDoubleSpinBox, QFileDialog, QFormLayout, QHBoxLayout, QPushButton, QSpinBox,
+    QVBoxLayout, QTableView
+)
+from core import metrics
+from gui.models import DataFrameModel
 
 class DataFrameViewer(QDialog):
     def __init__(self, df, parent=None):
@@ -7,14 +13,118 @@ class DataFrameViewer(QDialog):
         self.resize(1000, 600)
 
         layout = QVBoxLayout(self)
-        table = QTableWidget(self)
-        table.setRowCount(len(df))
-        table.setColumnCount(len(df.columns))
-        table.setHorizontalHeaderLabels(df.columns)
-
-        for row_idx, row in df.iterrows():
-            for col_idx, value in enumerate(row):
-                table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
+        table = QTableView(self)
+        self.model = DataFrameModel(df, parent=self)
+        table.setModel(self.model)
 
         table.resizeColumnsToContents()
-        layout.addWidget(table)
\ No newline at end of file
+        layout.addWidget(table)
+
+
+class MetricsDialog(QDialog):
+    """
+    Performance metrics of the current session: time per stage, LLM latency,
+    tokens and estimated cost, errors, retries and cache hit rates.
+
+    Attributes:
+        collector (RunMetrics): Metrics shown
+        default_path (str): Suggested file when exporting the report
+    """
+    def __init__(self, collector, default_path='', parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Métricas de rendimiento")
+        self.resize(600, 600)
+        self.collector = collector
+        self.default_path = default_path
+
+        layout = QVBoxLayout(self)
+        self.table = QTableView(self)
+        self.model = DataFrameModel(parent=self)
+        self.table.setModel(self.model)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        refresh = QPushButton("Actualizar", self)
+        refresh.clicked.connect(self.refresh)
+        export = QPushButton("Exportar...", self)
+        export.clicked.connect(self.export)
+        buttons.addStretch()
+        buttons.addWidget(refresh)
+        buttons.addWidget(export)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        """Show the metrics collected so far."""
+        rows = metrics.flatten(self.collector.report())
+        self.model.set_dataframe(pd.DataFrame(rows, columns=['Sección', 'Métrica', 'Valor']).astype(str))
+        self.table.resizeColumnsToContents()
+
+    def export(self):
+        """Save the report as JSON or CSV, depending on the chosen extension."""
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Exportar métricas", self.default_path, "JSON (*.json);;CSV (*.csv)"
+        )
+        if path:
+            self.collector.save(path)
+
+
+class GradingOptionsDialog(QDialog):
+    """
+    Grading options of the AI correction (see core.processor.DEFAULT_OPTIONS).
+
+    Attributes:
+        options (dict): Options shown, updated when the dialog is accepted
+    """
+    def __init__(self, options, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Opciones de la corrección IA")
+        self.options = dict(options)
+
+        layout = QFormLayout(self)
+        self.pack_size = QSpinBox(self)
+        self.pack_size.setRange(1, 20)
+        self.pack_size.setValue(int(self.options.get('pack_size', 1)))
+        self.pack_size.setToolTip("Respuestas corregidas en cada petición cuando comparten ejemplos")
+        layout.addRow("Respuestas por petición", self.pack_size)
+
+        self.neighbor_similarity = self._similarity_box(
+            'neighbor_similarity', "Similitud con las respuestas valoradas más cercanas a partir de la que se copia su nota"
+        )
+        layout.addRow("Copiar nota de vecinos", self.neighbor_similarity)
+
+        self.cluster_similarity = self._similarity_box(
+            'cluster_similarity', "Similitud para agrupar respuestas y corregir solo una de cada grupo"
+        )
+        layout.addRow("Agrupar respuestas", self.cluster_similarity)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, parent=self
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def accept(self):
+        """Take the values of the dialog."""
+        self.options['pack_size'] = self.pack_size.value()
+        self.options['neighbor_similarity'] = self._similarity(self.neighbor_similarity)
+        self.options['cluster_similarity'] = self._similarity(self.cluster_similarity)
+        super().accept()
+
+    def _similarity_box(self, option, tooltip):
+        """Spin box of a cosine similarity option; its minimum means None (disabled)."""
+        box = QDoubleSpinBox(self)
+        box.setRange(0, 1)
+        box.setSingleStep(0.01)
+        box.setDecimals(2)
+        box.setSpecialValueText("Desactivado")
+        box.setValue(self.options.get(option) or 0)
+        box.setToolTip(tooltip)
+        return box
+
+    @staticmethod
+    def _similarity(box):
+        """Value of a similarity spin box, None when disabled."""
+        return box.value() if box.value() > box.minimum() else None
@@ -1,14 +1,16 @@
 import sys
-import openpyxl as xl
 import pathlib
 from PyQt6.QtWidgets import QFileDialog, QMainWindow, QApplication, QWidget, QVBoxLayout, QLabel, QStyledItemDelegate,\
                             QTableWidget, QTableWidgetItem,  QMessageBox
 from PyQt6.QtCore import Qt
 import pandas as pd 
 from PyQt6 import uic   
-from gui.table_widget import Table
+from core.table import Table
 import time
 import os
+from core import embedding, metrics
+from core.loader import load_answers
+from core.session import SESSION_SUFFIX
 from gui.correction_widget import CorrectionWindow
 
 class HomeWindow(QMainWindow):
@@ -40,19 +42,23 @@ class HomeWindow(QMainWindow):
         # Connect button signals
         self.loadExcel.clicked.connect(self.load_excel)
         self.startButton.clicked.connect(self.start_correction)
+        self.openSession.clicked.connect(self.open_session)
         
         # Initialize error message dialog
         self.dlg = QMessageBox(self)
         self.dlg.setWindowTitle("Error")
 
+        # Load the embedding model while the user picks the file and columns
+        self.warm_up_thread = embedding.warm_up()
+
     def start_correction(self):
         """
         Start the text correction process by:
         1. Validating if a file is selected
-        2. Loading and processing the Excel data
+        2. Loading the answer and grade columns and processing them
         3. Creating and showing the correction window
         
-        Shows error message if no file is selected.
+        Shows error message if no file is selected or the sheet/columns do not exist.
         """
 
         # Validate file selection
@@ -62,21 +68,29 @@ class HomeWindow(QMainWindow):
             if button == QMessageBox.StandardButton.Ok:
                 return
 
-        # Load excel data
-        self.df = pd.read_excel(self.file_name, sheet_name=self.sheet_name.toPlainText())
-        
         # Get column and sheet names from UI
         columna_respostes = self.pregunta.toPlainText()
         columna_corr = self.correction.toPlainText()
         sheet_name = self.pregunta.toPlainText()
 
+        # Every correction session gets its own performance metrics, from loading onwards
+        metrics.enable()
+
+        # Load only the two needed columns of the selected sheet
+        try:
+            self.df, idxCols = load_answers(self.file_name, self.sheet_name.toPlainText(), columna_respostes, columna_corr)
+        except ValueError as e:
+            self.dlg.setText(str(e))
+            self.dlg.exec()
+            return
+
         # Get processing options from UI
         self.options['lowercase'] = self.radioMin.isChecked()
         self.options['punctuations'] = self.radioPunt.isChecked()
         self.options['normalize'] = self.radioTildes.isChecked()
         
         # Process the data
-        Processor = Table(self.df, self.options, columna_respostes, columna_corr)
+        Processor = Table(self.df, self.options, columna_respostes, columna_corr, idxCols)
         df_processed = Processor.getTableProcessed()
         
         # Get processing metadata
@@ -97,5 +111,35 @@ class HomeWindow(QMainWindow):
         Returns:
             str: The path of the selected file (also stored in self.file_name)
         """
-        self.file_name, _ = QFileDialog.getOpenFileName(self, "Open Excel File", "", "Excel Files (*.xlsx *.xls);;All Files (*)")
+        self.file_name, _ = QFileDialog.getOpenFileName(
+            self, "Open Excel File", "",
+            "Excel Files (*.xlsx *.xlsm *.xls);;CSV Files (*.csv);;Parquet Files (*.parquet);;All Files (*)"
+        )
         return 
+
+    def open_session(self):
+        """
+        Open a folder dialog to pick a saved session and continue correcting it.
+
+        The session holds the processed table, the grades and the AI results,
+        so neither the exam file is read nor the answers processed again.
+        """
+        path = QFileDialog.getExistingDirectory(self, "Abrir sesión", "")
+        if not path:
+            return
+        if not path.endswith(SESSION_SUFFIX):
+            self.dlg.setText(f"Selecciona una carpeta de sesión ({SESSION_SUFFIX}).")
+            self.dlg.exec()
+            return
+
+        # The reopened session gets its own performance metrics
+        metrics.enable()
+        try:
+            self.corr_window = CorrectionWindow.from_session(path)
+        except (OSError, ValueError) as e:
+            self.dlg.setText(str(e))
+            self.dlg.exec()
+            return
+
+        self.hide()
+        self.corr_window.show()
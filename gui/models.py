@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Table model that reads cells straight from a DataFrame.
+
+    Only the cells the view paints are converted to text, so refreshing the
+    table costs the same regardless of the number of rows. Sorting keeps the
+    DataFrame untouched and only permutes a row order array.
+
+    Signals:
+        valueEdited(object, str, object): DataFrame index, column name and new
+            value of every cell edited from the view
+
+    Attributes:
+        editable_columns (set): Names of the columns that can be edited
+    """
+    valueEdited = pyqtSignal(object, str, object)
+
+    def __init__(self, df: pd.DataFrame = None, editable_columns=(), grade_column='Nota', parent=None):
+        """
+        Initialize the model.
+
+        Args:
+            df: DataFrame to display
+            editable_columns: Names of the columns that can be edited from the view
+            grade_column: Column whose non-empty values mark a row as graded
+            parent: Parent QObject
+        """
+        super().__init__(parent)
+        self.editable_columns = set(editable_columns)
+        self.grade_column = grade_column
+        self._df = pd.DataFrame()
+        self._order = np.empty(0, dtype=np.int64)
+        self._inverse = np.empty(0, dtype=np.int64)
+        self._graded = np.empty(0, dtype=bool)
+        self._sort = None
+        if df is not None:
+            self.set_dataframe(df)
+
+    def dataframe(self) -> pd.DataFrame:
+        """Return the DataFrame being displayed (edits are applied to it in place)."""
+        return self._df
+
+    def set_dataframe(self, df: pd.DataFrame):
+        """
+        Replace the displayed DataFrame.
+
+        Args:
+            df: New DataFrame
+        """
+        self.beginResetModel()
+        self._df = df
+        self._order = np.arange(len(df), dtype=np.int64)
+        self._inverse = self._order.copy()
+        self._graded = self._graded_mask(df)
+        self.endResetModel()
+
+        # Keep the sort chosen by the user across refreshes
+        if self._sort is not None:
+            self.sort(*self._sort)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            value = self._df.iat[self._order[index.row()], index.column()]
+            return self._format(value)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return str(self._df.columns[section])
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and self._df.columns[index.column()] in self.editable_columns:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        column = self._df.columns[index.column()]
+        if column not in self.editable_columns:
+            return False
+
+        position = self._order[index.row()]
+        value = str(value).strip()
+        if self._df.iat[position, index.column()] == value:
+            return True
+        self._df.iat[position, index.column()] = value
+        if column == self.grade_column:
+            self._graded[position] = self._is_graded(value)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole])
+        self.valueEdited.emit(self._df.index[position], column, value)
+        return True
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """
+        Sort rows by a column without copying or reordering the DataFrame.
+
+        Numeric columns are sorted as numbers; empty cells always go last.
+        """
+        if column < 0 or column >= len(self._df.columns):
+            return
+        self._sort = (column, order)
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        positions = [self._order[index.row()] for index in persistent]
+
+        values = self._df.iloc[:, column]
+        key = pd.to_numeric(values, errors='coerce')
+        non_empty = values.notna() & (values.astype(str).str.strip() != '')
+        if key[non_empty].isna().any():
+            # Not a numeric column: compare as case-insensitive text
+            key = values.astype(str).str.lower().where(non_empty)
+
+        ascending = order == Qt.SortOrder.AscendingOrder
+        ranked = pd.Series(key.to_numpy()).sort_values(ascending=ascending, kind='stable', na_position='last')
+        self._order = ranked.index.to_numpy(dtype=np.int64)
+        self._inverse = np.empty_like(self._order)
+        self._inverse[self._order] = np.arange(len(self._order))
+
+        self.changePersistentIndexList(
+            persistent,
+            [self.index(int(self._inverse[pos]), index.column()) for pos, index in zip(positions, persistent)]
+        )
+        self.layoutChanged.emit()
+
+    def row_of(self, idx) -> int:
+        """
+        Model row currently showing a DataFrame index label.
+
+        Args:
+            idx: Index label in the DataFrame
+
+        Returns:
+            Row number in the model
+        """
+        return int(self._inverse[self._df.index.get_loc(idx)])
+
+    def is_graded(self, row: int) -> bool:
+        """Whether the row at a model position has a grade."""
+        return bool(self._graded[self._order[row]])
+
+    def graded_count(self) -> int:
+        """Number of rows with a grade."""
+        return int(self._graded.sum())
+
+    def update_row(self, idx, values: dict):
+        """
+        Write values into one DataFrame row and repaint only the changed cells.
+
+        Columns missing from the DataFrame are ignored.
+
+        Args:
+            idx: Index label of the row
+            values: Mapping of column name to value
+        """
+        position = self._df.index.get_loc(idx)
+        row = int(self._inverse[position])
+        columns = []
+        for column, value in values.items():
+            if column not in self._df.columns:
+                continue
+            self._df.at[idx, column] = value
+            columns.append(self._df.columns.get_loc(column))
+            if column == self.grade_column:
+                self._graded[position] = self._is_graded(value)
+
+        if columns:
+            self.dataChanged.emit(self.index(row, min(columns)), self.index(row, max(columns)))
+
+    def _graded_mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Vectorized graded flag for every DataFrame row."""
+        if self.grade_column not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        grades = df[self.grade_column]
+        return (grades.notna() & (grades.astype(str).str.strip() != '')).to_numpy()
+
+    @staticmethod
+    def _is_graded(value) -> bool:
+        return pd.notna(value) and str(value).strip() != ''
+
+    @staticmethod
+    def _format(value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ''
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        return str(value)
+
+
+class GradedFilterProxyModel(QSortFilterProxyModel):
+    """
+    Proxy that can hide graded rows and delegates sorting to the source model.
+
+    Attributes:
+        hide_graded (bool): If True, rows with a grade are filtered out
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.hide_graded = False
+
+    def set_hide_graded(self, hide: bool):
+        """
+        Show or hide graded rows.
+
+        Args:
+            hide: True to hide rows that already have a grade
+        """
+        self.hide_graded = hide
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.hide_graded:
+            return True
+        return not self.sourceModel().is_graded(source_row)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Sorting the source model is vectorized; the proxy keeps its order
+        self.sourceModel().sort(column, order)
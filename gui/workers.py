@@ -0,0 +1,154 @@
+import threading
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from core.evaluation import cross_validate
+from core.export import save_results
+from core.processor import evaluate_dataframe
+
+
+class GradingWorker(QObject):
+    """
+    Runs evaluate_dataframe, or a cross-validation of the graded rows, outside the GUI thread.
+
+    Signals:
+        row_graded(object, dict): df index and values of each graded row
+        progress(int, int): graded rows and total rows to grade
+        finished(object): resulting DataFrame (partial if cancelled)
+        failed(str): error message if the run could not complete
+    """
+    row_graded = pyqtSignal(object, dict)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, df, test=False, options=None):
+        """
+        Initialize the worker.
+
+        Args:
+            df: DataFrame to grade (see evaluate_dataframe)
+            test: If True, cross-validates the graded rows (see cross_validate)
+                  instead of grading the ungraded ones
+            options: Grading options passed to evaluate_dataframe
+        """
+        super().__init__()
+        self.df = df
+        self.test = test
+        self.options = options
+        self._cancel = threading.Event()
+
+    def run(self):
+        """Grade the DataFrame, streaming each row through the signals."""
+        try:
+            if self.test:
+                df_result = cross_validate(
+                    self.df, options=self.options,
+                    on_progress=self.progress.emit,
+                    cancel_event=self._cancel
+                )
+            else:
+                df_result = evaluate_dataframe(
+                    self.df, options=self.options,
+                    on_result=self.row_graded.emit,
+                    on_progress=self.progress.emit,
+                    cancel_event=self._cancel
+                )
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(df_result)
+
+    def cancel(self):
+        """Stop after the requests already in flight; graded rows are kept."""
+        self._cancel.set()
+
+
+class ExportWorker(QObject):
+    """
+    Runs save_results outside the GUI thread.
+
+    Signals:
+        progress(int, int): rows written and total rows
+        finished(object): path of the saved file
+        failed(str): error message if the file could not be saved
+    """
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the worker.
+
+        Args:
+            args, kwargs: Arguments of save_results, except on_progress
+        """
+        super().__init__()
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        """Save the file, reporting the rows written through the signals."""
+        try:
+            path = save_results(*self.args, on_progress=self.progress.emit, **self.kwargs)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(path)
+
+
+class IndexUpdateWorker(QObject):
+    """
+    Applies edited grades to a QuestionIndex and saves it outside the GUI thread.
+
+    Signals:
+        finished(object): None once the index is updated and saved
+        failed(str): error message if the index could not be updated
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, question_index, texts, grades):
+        """
+        Initialize the worker.
+
+        Args:
+            question_index: QuestionIndex to update
+            texts: Answer texts (see QuestionIndex.update)
+            grades: New grade of each answer; empty values remove it
+        """
+        super().__init__()
+        self.question_index = question_index
+        self.texts = texts
+        self.grades = grades
+
+    def run(self):
+        """Encode the new answers, update the index and save it."""
+        try:
+            self.question_index.update(self.texts, self.grades)
+            self.question_index.save()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(None)
+
+
+def start_worker(worker: GradingWorker, parent: QObject) -> QThread:
+    """
+    Move a worker to a new thread and start it.
+
+    Args:
+        worker: Worker to run (GradingWorker, ExportWorker or IndexUpdateWorker)
+        parent: Owner of the thread, so it outlives Python references to it
+
+    Returns:
+        The running QThread, deleted automatically when it finishes
+    """
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    worker.failed.connect(thread.quit)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread
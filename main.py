@@ -1,11 +1,19 @@
 import sys
+from core import utils
 from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
 from gui.main_window import HomeWindow
 
+utils.record_timing('Importaciones')
+
 def main():
     app = QApplication(sys.argv)
     window = HomeWindow()
     window.show()
+    utils.record_timing('Ventana principal visible')
+
+    # Report once the event loop has painted the window
+    QTimer.singleShot(0, lambda: print(utils.timing_report()))
     sys.exit(app.exec())
 
 if __name__ == "__main__":
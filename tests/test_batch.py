@@ -0,0 +1,63 @@
+import json
+import os
+import pytest
+from core.batch import load_manifest
+
+
+def write(path, content):
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+def test_json_manifest_with_defaults(tmp_path):
+    manifest = {
+        'defaults': {'answer_column': 'P1', 'grade_column': 'Nota P1', 'threshold': '80'},
+        'jobs': [
+            {'file': 'exam.xlsx', 'sheet': '1A'},
+            {'file': 'data/exam.csv', 'answer_column': 'P2', 'prompt': 'p2.txt'},
+        ],
+    }
+    jobs = load_manifest(write(tmp_path / 'manifest.json', json.dumps(manifest)))
+
+    assert jobs[0] == {
+        'file': os.path.join(str(tmp_path), 'exam.xlsx'), 'sheet': '1A', 'answer_column': 'P1',
+        'grade_column': 'Nota P1', 'threshold': 80.0, 'prompt': os.path.join(str(tmp_path), 'prompt.txt'),
+    }
+    assert jobs[1]['file'] == os.path.join(str(tmp_path), 'data/exam.csv')
+    assert jobs[1]['answer_column'] == 'P2'
+    assert jobs[1]['prompt'] == os.path.join(str(tmp_path), 'p2.txt')
+
+
+def test_json_manifest_as_a_list(tmp_path):
+    manifest = [{'file': 'exam.parquet', 'answer_column': 'P1', 'grade_column': 'Nota P1'}]
+    jobs = load_manifest(write(tmp_path / 'manifest.json', json.dumps(manifest)))
+    assert len(jobs) == 1 and 'sheet' not in jobs[0]
+
+
+def test_csv_manifest_ignores_empty_cells(tmp_path):
+    content = (
+        "file,sheet,answer_column,grade_column,prompt\n"
+        "exam.xlsx,1A,P1,Nota P1,\n"
+        "exam.csv,,P2,Nota P2,p2.txt\n"
+    )
+    jobs = load_manifest(write(tmp_path / 'manifest.csv', content))
+    assert [job.get('sheet') for job in jobs] == ['1A', None]
+    assert [os.path.basename(job['prompt']) for job in jobs] == ['prompt.txt', 'p2.txt']
+
+
+def test_job_missing_a_column_is_rejected(tmp_path):
+    manifest = [{'file': 'exam.csv', 'answer_column': 'P1'}]
+    with pytest.raises(ValueError, match='grade_column'):
+        load_manifest(write(tmp_path / 'manifest.json', json.dumps(manifest)))
+
+
+@pytest.mark.parametrize('file', ['exam.xlsx', 'exam.xls', 'exam.xlsm'])
+def test_excel_job_needs_a_sheet(tmp_path, file):
+    manifest = [{'file': file, 'answer_column': 'P1', 'grade_column': 'Nota P1'}]
+    with pytest.raises(ValueError, match='sheet'):
+        load_manifest(write(tmp_path / 'manifest.json', json.dumps(manifest)))
+
+
+def test_jobs_must_be_a_list(tmp_path):
+    with pytest.raises(ValueError):
+        load_manifest(write(tmp_path / 'manifest.json', json.dumps({'jobs': {'file': 'exam.csv'}})))
@@ -0,0 +1,98 @@
+import multiprocessing
+import numpy as np
+import pytest
+from core.cache import EmbeddingCache
+
+DIM = 4
+
+
+def vectors_of(texts):
+    """Deterministic embedding per text, so a vector tells which text it belongs to."""
+    return np.array([[sum(map(ord, text)), len(text), 0, 1] for text in texts], dtype=np.float32)
+
+
+def test_lookup_of_an_empty_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    vectors, missing = cache.lookup(['a', 'b'])
+    assert vectors is None
+    assert missing == [0, 1]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_store_and_lookup(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.store(['uno', 'dos'], vectors_of(['uno', 'dos']))
+
+    vectors, missing = cache.lookup(['dos', 'tres', 'uno'])
+    assert missing == [1]
+    np.testing.assert_array_equal(vectors[[0, 2]], vectors_of(['dos', 'uno']))
+    np.testing.assert_array_equal(vectors[1], np.zeros(DIM))
+
+
+def test_texts_are_normalized_and_keyed_by_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.store(['una  respuesta '], vectors_of(['x']))
+    assert cache.lookup(['una respuesta'])[1] == []
+    assert cache.key('texto') != EmbeddingCache(str(tmp_path), 'other').key('texto')
+
+
+def test_store_rejects_another_dimension(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.store(['a'], vectors_of(['a']))
+    with pytest.raises(ValueError):
+        cache.store(['b'], np.zeros((1, DIM + 1), dtype=np.float32))
+
+
+def test_persists_between_instances(tmp_path):
+    EmbeddingCache(str(tmp_path), 'model').store(['a', 'b'], vectors_of(['a', 'b']))
+
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    vectors, missing = cache.lookup(['a', 'b'])
+    assert missing == [] and len(cache) == 2
+    np.testing.assert_array_equal(vectors, vectors_of(['a', 'b']))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    # Room for exactly three vectors
+    cache = EmbeddingCache(str(tmp_path), 'model', max_size_mb=3 * DIM * 4 / 2**20)
+    cache.store(['a', 'b', 'c'], vectors_of(['a', 'b', 'c']))
+    cache.lookup(['a'])
+    cache.store(['d'], vectors_of(['d']))
+
+    vectors, missing = cache.lookup(['a', 'b', 'c', 'd'])
+    assert missing == [1]
+    assert len(cache) == 3
+    np.testing.assert_array_equal(vectors[[0, 2, 3]], vectors_of(['a', 'c', 'd']))
+
+
+def test_corrupted_cache_starts_again(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.store(['a'], vectors_of(['a']))
+    with open(cache._keys_path, 'wb') as f:
+        f.write(b'not a npy file')
+
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    assert len(cache) == 0
+    assert cache.lookup(['a'])[1] == [0]
+
+
+def _store_batches(root, worker):
+    cache = EmbeddingCache(root, 'model')
+    for batch in range(5):
+        texts = [f"{worker}-{batch}-{i}" for i in range(40)]
+        cache.store(texts, vectors_of(texts))
+
+
+def test_processes_share_the_cache(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_store_batches, args=(str(tmp_path), worker)) for worker in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0]
+
+    texts = [f"{worker}-{batch}-{i}" for worker in range(2) for batch in range(5) for i in range(40)]
+    vectors, missing = EmbeddingCache(str(tmp_path), 'model').lookup(texts)
+    assert missing == []
+    np.testing.assert_array_equal(vectors, vectors_of(texts))
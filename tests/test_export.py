@@ -0,0 +1,90 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from core.export import AI_HEADERS, _arrow_safe, expand_results, save_results
+
+
+def processed_table():
+    return pd.DataFrame({
+        'Respuesta': ['a', 'b', 'c', 'd'],
+        'nota IA': [1, 0, -1, ''],
+        'feedback IA': ['bien', 'mal', 'Error', ''],
+        'confidence': [90, 60, 0, ''],
+    })
+
+
+RELATIONS = {'a': [4, 0], 'b': [2], 'c': [1], 'd': [3]}
+
+
+def test_expand_results_repeats_each_text_over_its_rows():
+    expanded = expand_results(processed_table(), RELATIONS)
+
+    assert expanded.index.tolist() == [0, 1, 2, 4]
+    assert expanded.columns.tolist() == AI_HEADERS
+    assert expanded['Nota IA'].tolist() == ['1', '-1', '0', '1']
+    assert expanded.loc[4, 'Feedback IA'] == 'bien'
+
+
+def test_expand_results_threshold_and_failed_rows():
+    assert expand_results(processed_table(), RELATIONS, threshold=70).index.tolist() == [0, 4]
+    assert expand_results(processed_table(), RELATIONS, skip_failed=True).index.tolist() == [0, 2, 4]
+
+
+def test_expand_results_of_an_ungraded_table():
+    expanded = expand_results(pd.DataFrame({'Respuesta': ['a']}), RELATIONS)
+    assert expanded.empty and expanded.columns.tolist() == AI_HEADERS
+
+
+def test_expand_results_rejects_unknown_texts():
+    with pytest.raises(ValueError):
+        expand_results(processed_table(), {'a': [0]})
+
+
+def test_arrow_safe_keeps_numeric_columns_numeric():
+    assert _arrow_safe(pd.Series(['1', 2, None], dtype=object)).tolist()[:2] == [1, 2]
+
+
+def test_arrow_safe_turns_mixed_columns_into_text():
+    values = _arrow_safe(pd.Series(['bien', 2, None, np.nan], dtype=object)).tolist()
+    assert values == ['bien', '2', None, None]
+
+
+@pytest.mark.parametrize('output_format', [None, 'xlsx', 'csv'])
+def test_ai_columns_are_inserted_after_the_grade_column(tmp_path, output_format):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Hoja1'
+    ws.append(['Respuesta', 'Nota', 'Comentario'])
+    ws.append(['a', None, 'revisar'])
+    ws.append(['b', None, 'ok'])
+    exam = str(tmp_path / 'exam.xlsx')
+    wb.save(exam)
+
+    ai_results = pd.DataFrame({'Nota IA': ['1'], 'Feedback IA': ['bien'], 'Confidence': ['90']}, index=[1])
+    path = save_results(exam, 'Hoja1', 1, {0: '0'}, ai_results, str(tmp_path / 'out'), output_format=output_format)
+
+    if output_format == 'csv':
+        result = pd.read_csv(path, dtype=str, keep_default_na=False)
+    else:
+        result = pd.read_excel(path, dtype=str, keep_default_na=False)
+    assert result.columns.tolist() == ['Respuesta', 'Nota'] + AI_HEADERS + ['Comentario']
+    assert result['Comentario'].tolist() == ['revisar', 'ok']
+    assert result['Nota'].tolist()[0] == '0'
+    assert result['Feedback IA'].tolist() == ['', 'bien']
+
+
+def test_existing_ai_columns_are_updated_in_place(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Hoja1'
+    ws.append(['Respuesta', 'Nota'] + AI_HEADERS + ['Comentario'])
+    ws.append(['a', 1, '0', 'antes', '50', 'revisar'])
+    exam = str(tmp_path / 'exam.xlsx')
+    wb.save(exam)
+
+    ai_results = pd.DataFrame({'Nota IA': ['1'], 'Feedback IA': ['después'], 'Confidence': ['95']}, index=[0])
+    path = save_results(exam, 'Hoja1', 1, {}, ai_results, str(tmp_path / 'out'))
+
+    rows = list(openpyxl.load_workbook(path).active.iter_rows(values_only=True))
+    assert rows == [('Respuesta', 'Nota', *AI_HEADERS, 'Comentario'), ('a', 1, '1', 'después', '95', 'revisar')]
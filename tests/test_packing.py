@@ -0,0 +1,47 @@
+import json
+from core import grader
+from core.processor import _make_packs, _merge_examples
+
+
+def test_packs_group_rows_by_nearest_graded_answer():
+    prompts = dict.fromkeys([10, 11, 12, 13, 14])
+    nearest = {10: 7, 11: 3, 12: 7, 13: 7, 14: 3}
+    assert _make_packs(prompts, nearest, pack_size=8) == [[10, 12, 13], [11, 14]]
+
+
+def test_packs_are_split_at_pack_size():
+    prompts = dict.fromkeys(range(5))
+    assert _make_packs(prompts, dict.fromkeys(range(5), 1), pack_size=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_rows_without_neighbour_are_not_grouped():
+    prompts = dict.fromkeys([1, 2, 3])
+    assert _make_packs(prompts, {1: -1, 2: -1, 3: 5}, pack_size=4) == [[1], [2], [3]]
+
+
+def test_pack_size_of_one_or_less_grades_rows_alone():
+    prompts = dict.fromkeys([1, 2])
+    assert _make_packs(prompts, {1: 0, 2: 0}, pack_size=0) == [[1], [2]]
+
+
+def test_merged_examples_interleave_by_rank_without_duplicates():
+    examples = [
+        {1: ['a', 'b'], 0: ['x']},
+        {1: ['c', 'a'], 0: ['y', 'x']},
+    ]
+    assert _merge_examples(examples) == {1: ['a', 'c', 'b'], 0: ['x', 'y']}
+
+
+def test_failed_packed_request_leaves_every_answer_to_grade_alone(monkeypatch):
+    monkeypatch.setattr(grader, '_request', lambda *args, **kwargs: (None, "Error GPT-4o: timeout"))
+    assert grader.grade_batch("system", "[1] a\n[2] b\n[3] c", 3) == [None, None, None]
+
+
+def test_packed_response_items_are_parsed_on_their_own(monkeypatch):
+    content = json.dumps([
+        {'id': 2, 'grade': 0, 'feedback': 'no', 'confidence': 70},
+        {'id': 1, 'grade': 1, 'feedback': 'ok', 'confidence': 90},
+        {'id': 3, 'feedback': 'sin nota'},
+    ])
+    monkeypatch.setattr(grader, '_request', lambda *args, **kwargs: (content, None))
+    assert grader.grade_batch("system", "[1] a\n[2] b\n[3] c", 3) == [(1.0, 'ok', 90.0), (0.0, 'no', 70.0), None]
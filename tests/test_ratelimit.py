@@ -0,0 +1,46 @@
+import pytest
+from core.ratelimit import backoff_delay, parse_duration, retry_after_seconds
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('1s', 1.0),
+    ('120ms', 0.12),
+    ('6m0s', 360.0),
+    ('1h2m3s', 3723.0),
+    ('1.5s', 1.5),
+    ('2', 2.0),
+    (' 0.25 ', 0.25),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize('value', [None, '', 'soon', 'Wed, 21 Oct 2015 07:28:00 GMT'])
+def test_parse_duration_rejects_unparseable_values(value):
+    assert parse_duration(value) is None
+
+
+def test_retry_after_ms_takes_precedence():
+    headers = {'retry-after-ms': '250', 'retry-after': '3', 'x-ratelimit-reset-requests': '1m'}
+    assert retry_after_seconds(headers) == pytest.approx(0.25)
+
+
+def test_retry_after_falls_back_to_reset_headers():
+    assert retry_after_seconds({'retry-after': '3'}) == 3.0
+    assert retry_after_seconds({'x-ratelimit-reset-requests': '6m0s'}) == 360.0
+    assert retry_after_seconds({'x-ratelimit-reset-tokens': '20ms'}) == pytest.approx(0.02)
+
+
+def test_retry_after_skips_unparseable_headers():
+    headers = {'retry-after-ms': 'x', 'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT', 'x-ratelimit-reset-tokens': '2s'}
+    assert retry_after_seconds(headers) == 2.0
+
+
+@pytest.mark.parametrize('headers', [None, {}, {'content-type': 'application/json'}])
+def test_retry_after_without_hint(headers):
+    assert retry_after_seconds(headers) is None
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=1.0, cap=8.0) <= min(8.0, 2 ** attempt)
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from core import embedding
+from core.cache import EmbeddingCache
+from core.session import TABLE, Session, _arrow_safe
+
+INFO = {'file_name': 'exam.xlsx', 'sheet_name': 'Hoja1', 'pending_grades': {3: '1'}, 'dirty_grades': {}}
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding, 'embedding_cache', EmbeddingCache(str(tmp_path / 'cache'), embedding.MODEL_NAME))
+    return Session(str(tmp_path / 'exam - Hoja1.session'))
+
+
+def table():
+    return pd.DataFrame({
+        'Respuesta': ['a', 'b', 'c'],
+        'Nota': ['1', np.nan, ''],
+        'Freq': [2, 1, 1],
+        'nota IA': [None, 0.0, ''],
+    }, index=[0, 2, 5])
+
+
+RELATIONS = {'a': [0, 3], 'b': [1], 'c': [2]}
+
+
+def test_arrow_safe_keeps_missing_values_missing():
+    df = _arrow_safe(table())
+    assert df['Nota'].tolist() == ['1', None, '']
+    assert df['nota IA'].tolist() == [None, '0.0', '']
+    assert df['Freq'].dtype == np.int64
+
+
+def test_round_trip(session):
+    session.save(table(), RELATIONS, INFO)
+    state = Session(session.path).load()
+
+    df = state['df']
+    assert df.index.tolist() == [0, 2, 5]
+    assert df['Nota'].tolist() == ['1', None, '']
+    assert state['relations'] == RELATIONS
+    assert state['pending_grades'] == {3: '1'}
+    assert state['sheet_name'] == 'Hoja1'
+    assert 'grade_edits' not in state
+
+
+def test_grade_edits_are_saved_without_the_table(session):
+    df = table()
+    session.save(df, RELATIONS, INFO)
+    table_path = os.path.join(session.path, TABLE)
+    written = os.stat(table_path).st_mtime_ns
+
+    df.loc[2, 'Nota'] = '0'
+    df.loc[0, 'Nota'] = ''
+    session.save(df, RELATIONS, INFO, table_changed=False)
+    assert os.stat(table_path).st_mtime_ns == written
+
+    assert Session(session.path).load()['df']['Nota'].tolist() == ['', '0', '']
+
+
+def test_other_changes_rewrite_the_table(session):
+    df = table()
+    session.save(df, RELATIONS, INFO)
+    df.loc[2, 'Nota'] = '0'
+    session.save(df, RELATIONS, INFO, table_changed=False)
+
+    df.loc[5, 'nota IA'] = 1
+    session.save(df, RELATIONS, INFO)
+    state = Session(session.path).load()
+    assert state['df']['Nota'].tolist() == ['1', '0', '']
+    assert state['df']['nota IA'].tolist() == [None, '0.0', '1']
+
+
+def test_reopened_session_keeps_saving_grade_edits(session):
+    session.save(table(), RELATIONS, INFO)
+    reopened = Session(session.path)
+    df = reopened.load()['df']
+
+    df.loc[5, 'Nota'] = '1'
+    reopened.save(df, RELATIONS, INFO, table_changed=False)
+    assert Session(session.path).load()['df']['Nota'].tolist() == ['1', None, '1']